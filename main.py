@@ -1,23 +1,42 @@
 import pandas as pd
+import numpy as np
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import mm
+from reportlab.lib.pagesizes import A3, A4, A5, A6, letter, mm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.utils import ImageReader
 from reportlab.graphics.barcode import eanbc
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics import renderPDF
-from PIL import Image
+from PIL import Image, ImageOps
 import os
+import posixpath
 import re
-from typing import Dict, Optional
+import hashlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from LabelsMarksGenerator.barcode.writer import ImageWriter
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
 import logging
 import threading
+import queue
 import shutil
 import sys
-from datetime import datetime
+import time
+import argparse
+import csv
+import json
+import socket
+import zipfile
+import xml.etree.ElementTree as ET
+import multiprocessing
+from collections import Counter, deque
+from itertools import repeat
+from functools import lru_cache, partial
+from contextlib import ExitStack, contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import date, datetime, time as datetime_time, timedelta
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
 from barcode.writer import ImageWriter
 import barcode
 
@@ -92,16 +111,300 @@ logger = logging.getLogger(__name__)
 class Config:
     LABEL_SIZE_PX = (472, 472)  # 40mm x 40mm at 300 DPI
     PAGE_SIZE = (40 * mm, 40 * mm)
+    WORKERS = 1  # Количество процессов или потоков рендеринга (1 - последовательный режим, 0 - по числу CPU)
+    CHUNK_SIZE = 50  # Количество строк в одной порции для пула процессов
+    EXECUTOR = 'process'  # Пул для параллельного рендеринга: 'process', 'thread', 'serial' или 'auto' (планировщик)
+    WRITE_QUEUE_SIZE = 256  # Максимум готовых PDF в памяти, ожидающих записи на диск
+    WRITE_BATCH_SIZE = 64  # Сколько файлов поток записи забирает из очереди за раз
+    STREAM_ROWS = 0  # Читать и рендерить файл порциями по N строк (0 - файл целиком)
+    TEXT_STREAM_ROWS = 1000  # Порция проверки строк в пробном прогоне (CSV/TSV/JSONL читаются потоково)
+    INPUT_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.tsv', '.jsonl', '.zip')  # Принимаемые входные файлы
+    PARSE_CACHE_DIR = 'LabelsMarksGenerator/cache'  # Кэш разобранных таблиц (None - выключен)
+    PARSE_CACHE_MAX_MB = 512  # Предельный размер кэша таблиц
+    SHARD = None  # Раскладка PDF по подпапкам: None, 'brand' (по логотипу) или 'hash' (по имени файла)
+    ROW_TIME_BUDGET = 0  # Лимит времени на рендеринг одной строки в секундах (0 - без лимита)
+    TEXT_LAYOUT_CACHE_SIZE = 8192  # Сколько разбиений текста на строки запоминается (wrap_lines)
+    SPLIT_PAGES = 0  # Многостраничный вывод: страниц в одной части labels_0001.pdf (0 - один документ)
+    MAX_COPIES = 10000  # Больше копий одной строки считается ошибкой в колонке "копии"
+    OUTPUT_FORMAT = 'pdf'  # Формат вывода: 'pdf' или 'zpl' (команды термопринтеров Zebra, многостраничный вывод)
+    # Разрешение, до которого уменьшаются логотипы и значки этикетки (значок печатается в 4 мм,
+    # исходные 3125 px ему не нужны)
+    PRINT_DPI = 300
+    ZPL_DPI = 203  # Разрешение термопринтера для ZPL: 203, 300 или 600 точек на дюйм
+    # Масштабируемый шрифт принтера с кириллицей для текста ZPL (подключается ^CW). Встроенный шрифт 0
+    # на многих моделях только латинский; '' - печатать им (если на принтере нет загруженного шрифта)
+    ZPL_FONT = 'E:TT0003M_.FNT'
+    IMPOSE_SHEET = None  # Раскладка N-up на листы: 'A4', 'A5', ... или '<ширина>x<высота>' в мм (None - выкл.)
+    IMPOSE_GUTTER = 2 * mm  # Промежуток между ячейками листа
+    IMPOSE_MARGIN = 5 * mm  # Минимальное поле листа вокруг сетки ячеек
+    CROP_MARK_LENGTH = 3 * mm  # Длина меток реза
+    CROP_MARK_OFFSET = 1 * mm  # Отступ меток реза от сетки
+
+    # Модель стоимости для планировщика выполнения (секунды)
+    PLANNER_SERIAL_ROWS = 20  # До стольких строк всегда последовательно, без замеров
+    PLANNER_SAMPLE_ROWS = 4  # Сколько строк рендерится для замера стоимости строки
+    PLANNER_PROCESS_START_COST = 0.5  # Запуск пула процессов (импорт модулей, шрифты)
+    PLANNER_ASSET_COST = 0.05  # Подготовка одного логотипа/значка в каждом рабочем процессе
+    PLANNER_IPC_ROW_COST = 0.0005  # Передача строки в рабочий процесс и результата обратно
+    PLANNER_GIL_THREAD_EFFICIENCY = 0.15  # Доля полезной работы каждого доп. потока при GIL
+    PLANNER_CHUNK_SECONDS = 1.0  # Желаемая длительность одной порции
+
+    DAEMON_POLL_INTERVAL = 0.1  # Период опроса папки input в режиме демона (секунды)
+
+    SPOOL_UNIT_ROWS = 500  # Строк в одной единице работы спул-директории
+    SPOOL_LEASE_SECONDS = 60  # Срок аренды единицы работы без продления
+    SPOOL_POLL_INTERVAL = 0.5  # Период опроса спул-директории (секунды)
+    SPOOL_MAX_ATTEMPTS = 3  # Попыток на единицу работы, после чего она переносится в failed/
+    SPOOL_TIMEOUT = 0  # Общий лимит ожидания координатора в секундах (0 - без лимита)
+
+
+class RenderInterrupted(Exception):
+    """Рендеринг строки прерван: истек лимит времени на строку или задание отменено."""
+
+
+class RowTimeoutError(RenderInterrupted):
+    pass
+
+
+class JobCancelledError(RenderInterrupted):
+    pass
+
+
+class CancellationToken:
+    """
+    Флаг отмены задания. Основан на multiprocessing.Event, поэтому один флаг видят
+    и потоки, и рабочие процессы пула (событие передается им при запуске пула).
+    """
+
+    def __init__(self, event=None):
+        self.event = event if event is not None else multiprocessing.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+
+# Контекст текущей строки в потоке рендеринга: флаг отмены и крайний срок
+_row_context = threading.local()
+
+
+def check_row_budget():
+    """Прерывает рендеринг строки, если задание отменено или истек лимит времени на строку."""
+    token = getattr(_row_context, 'token', None)
+    if token is not None and token.cancelled:
+        raise JobCancelledError()
+    deadline = getattr(_row_context, 'deadline', None)
+    if deadline is not None and time.monotonic() > deadline:
+        raise RowTimeoutError()
+
+
+# Пути поиска Arial на разных платформах (обычный и жирный)
+FONT_PATHS = [
+    'arial.ttf',
+    'arialbd.ttf',
+    os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'arial.ttf'),
+    os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'arialbd.ttf'),
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    '/System/Library/Fonts/Supplemental/Arial Bold.ttf',
+    '/Library/Fonts/Arial.ttf',
+    '/Library/Fonts/Arial Bold.ttf',
+    '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+]
+
+# Регистрация шрифтов меняет глобальное состояние ReportLab, поэтому выполняется
+# один раз на процесс под блокировкой
+_font_lock = threading.Lock()
+_registered_fonts: Optional[Tuple[str, str]] = None
+
+
+def register_fonts() -> Tuple[str, str]:
+    """Регистрирует шрифты один раз на процесс. Возвращает (жирный, обычный) шрифт."""
+    global _registered_fonts
+    if _registered_fonts is None:
+        with _font_lock:
+            if _registered_fonts is None:
+                _registered_fonts = _register_fonts_locked()
+    return _registered_fonts
+
+
+def _register_fonts_locked() -> Tuple[str, str]:
+    arial_registered = False
+    arial_bold_registered = False
+
+    for font_path in FONT_PATHS:
+        if os.path.exists(font_path):
+            try:
+                if 'bd' in font_path.lower() or 'bold' in font_path.lower():
+                    if not arial_bold_registered:
+                        pdfmetrics.registerFont(TTFont('Arial-Bold', font_path))
+                        arial_bold_registered = True
+                else:
+                    if not arial_registered:
+                        pdfmetrics.registerFont(TTFont('Arial', font_path))
+                        arial_registered = True
+            except Exception as e:
+                logger.debug(f"Не удалось зарегистрировать шрифт {font_path}: {e}")
+                continue
+
+    if arial_registered and arial_bold_registered:
+        fonts = ('Arial-Bold', 'Arial')
+    else:
+        logger.info("Arial не найден, будут использованы стандартные шрифты Helvetica")
+        fonts = ('Helvetica-Bold', 'Helvetica')
+
+    # Стандартные шрифты ReportLab подгружает лениво - делаем это заранее,
+    # чтобы потоки рендеринга только читали реестр шрифтов
+    for font_name in set(fonts) | {'Helvetica'}:
+        pdfmetrics.getFont(font_name)
+
+    return fonts
 
 
 class ResourceManager:
+    # Кэш подготовленных ресурсов (байты и уменьшенные изображения, найденные пути), общий для всех потоков.
+    # Значения неизменяемые, поэтому их можно использовать одновременно из разных потоков
+    _cache: Dict = {}
+    _cache_lock = threading.Lock()
+    # Изображения входного архива поверх встроенных: {путь встроенного ресурса: байты}.
+    # Кэш ведется отдельно для каждого набора ресурсов (по _overlay_token)
+    _overlay: Dict[str, bytes] = {}
+    _overlay_token: Optional[str] = None
+    # Архив, из которого взяты изображения: рабочие процессы читают их оттуда сами (worker_assets)
+    _overlay_source: Optional[str] = None
+
     def __init__(self):
         self.logger = Log(token=TOKEN, silent_errors=True)
 
-    @staticmethod
-    def get_image(path: str) -> Optional[Image.Image]:
+    @classmethod
+    def install_overlay(cls, assets: Optional[Dict[str, bytes]], source: Optional[str] = None):
+        """Подключает изображения архива source (None - только встроенные ресурсы)."""
+        assets = assets or {}
+        cls._overlay_source = source if assets else None
+        if assets == cls._overlay:
+            return
+        token = None
+        if assets:
+            digest = hashlib.sha1()
+            for path in sorted(assets):
+                digest.update(path.encode('utf-8') + b'\0' + hashlib.sha1(assets[path]).digest())
+            token = digest.hexdigest()
+        with cls._cache_lock:
+            previous_token = cls._overlay_token
+            if previous_token is not None:
+                # Подготовленные ресурсы прошлого архива больше не понадобятся
+                cls._cache = {key: value for key, value in cls._cache.items() if key[0] != previous_token}
+            cls._overlay = assets
+            cls._overlay_token = token
+
+    @classmethod
+    @contextmanager
+    def overlay(cls, assets: Optional[Dict[str, bytes]], source: Optional[str] = None):
+        """Изображения архива source подменяют встроенные на время блока."""
+        previous = cls._overlay, cls._overlay_source
+        cls.install_overlay(assets, source)
         try:
-            image = Image.open(path)
+            yield
+        finally:
+            cls.install_overlay(*previous)
+
+    @classmethod
+    def overlay_assets(cls) -> Dict[str, bytes]:
+        return cls._overlay
+
+    @classmethod
+    def worker_assets(cls) -> Optional[Tuple[str, Union[str, Dict[str, bytes]]]]:
+        """
+        Изображения архива для рабочих процессов пула: (ключ набора, путь архива).
+        Рабочий процесс сверяет ключ и читает изображения из архива один раз на задание
+        (_install_worker_assets), а не получает байты с каждой порцией. Без известного архива
+        вместо пути передаются сами изображения.
+        """
+        if cls._overlay_token is None:
+            return None
+        return cls._overlay_token, cls._overlay_source or cls._overlay
+
+    @classmethod
+    def get_cached(cls, key, loader):
+        """Возвращает значение из кэша или вычисляет его через loader() один раз."""
+        key = (cls._overlay_token, key)
+        with cls._cache_lock:
+            if key in cls._cache:
+                return cls._cache[key]
+        value = loader()
+        with cls._cache_lock:
+            return cls._cache.setdefault(key, value)
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    @classmethod
+    def find_files(cls, directory: str, names: List[str]) -> List[str]:
+        """Пути существующих файлов из списка имен: сначала изображения архива, затем встроенные."""
+        paths = [os.path.join(directory, name) for name in names]
+        return ([path for path in paths if os.path.normpath(path) in cls._overlay] +
+                [path for path in paths if os.path.exists(path)])
+
+    @classmethod
+    def find_file(cls, directory: str, names: List[str]) -> Optional[str]:
+        """Возвращает путь к первому существующему файлу из списка имен."""
+        def find():
+            paths = cls.find_files(directory, names)
+            return paths[0] if paths else None
+        return cls.get_cached(('path', directory, tuple(names)), find)
+
+    @classmethod
+    def read_bytes(cls, path: str) -> Optional[bytes]:
+        if os.path.normpath(path) in cls._overlay:
+            return cls._overlay[os.path.normpath(path)]
+
+        def read():
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except OSError as e:
+                logger.debug(f"Не удалось прочитать файл {path}: {e}")
+                return None
+        return cls.get_cached(('bytes', path), read)
+
+    @classmethod
+    def get_print_image(cls, path: str, width: float, height: float) -> Optional[ImageReader]:
+        """
+        Изображение для поля width x height пт, декодированное один раз и уменьшенное до Config.PRINT_DPI.
+        Готовый ImageReader общий для всех строк и потоков (данные RGB и альфа-канала разобраны заранее),
+        а после warm_up его наследуют и рабочие процессы.
+        """
+        def load():
+            data = cls.read_bytes(path)
+            if data is None:
+                return None
+            try:
+                image = Image.open(BytesIO(data))
+                if image.mode == 'P':
+                    image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+                # Поле растягивает изображение по обеим осям - уменьшаем каждую ось до точек печати
+                size = (min(image.width, max(1, round(width * Config.PRINT_DPI / 72))),
+                        min(image.height, max(1, round(height * Config.PRINT_DPI / 72))))
+                if size != image.size:
+                    image = image.resize(size, Image.Resampling.LANCZOS)
+                reader = ImageReader(image)
+                reader.getRGBData()
+                return reader
+            except Exception as e:
+                logger.debug(f"Не удалось подготовить изображение {path}: {e}")
+                return None
+        return cls.get_cached(('print_image', path, round(width, 3), round(height, 3)), load)
+
+    @classmethod
+    def get_image(cls, path: str) -> Optional[Image.Image]:
+        try:
+            data = cls._overlay.get(os.path.normpath(path))
+            image = Image.open(BytesIO(data) if data is not None else path)
             # Конвертируем в RGB если нужно, убираем прозрачность
             if image.mode in ('RGBA', 'LA', 'P'):
                 # Создаем белый фон
@@ -117,35 +420,140 @@ class ResourceManager:
             return None
 
 
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp']
+
+
+class DocumentImages:
+    """
+    Изображения одного многостраничного PDF. Каждое изображение (логотип, значок, марка)
+    встраивается в документ один раз как form XObject, страницы только ссылаются на него,
+    поэтому картинка не декодируется и не сжимается заново на каждой странице.
+    """
+
+    def __init__(self, c: canvas.Canvas):
+        self.canvas = c
+        self.forms = {}
+        self._counter = 0
+
+    def draw(self, key, image: ImageReader, x: float, y: float, width: float, height: float, mask=None):
+        form_key = (key, width, height, mask)
+        name = self.forms.get(form_key)
+        if name is None:
+            # Имя не переиспользуется, даже если форма не получилась
+            name = f"DocumentImage{self._counter}"
+            self._counter += 1
+            self.canvas.beginForm(name, 0, 0, width, height)
+            try:
+                self.canvas.drawImage(image, 0, 0, width, height, mask=mask)
+            finally:
+                self.canvas.endForm()
+            self.forms[form_key] = name
+
+        self.canvas.saveState()
+        self.canvas.translate(x, y)
+        self.canvas.doForm(name)
+        self.canvas.restoreState()
+
+
+def draw_image(c: canvas.Canvas, images: Optional[DocumentImages], key, image: ImageReader,
+               x: float, y: float, width: float, height: float, mask=None):
+    """Рисует изображение напрямую или через общие изображения многостраничного документа."""
+    if images is None:
+        c.drawImage(image, x, y, width, height, mask=mask)
+    else:
+        images.draw(key, image, x, y, width, height, mask=mask)
+
+
+class LabelCanvas(canvas.Canvas):
+    """
+    Canvas этикетки PDF. Штрихкод рисуется методом документа draw_ean13_barcode,
+    как и у ZPLDocument, поэтому draw_label не зависит от формата вывода.
+    """
+
+    def draw_ean13_barcode(
+        self,
+        barcode_value: str,
+        x: float,
+        y: float,
+        width: float,
+        height: float,
+        barcode_status: Optional[str] = None,
+    ) -> bool:
+        """
+        Рисует векторный штрихкод EAN-13 непосредственно на canvas.
+        Штрихкод и цифры под ним полностью векторные - масштабируются вместе с PDF
+        и адаптируются к изменению размера страницы.
+        barcode_status - статус из normalize_barcodes; если не задан, значение проверяется здесь.
+        """
+        try:
+            if not barcode_value:
+                return False
+
+            if barcode_status is None:
+                (barcode_value,), (barcode_status,) = normalize_barcodes([barcode_value])
+            if barcode_status not in BARCODE_PRINTABLE:
+                return False
+
+            # Создаем виджет штрихкода с включенными цифрами (векторный текст)
+            barcode_widget = eanbc.Ean13BarcodeWidget(barcode_value[:12])
+            barcode_widget.humanReadable = True  # Цифры под штрихкодом как векторный текст
+
+            # Получаем естественные размеры виджета (включая цифры)
+            bounds = barcode_widget.getBounds()
+            bw = bounds[2] - bounds[0]
+            bh = bounds[3] - bounds[1]
+            if bw <= 0 or bh <= 0:
+                return False
+
+            # Вычисляем коэффициент масштабирования для сохранения пропорций
+            # Это гарантирует, что и штрихкод, и цифры масштабируются одинаково
+            scale_x = width / bw
+            scale_y = height / bh
+            scale = min(scale_x, scale_y)  # Сохраняем пропорции
+            
+            # Создаем векторный drawing с исходными размерами
+            # Все элементы (штрихкод + цифры) будут масштабироваться вместе
+            drawing = Drawing(bw, bh)
+            drawing.add(barcode_widget)
+
+            # Масштабируем весь drawing (штрихкод + цифры) пропорционально
+            # При изменении размера PDF все будет масштабироваться вместе
+            drawing.scale(scale, scale)
+
+            # Рисуем на canvas - координаты в мм, поэтому масштабируются вместе с PDF
+            # Цифры остаются векторным текстом и масштабируются вместе со штрихкодом
+            renderPDF.draw(drawing, self, x, y)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при рисовании векторного штрихкода: {e}")
+            return False
+
+
 class MarkGenerator:
     def __init__(self):
         self.config = Config
         self.resource_manager = ResourceManager()
         self.logger = Log(token=TOKEN, silent_errors=True)
 
-    def generate_pdf(self, data: Dict, output_pdf_path: str) -> bool:
-        try:
-            # Создаем PDF canvas
-            c = canvas.Canvas(output_pdf_path, pagesize=self.config.PAGE_SIZE)
+    def _encode_jpeg(self, image: Image.Image) -> bytes:
+        # Конвертируем в RGB для PDF
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
 
-            # Получаем данные
-            article = data.get('артикул', '')
-            code = data.get('код', '')
-            logo_name = data.get('лого', '').strip().lower()
+        # Сохраняем во временный буфер
+        temp_buffer = BytesIO()
+        image.save(temp_buffer, format='JPEG', quality=95)  # Используем JPEG для надежности
+        return temp_buffer.getvalue()
 
-            # Загружаем изображение марки
-            mark_image = None
+    def get_mark_image(self) -> Optional[Tuple[bytes, int, int]]:
+        """Изображение марки в JPEG шириной 270px: (байты, ширина, высота). Готовится один раз."""
+        def load():
             mark_image_dir = "LabelsMarksGenerator/img/mark_images"
-            extensions = ['.png', '.jpg', '.jpeg', '.bmp']
-            for ext in extensions:
-                test_path = os.path.join(mark_image_dir, f"mark_images{ext}")
-                if os.path.exists(test_path):
-                    mark_image = self.resource_manager.get_image(test_path)
-                    if mark_image:
-                        break
-
-            # Рисуем изображение марки
-            if mark_image:
+            for test_path in ResourceManager.find_files(mark_image_dir,
+                                                        [f"mark_images{ext}" for ext in IMAGE_EXTENSIONS]):
+                mark_image = self.resource_manager.get_image(test_path)
+                if not mark_image:
+                    continue
                 try:
                     # Масштабируем изображение (максимальная ширина 270px)
                     original_width, original_height = mark_image.size
@@ -153,158 +561,1011 @@ class MarkGenerator:
                     new_width = 270
                     new_height = int(original_height * scale_factor)
 
-                    # Ресайзим изображение
                     mark_image_resized = mark_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                    return self._encode_jpeg(mark_image_resized), new_width, new_height
+                except Exception:
+                    # Продолжаем без изображения марки
+                    return None
+            return None
+
+        return ResourceManager.get_cached(('mark_image',), load)
 
-                    # Конвертируем в RGB для PDF
-                    if mark_image_resized.mode != 'RGB':
-                        mark_image_resized = mark_image_resized.convert('RGB')
+    def get_logo_image(self, logo_name: str) -> Optional[Tuple[bytes, int, int]]:
+        """Логотип для марки в JPEG не больше 200px: (байты, ширина, высота). Готовится один раз."""
+        def load():
+            logo_dir = "LabelsMarksGenerator/img/logos"
+            for logo_path in ResourceManager.find_files(logo_dir, [f"{logo_name}{ext}" for ext in IMAGE_EXTENSIONS]):
+                try:
+                    logo_image = self.resource_manager.get_image(logo_path)
+                    if logo_image:
+                        # Масштабируем логотип (максимальный размер 200px)
+                        logo_image.thumbnail((200, 200), Image.Resampling.LANCZOS)
+                        logo_width, logo_height = logo_image.size
+                        return self._encode_jpeg(logo_image), logo_width, logo_height
+                except Exception:
+                    continue
+            return None
 
-                    # Сохраняем во временный буфер
-                    temp_buffer = BytesIO()
-                    mark_image_resized.save(temp_buffer, format='JPEG',
-                                            quality=95)  # Используем JPEG для надежности
-                    temp_buffer.seek(0)
+        return ResourceManager.get_cached(('mark_logo', logo_name), load)
 
-                    # Рассчитываем размеры для PDF (конвертируем пиксели в мм)
-                    mark_pdf_width = new_width * (40 * mm / 472)
-                    mark_pdf_height = new_height * (40 * mm / 472)
+    def generate_pdf(self, data: Union['ProductRecord', Dict], output_pdf_path: Union[str, BinaryIO]) -> bool:
+        try:
+            # Создаем PDF canvas
+            c = canvas.Canvas(output_pdf_path, pagesize=self.config.PAGE_SIZE)
+            self.draw_mark(c, data)
+            c.save()
+            return True
 
-                    # Позиционируем вверху слева с небольшими отступами
-                    x_pos = 0.5 * mm
-                    y_pos = self.config.PAGE_SIZE[1] - mark_pdf_height - 0.5 * mm
+        except RenderInterrupted:
+            raise
+        except Exception as e:
+            return False
 
-                    # Рисуем изображение в PDF
-                    c.drawImage(ImageReader(temp_buffer), x_pos, y_pos,
-                                mark_pdf_width, mark_pdf_height)
+    def draw_mark(self, c: canvas.Canvas, data: Union['ProductRecord', Dict],
+                  images: Optional[DocumentImages] = None):
+        """Рисует марку на текущей странице canvas (images - изображения многостраничного документа)."""
+        check_row_budget()
 
-                except Exception as e:
-                    # Продолжаем без изображения марки
-                    pass
+        # Получаем данные
+        data = ProductRecord.from_mapping(data)
+        code = data.code
+        logo_name = data.logo.strip().lower()
 
-            # Загружаем и рисуем логотип
-            logo_image = None
-            if logo_name:
-                logo_dir = "LabelsMarksGenerator/img/logos"
-                extensions = ['.png', '.jpg', '.jpeg', '.bmp']
-                for ext in extensions:
-                    logo_path = os.path.join(logo_dir, f"{logo_name}{ext}")
-                    if os.path.exists(logo_path):
-                        try:
-                            logo_image = self.resource_manager.get_image(logo_path)
-                            if logo_image:
-
-                                # Масштабируем логотип (максимальный размер 200px)
-                                logo_image.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                                logo_width, logo_height = logo_image.size
-
-                                # Конвертируем в RGB
-                                if logo_image.mode != 'RGB':
-                                    logo_image = logo_image.convert('RGB')
-
-                                # Сохраняем во временный буфер
-                                temp_buffer_logo = BytesIO()
-                                logo_image.save(temp_buffer_logo, format='JPEG', quality=95)
-                                temp_buffer_logo.seek(0)
-
-                                # Рассчитываем размеры для PDF
-                                logo_pdf_width = logo_width * (40 * mm / 472)
-                                logo_pdf_height = logo_height * (40 * mm / 472)
-
-                                # Позиционируем логотип под маркой
-                                logo_x = 0.5 * mm
-                                if mark_image:
-                                    logo_y = self.config.PAGE_SIZE[1] - mark_pdf_height - logo_pdf_height - 1 * mm
-                                else:
-                                    logo_y = self.config.PAGE_SIZE[1] - logo_pdf_height - 0.5 * mm
-
-                                # Рисуем логотип
-                                c.drawImage(ImageReader(temp_buffer_logo), logo_x, logo_y,
-                                            logo_pdf_width, logo_pdf_height)
-                                break
-
-                        except Exception as e:
-                            continue
+        # Изображение марки готовится один раз на процесс
+        mark_image = self.get_mark_image()
 
-            # Настраиваем шрифты
+        # Рисуем изображение марки
+        if mark_image:
             try:
-                # Пробуем зарегистрировать шрифты
-                font_paths = [
-                    'arial.ttf',
-                    'arialbd.ttf',
-                    os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'arial.ttf'),
-                    os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'arialbd.ttf'),
-                    '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
-                    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf'
-                ]
-
-                arial_registered = False
-                arial_bold_registered = False
-
-                for font_path in font_paths:
-                    if os.path.exists(font_path):
-                        try:
-                            if 'bd' in font_path.lower() or 'bold' in font_path.lower():
-                                pdfmetrics.registerFont(TTFont('Arial-Bold', font_path))
-                                arial_bold_registered = True
-                            else:
-                                pdfmetrics.registerFont(TTFont('Arial', font_path))
-                                arial_registered = True
-                        except:
-                            continue
+                mark_bytes, new_width, new_height = mark_image
 
-                if arial_registered and arial_bold_registered:
-                    font_title = 'Arial-Bold'
-                    font_regular = 'Arial'
-                else:
-                    # Используем стандартные шрифты
-                    font_title = 'Helvetica-Bold'
-                    font_regular = 'Helvetica'
+                # Рассчитываем размеры для PDF (конвертируем пиксели в мм)
+                mark_pdf_width = new_width * (40 * mm / 472)
+                mark_pdf_height = new_height * (40 * mm / 472)
+
+                # Позиционируем вверху слева с небольшими отступами
+                x_pos = 0.5 * mm
+                y_pos = self.config.PAGE_SIZE[1] - mark_pdf_height - 0.5 * mm
+
+                # Рисуем изображение в PDF
+                draw_image(c, images, ('mark_image',), ImageReader(BytesIO(mark_bytes)), x_pos, y_pos,
+                           mark_pdf_width, mark_pdf_height)
 
             except Exception as e:
-                font_title = 'Helvetica-Bold'
-                font_regular = 'Helvetica'
+                # Продолжаем без изображения марки
+                pass
 
-            # Рассчитываем стартовую позицию для текста
+        # Загружаем и рисуем логотип
+        logo_image = None
+        if logo_name:
+            logo_image = self.get_logo_image(logo_name)
             if logo_image:
-                start_y_offset = logo_pdf_height + 15 * mm  # Отступ под логотипом(кажется лого не учитывается)
+                logo_bytes, logo_width, logo_height = logo_image
+
+                # Рассчитываем размеры для PDF
+                logo_pdf_width = logo_width * (40 * mm / 472)
+                logo_pdf_height = logo_height * (40 * mm / 472)
+
+                # Позиционируем логотип под маркой
+                logo_x = 0.5 * mm
+                if mark_image:
+                    logo_y = self.config.PAGE_SIZE[1] - mark_pdf_height - logo_pdf_height - 1 * mm
+                else:
+                    logo_y = self.config.PAGE_SIZE[1] - logo_pdf_height - 0.5 * mm
+
+                # Рисуем логотип
+                try:
+                    draw_image(c, images, ('mark_logo', logo_name), ImageReader(BytesIO(logo_bytes)),
+                               logo_x, logo_y, logo_pdf_width, logo_pdf_height)
+                except Exception as e:
+                    pass
+
+        # Изображения могли занять весь лимит строки - проверяем перед текстом
+        check_row_budget()
+
+        # Шрифты регистрируются один раз на процесс
+        font_title, font_regular = register_fonts()
+
+        # Рассчитываем стартовую позицию для текста
+        if logo_image:
+            start_y_offset = logo_pdf_height + 15 * mm  # Отступ под логотипом(кажется лого не учитывается)
+        else:
+            start_y_offset = mark_pdf_height + 5 * mm  # Отступ от верха
+
+        y_position = self.config.PAGE_SIZE[1] - start_y_offset
+
+        # Текст артикула
+        if code:
+            c.setFont(font_title, 5)
+            c.drawString(3 * mm, y_position, f"Артикул: {code}")
+
+        # Остальной текст
+        y_position -= 3 * mm
+        c.setFont(font_regular, 5)
+        c.drawString(3 * mm, y_position, "Количество:")
+
+        y_position -= 3 * mm
+        c.drawString(3 * mm, y_position, "Вес нетто:")
+
+        # Текст "кг" справа
+        kg_text = "кг"
+        kg_width = c.stringWidth(kg_text, font_regular, 5)
+        c.drawString(self.config.PAGE_SIZE[0] - 3 * mm - kg_width,
+                     y_position, kg_text)
+
+        y_position -= 3 * mm
+        c.drawString(3 * mm, y_position, "Вес брутто:")
+        c.drawString(self.config.PAGE_SIZE[0] - 3 * mm - kg_width,
+                     y_position, kg_text)
+
+
+# Файл внутри входного архива: 'archive.zip!/data.xlsx'. Читается в память, без распаковки на диск
+ARCHIVE_MEMBER_SEPARATOR = '!/'
+# Папки изображений архива (img/logos, img/certificates, img/mark_images) подменяют встроенные
+ASSET_ROOT = 'LabelsMarksGenerator/img'
+ASSET_DIRS = ('logos', 'certificates', 'mark_images')
+
+
+def split_archive_path(file_path: str) -> Tuple[str, Optional[str]]:
+    """(путь к файлу или архиву, имя файла внутри архива или None)."""
+    archive_path, separator, member = file_path.partition(ARCHIVE_MEMBER_SEPARATOR)
+    return (archive_path, member) if separator else (file_path, None)
+
+
+def is_archive(file_path: str) -> bool:
+    return split_archive_path(file_path)[1] is None and file_path.lower().endswith('.zip')
+
+
+# Распакованные файлы данных архива на время cached_archive_members: {путь 'archive.zip!/member': байты}
+_archive_members: Optional[Dict[str, bytes]] = None
+
+
+@contextmanager
+def cached_archive_members():
+    """
+    На время блока (обработки одного архива) каждый файл данных распаковывается в память один раз:
+    чтение таблицы, листы, оценка числа строк и ключ кэша таблиц используют одни и те же байты.
+    """
+    global _archive_members
+    previous = _archive_members
+    _archive_members = {}
+    try:
+        yield
+    finally:
+        _archive_members = previous
+
+
+def input_source(file_path: str) -> Union[str, BinaryIO]:
+    """Путь к файлу на диске как есть, файл из архива - BytesIO в памяти."""
+    archive_path, member = split_archive_path(file_path)
+    if member is None:
+        return file_path
+    members = _archive_members
+    data = members.get(file_path) if members is not None else None
+    if data is None:
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                data = archive.read(member)
+        except (KeyError, zipfile.BadZipFile) as e:
+            raise OSError(f"Не удалось прочитать {member} из архива {archive_path}: {e}") from e
+        if members is not None:
+            members[file_path] = data
+    return BytesIO(data)
+
+
+def open_input(file_path: str, stream: bool = True) -> BinaryIO:
+    """
+    Открывает входной файл (на диске или в архиве) на чтение в двоичном режиме.
+    Файл из архива читается потоком с распаковкой по мере чтения (сигнатура, начало файла,
+    построчное чтение), если он еще не распакован в память; stream=False - распаковать целиком
+    (через input_source и его кэш).
+    """
+    archive_path, member = split_archive_path(file_path)
+    if member is None:
+        return open(file_path, 'rb')
+    members = _archive_members
+    if not stream or (members is not None and file_path in members):
+        return input_source(file_path)
+    try:
+        # Открытый файл держит архив до своего закрытия
+        with zipfile.ZipFile(archive_path) as archive:
+            return archive.open(member)
+    except (KeyError, zipfile.BadZipFile) as e:
+        raise OSError(f"Не удалось прочитать {member} из архива {archive_path}: {e}") from e
+
+
+def _archive_member_name(info: zipfile.ZipInfo) -> str:
+    """Имя файла в архиве; имена без флага UTF-8 из архиваторов Windows - в cp866."""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('cp866')
+    except UnicodeError:
+        return info.filename
+
+
+def read_archive(archive_path: str) -> Tuple[List[str], Dict[str, bytes]]:
+    """
+    Разбирает входной архив без распаковки: пути входных файлов ('archive.zip!/data.xlsx')
+    и изображения img/... как {путь встроенного ресурса: байты} для ResourceManager.overlay.
+    Архив может содержать корневую папку.
+    """
+    inputs = []
+    assets = {}
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            parts = _archive_member_name(info).split('/')
+            if '__MACOSX' in parts or parts[-1].startswith(('~$', '.')):
+                continue
+            for position in range(len(parts) - 2):
+                if parts[position].lower() == 'img' and parts[position + 1].lower() in ASSET_DIRS:
+                    asset_path = os.path.join(ASSET_ROOT, parts[position + 1].lower(), *parts[position + 2:])
+                    assets[os.path.normpath(asset_path)] = archive.read(info)
+                    break
             else:
-                start_y_offset = mark_pdf_height + 5 * mm  # Отступ от верха
+                if info.filename.lower().endswith(Config.INPUT_EXTENSIONS) and not is_archive(info.filename):
+                    inputs.append(f"{archive_path}{ARCHIVE_MEMBER_SEPARATOR}{info.filename}")
+    return sorted(inputs), assets
 
-            y_position = self.config.PAGE_SIZE[1] - start_y_offset
 
-            # Текст артикула
-            if code:
-                c.setFont(font_title, 5)
-                c.drawString(3 * mm, y_position, f"Артикул: {code}")
+# Сигнатуры форматов Excel: xlsx - zip-архив, xls - составной документ OLE2
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def detect_excel_format(file_path: str) -> Optional[str]:
+    """'xlsx' или 'xls' по первым байтам файла, None для остальных."""
+    try:
+        with open_input(file_path) as f:
+            head = f.read(len(XLS_MAGIC))
+    except OSError:
+        return None
+    if head.startswith(XLSX_MAGIC):
+        return 'xlsx'
+    if head == XLS_MAGIC:
+        return 'xls'
+    return None
+
+
+# Текстовые форматы выгрузки, которые читаются построчно
+TEXT_FORMATS = ('csv', 'tsv', 'jsonl')
+
+
+def detect_input_format(file_path: str) -> Optional[str]:
+    """Формат входного файла: Excel по сигнатуре, CSV/TSV/JSONL по расширению."""
+    excel_format = detect_excel_format(file_path)
+    if excel_format:
+        return excel_format
+    extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+    return extension if extension in TEXT_FORMATS else None
+
+
+def cell_text(value) -> str:
+    """Значение ячейки как текст: целые числа без '.0' (4607001234567.0 -> '4607001234567')."""
+    if value is None or value != value:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def copies_count(value) -> Optional[int]:
+    """Число копий строки из колонки "копии": пусто - 1, 0 - строка не печатается, None - значение с ошибкой."""
+    text = cell_text(value).strip()
+    if not text:
+        return 1
+    try:
+        copies = float(text.replace(',', '.'))
+    except ValueError:
+        return None
+    if not copies.is_integer() or not 0 <= copies <= Config.MAX_COPIES:
+        return None
+    return int(copies)
+
+
+# Статусы штрихкода после normalize_barcodes. Печатается EAN-13 из первых 12 цифр (BARCODE_PRINTABLE)
+BARCODE_STATUSES = {
+    'ok': 'EAN-13, контрольная цифра верна',
+    'computed': '12 цифр, контрольная цифра вычислена',
+    'bad_check': 'неверная контрольная цифра, напечатан штрихкод с вычисленной',
+    'bad_length': 'нужно 12 или 13 цифр, штрихкод не напечатан',
+    'empty': 'штрихкод не указан',
+}
+BARCODE_PRINTABLE = ('ok', 'computed', 'bad_check')
+
+# Замечания предварительной проверки (PDFLabelGenerator.layout_label, CombinedGenerator.preflight_files)
+PREFLIGHT_ISSUES = {
+    'empty_name': 'нет наименования, строка пропускается',
+    'missing_logo': 'логотип не найден',
+    'missing_cert_icon': 'значок сертификации не найден',
+    'missing_mark_image': 'изображение марки не найдено',
+    'truncated_name': 'наименование обрезано',
+    'truncated_field': 'поле обрезано',
+    'truncated_certification': 'текст сертификации обрезан',
+    'invalid_barcode': 'штрихкод с ошибкой',
+    'invalid_copies': 'число копий с ошибкой, печатается одна копия',
+}
+# Веса цифр EAN-13 при вычислении контрольной цифры
+EAN13_WEIGHTS = np.array([1, 3] * 6)
+
+
+def normalize_barcodes(values: Iterable) -> Tuple[List[str], List[str]]:
+    """
+    Нормализует колонку штрихкодов одним векторным проходом: (значение, статус) для каждой строки.
+    Значение - только цифры; к 12 цифрам добавляется вычисленная контрольная цифра.
+    Числовые ячейки приводятся к тексту через cell_text: 4607001234567.0 - это 13 цифр, а не 14.
+    """
+    digits = (pd.Series(list(values), dtype=object).fillna('').map(cell_text)
+              .str.replace(r'[^0-9]', '', regex=True))
+    lengths = digits.str.len().to_numpy()
+    ean = (lengths == 12) | (lengths == 13)
+
+    normalized = digits.to_numpy(dtype=object)
+    statuses = np.where(lengths == 0, 'empty', 'bad_length').astype(object)
+    if ean.any():
+        payload = digits[ean].str[:12]
+        matrix = np.frombuffer(''.join(payload).encode('ascii'), dtype=np.uint8).reshape(-1, 12) - ord('0')
+        check = (10 - matrix @ EAN13_WEIGHTS % 10) % 10
+        given = digits[ean].str[12:].to_numpy(dtype=object)
+        check_text = check.astype(str).astype(object)
+        normalized[ean] = np.where(given == '', payload.to_numpy(dtype=object) + check_text,
+                                   digits[ean].to_numpy(dtype=object))
+        statuses[ean] = np.where(given == '', 'computed', np.where(given == check_text, 'ok', 'bad_check'))
+    return normalized.tolist(), statuses.tolist()
+
+
+def normalize_column_name(col_name) -> str:
+    if pd.isna(col_name):
+        return ""
+    col_name = str(col_name).strip()
+    col_name = re.sub(r'\s+', ' ', col_name)
+    return col_name.lower()
+
+
+@lru_cache(maxsize=None)
+def _column_aliases() -> Dict[str, str]:
+    """Нормализованное имя или синоним колонки -> стандартное имя (при совпадении - первое по порядку)."""
+    aliases = {}
+    for standard_name, variants in PDFLabelGenerator.COLUMN_MAPPING.items():
+        aliases.setdefault(standard_name, standard_name)
+        for variant in variants:
+            aliases.setdefault(variant, standard_name)
+    return aliases
+
+
+def standard_column_name(col_name) -> str:
+    """Стандартное имя колонки для заголовка из файла; неизвестные колонки - нормализованное имя."""
+    col_name = normalize_column_name(col_name)
+    return _column_aliases().get(col_name, col_name)
+
+
+@lru_cache(maxsize=256)
+def compile_header(header: tuple) -> Tuple[Tuple[int, int, bool], ...]:
+    """
+    Сопоставление заголовка полям ProductRecord: ((позиция колонки, номер поля, читать как текст), ...).
+    Попадают только известные колонки, из повторяющихся - первая.
+    Кэшируется по кортежу заголовка, поэтому файлы одной выгрузки сопоставляются один раз.
+    """
+    field_numbers = {column: number for number, column in enumerate(ProductRecord.FIELDS)}
+    text_columns = set(PDFLabelGenerator.TEXT_COLUMNS)
+    compiled = []
+    seen = set()
+    for position, col_name in enumerate(header):
+        name = standard_column_name(col_name)
+        number = field_numbers.get(name)
+        if number is None or number in seen:
+            continue
+        seen.add(number)
+        compiled.append((position, number, name in text_columns))
+    return tuple(compiled)
+
+
+class ProductRecord:
+    """
+    Строка товара с фиксированным набором полей (__slots__) вместо словаря или pandas.Series.
+    FIELDS сопоставляет стандартные имена колонок полям записи.
+    get(), values() и to_dict() оставлены для кода, который работает со строкой как со словарем.
+    barcode_status - статус штрихкода из normalize_barcodes (None, пока запись не подготовлена).
+    Поля CATEGORICAL повторяются в тысячах строк - intern_values делает их значения общими объектами.
+    """
+    FIELDS = {
+        'наименование': 'name',
+        'артикул': 'article',
+        'штрихкод': 'barcode',
+        'сертификация': 'certification',
+        'тип сертификации': 'certification_type',
+        'лого': 'logo',
+        'назначение': 'purpose',
+        'материал': 'material',
+        'производитель': 'manufacturer',
+        'импортер': 'importer',
+        'страна происхождения': 'country',
+        'дата изготовления': 'production_date',
+        'код': 'code',
+        'копии': 'copies',
+    }
+    __slots__ = tuple(FIELDS.values()) + ('barcode_status',)
+    CATEGORICAL_COLUMNS = ('сертификация', 'тип сертификации', 'лого', 'назначение', 'материал', 'производитель',
+                           'импортер', 'страна происхождения', 'дата изготовления')
+    CATEGORICAL = tuple(map(FIELDS.get, CATEGORICAL_COLUMNS))
+    # Больше значений в пуле - колонки на деле не повторяются, пул начинается заново
+    INTERN_POOL_LIMIT = 65536
+
+    def __init__(self, name='', article='', barcode='', certification='', certification_type='', logo='',
+                 purpose='', material='', manufacturer='', importer='', country='', production_date='', code='',
+                 copies='', barcode_status=None):
+        self.name = name
+        self.article = article
+        self.barcode = barcode
+        self.certification = certification
+        self.certification_type = certification_type
+        self.logo = logo
+        self.purpose = purpose
+        self.material = material
+        self.manufacturer = manufacturer
+        self.importer = importer
+        self.country = country
+        self.production_date = production_date
+        self.code = code
+        self.copies = copies
+        self.barcode_status = barcode_status
+
+    def get(self, column: str, default=''):
+        attr = self.FIELDS.get(column)
+        return getattr(self, attr) if attr else default
+
+    def values(self) -> list:
+        return [getattr(self, attr) for attr in self.FIELDS.values()]
+
+    def to_dict(self) -> Dict:
+        return {column: getattr(self, attr) for column, attr in self.FIELDS.items()}
+
+    def __repr__(self):
+        return f"ProductRecord({self.to_dict()!r})"
+
+    @classmethod
+    def from_mapping(cls, mapping) -> 'ProductRecord':
+        """Запись из словаря строки: ключи приводятся к стандартным колонкам, пустые значения - ''."""
+        if isinstance(mapping, cls):
+            return mapping
+        items = list(mapping.values())
+        values = [''] * len(cls.FIELDS)
+        for position, number, as_text in compile_header(tuple(mapping)):
+            value = items[position]
+            if value is None or value != value:
+                continue
+            values[number] = cell_text(value) if as_text else value
+        return cls(*values)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, list], length: int) -> List['ProductRecord']:
+        """Записи из колонок (стандартное имя -> список значений) без построчных словарей."""
+        fields = [columns[column] if column in columns else repeat('', length) for column in cls.FIELDS]
+        return [cls(*values) for values in zip(*fields)]
+
+    @classmethod
+    def intern_values(cls, records: Iterable[Tuple[int, 'ProductRecord']], pool: Optional[Dict] = None):
+        """Заменяет одинаковые значения полей CATEGORICAL одним объектом из pool (общего для файла)."""
+        pool = {} if pool is None else pool
+        if len(pool) > cls.INTERN_POOL_LIMIT:
+            pool.clear()
+        for _, record in records:
+            for attr in cls.CATEGORICAL:
+                value = getattr(record, attr)
+                setattr(record, attr, pool.setdefault(value, value))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> List[Tuple[int, 'ProductRecord']]:
+        """
+        (индекс строки, запись) для DataFrame со стандартными именами колонок.
+        Колонки-идентификаторы (PDFLabelGenerator.TEXT_COLUMNS) приводятся к тексту, как в from_mapping:
+        DataFrame вызывающего кода может хранить штрихкод числом 4607001234567.0.
+        """
+        df = df.loc[:, ~df.columns.duplicated()]
+        columns = {column: df[column].tolist() for column in cls.FIELDS if column in df.columns}
+        for column in PDFLabelGenerator.TEXT_COLUMNS:
+            if column in columns:
+                columns[column] = [cell_text(value) for value in columns[column]]
+        return list(zip(df.index.tolist(), cls.from_columns(columns, len(df))))
+
+
+def _local_tag(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _column_index(cell_ref: str) -> int:
+    """Номер колонки (с нуля) по адресу ячейки вида 'AB12'."""
+    index = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _header_columns(compiled) -> List[str]:
+    """Стандартные имена сопоставленных колонок в порядке файла."""
+    names = list(ProductRecord.FIELDS)
+    return [names[number] for _, number, _ in compiled]
+
+
+class XlsxRowReader:
+    """
+    Потоковое чтение листа xlsx (по умолчанию первого) без openpyxl и pandas: XML листа разбирается
+    через iterparse, строки отдаются по мере чтения, разобранные элементы сразу освобождаются.
+    Из строк извлекаются только колонки, сопоставленные compile_header полям ProductRecord;
+    значения остальных ячеек не разбираются. Числа в текстовых колонках сразу читаются как текст.
+    Первая строка листа - заголовок.
+    Индексы строк совпадают с индексами DataFrame из pd.read_excel.
+    """
+
+    def __init__(self, file_path: str, sheet: Optional[str] = None):
+        self.file_path = file_path
+        self.sheet = sheet
+        # Стандартные имена выбранных колонок в порядке листа (заполняются при чтении заголовка)
+        self.columns: List[str] = []
 
-            # Остальной текст
-            y_position -= 3 * mm
-            c.setFont(font_regular, 5)
-            c.drawString(3 * mm, y_position, "Количество:")
+    @staticmethod
+    def _sheets(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+        """(имя листа, путь к XML листа) в порядке книги по workbook.xml и его связям."""
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {el.get('Id'): el.get('Target') for el in rels}
+        sheets = []
+        for el in workbook.iter():
+            if _local_tag(el.tag) != 'sheet':
+                continue
+            rel_id = next((value for key, value in el.attrib.items() if _local_tag(key) == 'id'), None)
+            target = targets.get(rel_id)
+            if target is None:
+                continue
+            path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+            sheets.append((el.get('name'), path))
+        return sheets
+
+    def sheet_names(self) -> List[str]:
+        try:
+            with zipfile.ZipFile(input_source(self.file_path)) as archive:
+                return [name for name, _ in self._sheets(archive)]
+        except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError):
+            return []
 
-            y_position -= 3 * mm
-            c.drawString(3 * mm, y_position, "Вес нетто:")
+    def _sheet_path(self, archive: zipfile.ZipFile) -> str:
+        """Путь к XML листа self.sheet (или первого листа)."""
+        try:
+            sheets = self._sheets(archive)
+        except (KeyError, ET.ParseError):
+            sheets = []
+        for name, path in sheets:
+            if self.sheet is None or name == self.sheet:
+                return path
+        if self.sheet is not None:
+            raise KeyError(f"Лист не найден: {self.sheet}")
+        return 'xl/worksheets/sheet1.xml'
 
-            # Текст "кг" справа
-            kg_text = "кг"
-            kg_width = c.stringWidth(kg_text, font_regular, 5)
-            c.drawString(self.config.PAGE_SIZE[0] - 3 * mm - kg_width,
-                         y_position, kg_text)
+    @staticmethod
+    def _epoch(archive: zipfile.ZipFile):
+        try:
+            workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        except (KeyError, ET.ParseError):
+            return CALENDAR_WINDOWS_1900
+        for el in workbook.iter():
+            if _local_tag(el.tag) == 'workbookPr' and el.get('date1904') in ('1', 'true'):
+                return CALENDAR_MAC_1904
+        return CALENDAR_WINDOWS_1900
 
-            y_position -= 3 * mm
-            c.drawString(3 * mm, y_position, "Вес брутто:")
-            c.drawString(self.config.PAGE_SIZE[0] - 3 * mm - kg_width,
-                         y_position, kg_text)
+    @staticmethod
+    def _shared_strings(archive: zipfile.ZipFile) -> List[str]:
+        try:
+            source = archive.open('xl/sharedStrings.xml')
+        except KeyError:
+            return []
+        strings = []
+        with source:
+            for _, el in ET.iterparse(source):
+                if _local_tag(el.tag) == 'si':
+                    # Форматированный текст хранится частями <r><t>
+                    strings.append(''.join(t.text or '' for t in el.iter() if _local_tag(t.tag) == 't'))
+                    el.clear()
+        return strings
 
-            c.save()
-            return True
+    @staticmethod
+    def _date_styles(archive: zipfile.ZipFile) -> set:
+        """Индексы стилей ячеек (атрибут s) с форматом даты."""
+        try:
+            styles = ET.fromstring(archive.read('xl/styles.xml'))
+        except (KeyError, ET.ParseError):
+            return set()
+        formats = dict(BUILTIN_FORMATS)
+        date_styles = set()
+        for el in styles:
+            if _local_tag(el.tag) == 'numFmts':
+                for fmt in el:
+                    formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode', '')
+            elif _local_tag(el.tag) == 'cellXfs':
+                for style_index, xf in enumerate(el):
+                    if is_date_format(formats.get(int(xf.get('numFmtId', 0)), '')):
+                        date_styles.add(style_index)
+        return date_styles
+
+    def estimate_rows(self) -> Optional[int]:
+        """Число строк данных по элементу dimension листа (без чтения строк), если он есть."""
+        try:
+            with zipfile.ZipFile(input_source(self.file_path)) as archive:
+                with archive.open(self._sheet_path(archive)) as source:
+                    for _, el in ET.iterparse(source, events=('start',)):
+                        tag = _local_tag(el.tag)
+                        if tag == 'dimension':
+                            last = el.get('ref', '').split(':')[-1]
+                            row_number = int(''.join(char for char in last if char.isdigit()) or 0)
+                            return row_number - 1 if row_number > 1 else None
+                        if tag == 'sheetData':
+                            return None
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile, ET.ParseError):
+            return None
+        return None
+
+    def __iter__(self) -> Iterator[Tuple[int, ProductRecord]]:
+        """Отдает (индекс строки, ProductRecord); пустые ячейки - ''."""
+        with zipfile.ZipFile(input_source(self.file_path)) as archive:
+            shared_strings = self._shared_strings(archive)
+            date_styles = self._date_styles(archive)
+            epoch = self._epoch(archive)
+
+            def cell_value(cell, as_text=False):
+                cell_type = cell.get('t', 'n')
+                if cell_type == 'inlineStr':
+                    return ''.join(t.text or '' for t in cell.iter() if _local_tag(t.tag) == 't')
+                raw = next((child.text for child in cell if _local_tag(child.tag) == 'v'), None)
+                if raw is None:
+                    return ''
+                if cell_type == 's':
+                    return shared_strings[int(raw)]
+                if cell_type == 'b':
+                    return raw == '1'
+                if cell_type != 'n':
+                    return raw
+                if as_text:
+                    return cell_text(float(raw)) if not raw.lstrip('-').isdigit() else raw
+                number = int(raw) if raw.lstrip('-').isdigit() else float(raw)
+                if date_styles and int(cell.get('s', 0)) in date_styles:
+                    return from_excel(number, epoch)
+                return number
+
+            # Номер колонки листа -> (номер поля записи, читать как текст); None, пока не прочитан заголовок
+            selected = None
+            field_count = len(ProductRecord.FIELDS)
+            header_row = 0
+            sheet_data = None
+            with archive.open(self._sheet_path(archive)) as source:
+                for event, el in ET.iterparse(source, events=('start', 'end')):
+                    tag = _local_tag(el.tag)
+                    if event == 'start':
+                        if tag == 'sheetData':
+                            sheet_data = el
+                        continue
+                    if tag != 'row':
+                        continue
+
+                    row_number = int(el.get('r', 0)) or header_row + 1
+                    if selected is None:
+                        header = {}
+                        position = 0
+                        for cell in el:
+                            if _local_tag(cell.tag) == 'c':
+                                ref = cell.get('r')
+                                column = _column_index(ref) if ref else position
+                                position = column + 1
+                                header[column] = cell_value(cell)
+                        compiled = compile_header(tuple(header.get(column) for column in range(position)))
+                        selected = {column: (number, as_text) for column, number, as_text in compiled}
+                        self.columns = _header_columns(compiled)
+                        header_row = row_number
+                    else:
+                        values = [''] * field_count
+                        position = 0
+                        for cell in el:
+                            if _local_tag(cell.tag) != 'c':
+                                continue
+                            ref = cell.get('r')
+                            column = _column_index(ref) if ref else position
+                            position = column + 1
+                            field = selected.get(column)
+                            if field is not None:
+                                values[field[0]] = cell_value(cell, field[1])
+                        yield row_number - header_row - 1, ProductRecord(*values)
+
+                    # Освобождаем разобранные строки, чтобы память не росла с размером листа
+                    if sheet_data is not None:
+                        sheet_data.clear()
+                    else:
+                        el.clear()
+
+
+class TextRowReader:
+    """
+    Потоковое чтение CSV, TSV и JSONL: в памяти только текущая строка файла.
+    Колонки отбираются и переименовываются так же, как в XlsxRowReader.
+    Кодировка - UTF-8 (с BOM или без), а если начало файла не декодируется - cp1251.
+    Разделитель CSV (',', ';' или табуляция) определяется по строке заголовка.
+    """
+
+    def __init__(self, file_path: str, input_format: str):
+        self.file_path = file_path
+        self.input_format = input_format
+        self.columns: List[str] = []
+
+    def _encoding(self) -> str:
+        with open_input(self.file_path) as f:
+            head = f.read(65536)
+        try:
+            head.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # Ошибка на последних байтах - обрезанный посередине символ, а не другая кодировка
+            if e.start < len(head) - 3:
+                return 'cp1251'
+        return 'utf-8-sig'
+
+    def estimate_rows(self) -> Optional[int]:
+        return None
 
+    def __iter__(self) -> Iterator[Tuple[int, ProductRecord]]:
+        """Отдает (номер строки данных, ProductRecord)."""
+        if self.input_format == 'jsonl':
+            # JSONL декодируется построчно, чтобы битая строка не обрывала чтение файла
+            encoding = self._encoding()
+            with open_input(self.file_path) as f:
+                yield from self._iter_jsonl(f, encoding)
+            return
+        with TextIOWrapper(open_input(self.file_path), encoding=self._encoding(), newline='') as f:
+            yield from self._iter_csv(f)
+
+    def _iter_jsonl(self, f: BinaryIO, encoding: str) -> Iterator[Tuple[int, ProductRecord]]:
+        """Строки, которые не декодируются или не являются объектом JSON, пропускаются с предупреждением."""
+        headers = set()
+        for idx, line in enumerate(f):
+            try:
+                line = line.decode(encoding).strip()
+                if not line:
+                    continue
+                mapping = json.loads(line)
+            except ValueError as e:
+                # UnicodeDecodeError и JSONDecodeError
+                logger.warning(f"{os.path.basename(self.file_path)}: строка {idx + 1} пропущена: {e}")
+                continue
+            if not isinstance(mapping, dict):
+                logger.warning(f"{os.path.basename(self.file_path)}: строка {idx + 1} пропущена: "
+                               f"ожидается объект JSON, а не {type(mapping).__name__}")
+                continue
+            keys = tuple(mapping)
+            if keys not in headers:
+                headers.add(keys)
+                self.columns += [name for name in _header_columns(compile_header(keys)) if name not in self.columns]
+            yield idx, ProductRecord.from_mapping(mapping)
+
+    def _iter_csv(self, f) -> Iterator[Tuple[int, ProductRecord]]:
+        header_line = f.readline()
+        if not header_line:
+            return
+        if self.input_format == 'tsv':
+            delimiter = '\t'
+        else:
+            delimiter = max((',', ';', '\t'), key=header_line.count)
+
+        compiled = compile_header(tuple(next(csv.reader([header_line], delimiter=delimiter), [])))
+        self.columns = _header_columns(compiled)
+        field_count = len(ProductRecord.FIELDS)
+        for idx, row in enumerate(csv.reader(f, delimiter=delimiter)):
+            values = [''] * field_count
+            for position, number, _ in compiled:
+                if position < len(row):
+                    values[number] = row[position]
+            yield idx, ProductRecord(*values)
+
+
+class ParsedTableCache:
+    """
+    Кэш разобранных таблиц рядом с данными программы: повторный запуск на тех же байтах
+    файла загружает готовые записи вместо разбора xlsx/xls.
+    Ключ - sha256 содержимого файла вместе с версией сопоставления колонок, поэтому правка
+    синонимов или полей записи делает старые записи кэша недействительными.
+    Таблица хранится по колонкам (списки значений полей ProductRecord) в JSON с заголовком формата.
+    Запись - только данные: чтение кэша не выполняет код, поэтому папку можно делать общей.
+    Даты и интервалы хранятся как {"$type": тип, "value": значение}; таблица с другими типами
+    значений не кэшируется.
+    При превышении max_bytes удаляются давно не использованные файлы.
+    """
+    FORMAT = 'labels-parsed-table'
+    FORMAT_VERSION = 2  # Увеличивать при изменении чтения файлов или формата кэша
+
+    def __init__(self, cache_dir: str = Config.PARSE_CACHE_DIR,
+                 max_bytes: int = Config.PARSE_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def mapping_version() -> str:
+        spec = json.dumps([ParsedTableCache.FORMAT_VERSION, PDFLabelGenerator.COLUMN_MAPPING,
+                           PDFLabelGenerator.TEXT_COLUMNS, list(ProductRecord.FIELDS), ProductRecord.__slots__],
+                          ensure_ascii=False)
+        return hashlib.md5(spec.encode('utf-8')).hexdigest()[:12]
+
+    def key(self, file_path: str, sheet: Optional[str] = None) -> str:
+        digest = hashlib.sha256(self.mapping_version().encode('ascii'))
+        # Файл из архива распаковывается целиком: те же байты потом читает разбор таблицы
+        with open_input(file_path, stream=False) as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        if sheet is not None:
+            digest.update(b'\0' + sheet.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.table")
+
+    @staticmethod
+    def _encode_value(value):
+        """Значение ячейки, которого нет в JSON (json.dump default)."""
+        if isinstance(value, pd.Timestamp):
+            return {'$type': 'timestamp', 'value': value.isoformat()}
+        if isinstance(value, datetime):
+            return {'$type': 'datetime', 'value': value.isoformat()}
+        if isinstance(value, date):
+            return {'$type': 'date', 'value': value.isoformat()}
+        if isinstance(value, datetime_time):
+            return {'$type': 'time', 'value': value.isoformat()}
+        if isinstance(value, timedelta):
+            return {'$type': 'timedelta', 'value': value.total_seconds()}
+        raise TypeError(f"значение типа {type(value).__name__} не хранится в кэше")
+
+    @staticmethod
+    def _decode_value(mapping: Dict):
+        """Обратное преобразование _encode_value (json.load object_hook)."""
+        kind = mapping.get('$type')
+        if kind is None:
+            raise ValueError("неожиданный объект в колонке")
+        value = mapping['value']
+        if kind == 'timestamp':
+            return pd.Timestamp(value)
+        if kind == 'datetime':
+            return datetime.fromisoformat(value)
+        if kind == 'date':
+            return date.fromisoformat(value)
+        if kind == 'time':
+            return datetime_time.fromisoformat(value)
+        if kind == 'timedelta':
+            return timedelta(seconds=value)
+        raise ValueError(f"неизвестный тип значения {kind}")
+
+    def load(self, key: str) -> Optional[List[Tuple[int, ProductRecord]]]:
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header != {'format': self.FORMAT, 'version': self.FORMAT_VERSION}:
+                    raise ValueError(f"неизвестный формат {header}")
+                table = json.loads(f.readline(), object_hook=self._decode_value)
+            index, columns = table
+            if len(columns) != len(ProductRecord.FIELDS) or any(len(values) != len(index) for values in columns):
+                raise ValueError("размеры колонок не совпадают")
+            # Время доступа для вытеснения давно не использованных записей
+            os.utime(path)
+        except FileNotFoundError:
+            return None
         except Exception as e:
-            return False
+            logger.warning(f"Кэш таблиц: запись {path} повреждена и будет перечитана: {e}")
+            return None
+        return list(zip(index, ProductRecord.from_columns(dict(zip(ProductRecord.FIELDS, columns)), len(index))))
+
+    def store(self, key: str, records: List[Tuple[int, ProductRecord]]):
+        table = [
+            [idx for idx, _ in records],
+            [[getattr(record, attr) for _, record in records] for attr in ProductRecord.FIELDS.values()],
+        ]
+        path = self._path(key)
+        try:
+            # Строка заголовка формата, затем таблица одной строкой JSON
+            data = (json.dumps({'format': self.FORMAT, 'version': self.FORMAT_VERSION}) + "\n" +
+                    json.dumps(table, ensure_ascii=False, separators=(',', ':'), default=self._encode_value) +
+                    "\n").encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Кэш таблиц: таблица не сохраняется: {e}")
+            return
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Кэш таблиц: не удалось сохранить {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока кэш больше max_bytes."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.table'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+@lru_cache(maxsize=Config.TEXT_LAYOUT_CACHE_SIZE)
+def wrap_lines(text: str, font_name: str, font_size: float, max_width: float) -> Tuple[str, ...]:
+    """
+    Строки текста по ширине max_width. Запоминается по (значение, шрифт, размер, ширина):
+    повторяющиеся значения (производитель, страна, материал) раскладываются один раз на процесс.
+    """
+    words = text.split()
+    lines = []
+    current_line = []
+
+    for word in words:
+        check_row_budget()
+        test_line = ' '.join(current_line + [word])
+        text_width = pdfmetrics.stringWidth(test_line, font_name, font_size)
+
+        if text_width <= max_width:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+
+    if current_line:
+        lines.append(' '.join(current_line))
+
+    return tuple(lines)
+
+
+@lru_cache(maxsize=256)
+def text_width(text: str, font_name: str, font_size: float) -> float:
+    """Ширина постоянных подписей (названия полей) - считается один раз."""
+    return pdfmetrics.stringWidth(text, font_name, font_size)
 
 
 class PDFLabelGenerator:
+    COLUMN_MAPPING = {
+        'наименование': ['название', 'product', 'name', 'товар'],
+        'артикул': ['арт', 'article', 'sku', 'код товара'],
+        'штрихкод': ['barcode', 'штрих-код', 'штрих код'],
+        'сертификация': ['сертификат', 'certification'],
+        'тип сертификации': ['тип сертификата', 'certification type'],
+        'лого': ['logo', 'логотип'],
+        'назначение': ['purpose', 'применение'],
+        'материал': ['material', 'состав'],
+        'производитель': ['manufacturer', 'producer'],
+        'импортер': ['importer'],
+        'страна происхождения': ['country', 'страна'],
+        'дата изготовления': ['production date', 'дата'],
+        'код': ['code', 'код товара'],
+        'копии': ['количество копий', 'кол-во копий', 'копий', 'тираж', 'copies', 'quantity'],
+    }
+    # Колонки-идентификаторы: читаются как текст, чтобы Excel не превращал их в float
+    TEXT_COLUMNS = ('штрихкод', 'код', 'артикул')
+
     def __init__(self):
         self.page_width = 40 * mm
         self.page_height = 40 * mm
@@ -312,136 +1573,173 @@ class PDFLabelGenerator:
         self.logo_height = 5.76 * mm
         self.cert_sign_size = 4 * mm
         self.logger = Log(token=TOKEN, silent_errors=True)
+        # Кэш разобранных таблиц для read_records (None - без кэша)
+        self.parse_cache: Optional[ParsedTableCache] = None
         self._register_fonts()
 
     def _register_fonts(self):
-        """Регистрирует шрифты Arial с fallback на стандартные шрифты."""
+        """Регистрирует шрифты Arial с fallback на стандартные шрифты (один раз на процесс)."""
         try:
-            # Пробуем найти Arial на разных платформах
-            font_paths = [
-                'arial.ttf',
-                'arialbd.ttf',
-                os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'arial.ttf'),
-                os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'arialbd.ttf'),
-                '/System/Library/Fonts/Supplemental/Arial.ttf',
-                '/System/Library/Fonts/Supplemental/Arial Bold.ttf',
-                '/Library/Fonts/Arial.ttf',
-                '/Library/Fonts/Arial Bold.ttf',
-            ]
-
-            arial_registered = False
-            arial_bold_registered = False
-
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        if 'bd' in font_path.lower() or 'bold' in font_path.lower():
-                            if not arial_bold_registered:
-                                pdfmetrics.registerFont(TTFont('Arial-Bold', font_path))
-                                arial_bold_registered = True
-                        else:
-                            if not arial_registered:
-                                pdfmetrics.registerFont(TTFont('Arial', font_path))
-                                arial_registered = True
-                    except Exception as e:
-                        logger.debug(f"Не удалось зарегистрировать шрифт {font_path}: {e}")
-                        continue
-
-            # Если не удалось зарегистрировать, используем стандартные шрифты
-            if not arial_registered or not arial_bold_registered:
-                logger.info("Arial не найден, будут использованы стандартные шрифты Helvetica")
+            register_fonts()
         except Exception as e:
             logger.debug(f"Ошибка при регистрации шрифтов: {e}")
 
     def _get_fonts(self):
         """Возвращает имена шрифтов с fallback на стандартные."""
         try:
-            # Проверяем, зарегистрированы ли шрифты
-            if pdfmetrics.getFont('Arial-Bold') and pdfmetrics.getFont('Arial'):
-                return 'Arial-Bold', 'Arial-Bold', 'Arial', 'Arial'
-        except:
+            font_bold, font_regular = register_fonts()
+            return font_bold, font_bold, font_regular, font_regular
+        except Exception:
             pass
-        
+
         # Fallback на стандартные шрифты
         return 'Helvetica-Bold', 'Helvetica-Bold', 'Helvetica', 'Helvetica'
 
     def normalize_column_name(self, col_name: str) -> str:
-        if pd.isna(col_name):
-            return ""
-        col_name = str(col_name).strip()
-        col_name = re.sub(r'\s+', ' ', col_name)
-        return col_name.lower()
+        return normalize_column_name(col_name)
 
-    def normalize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        column_mapping = {
-            'наименование': ['название', 'product', 'name', 'товар'],
-            'артикул': ['арт', 'article', 'sku', 'код товара'],
-            'штрихкод': ['barcode', 'штрих-код', 'штрих код'],
-            'сертификация': ['сертификат', 'certification'],
-            'тип сертификации': ['тип сертификата', 'certification type'],
-            'лого': ['logo', 'логотип'],
-            'назначение': ['purpose', 'применение'],
-            'материал': ['material', 'состав'],
-            'производитель': ['manufacturer', 'producer'],
-            'импортер': ['importer'],
-            'страна происхождения': ['country', 'страна'],
-            'дата изготовления': ['production date', 'дата'],
-            'код': ['code', 'код товара']
-        }
-
-        df.columns = [self.normalize_column_name(col) for col in df.columns]
-
-        for standard_name, variants in column_mapping.items():
-            for col in df.columns:
-                if col in variants:
-                    df.rename(columns={col: standard_name}, inplace=True)
+    def standard_column_name(self, col_name: str) -> str:
+        """Стандартное имя колонки для заголовка из файла (как в normalize_columns)."""
+        return standard_column_name(col_name)
 
+    def normalize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        df.columns = [standard_column_name(col) for col in df.columns]
         return df
 
-    def read_excel(self, file_path: str) -> Optional[pd.DataFrame]:
-        try:
-            engines = ['openpyxl', 'xlrd']
-            df = None
-            for engine in engines:
-                try:
-                    df = pd.read_excel(file_path, engine=engine)
-                    break
-                except Exception as e:
-                    continue
-
-            if df is None:
-                return None
-
-            df = self.normalize_columns(df)
-            df = df.fillna('')
+    def row_reader(self, file_path: str, sheet: Optional[str] = None) -> Union[XlsxRowReader, TextRowReader]:
+        """Потоковый читатель xlsx, CSV, TSV или JSONL, извлекающий только известные колонки."""
+        input_format = detect_input_format(file_path)
+        if input_format in TEXT_FORMATS:
+            return TextRowReader(file_path, input_format)
+        return XlsxRowReader(file_path, sheet)
+
+    def sheet_names(self, file_path: str) -> List[str]:
+        """Имена листов книги Excel; для остальных форматов и нечитаемых файлов - пустой список."""
+        input_format = detect_input_format(file_path)
+        if input_format == 'xlsx':
+            return XlsxRowReader(file_path).sheet_names()
+        if input_format == 'xls':
+            try:
+                with pd.ExcelFile(input_source(file_path), engine='xlrd') as workbook:
+                    return list(workbook.sheet_names)
+            except Exception as e:
+                self.logger.error(f"Ошибка чтения файла {file_path}: {e}")
+        return []
 
-            return df
+    def read_excel(self, file_path: str, sheet: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Читает лист sheet (по умолчанию первый). Формат определяется по сигнатуре файла: xlsx читается
+        потоково через XlsxRowReader, xls - через xlrd. CSV, TSV и JSONL (по расширению)
+        читаются через TextRowReader. Колонки TEXT_COLUMNS читаются как текст.
+        """
+        input_format = detect_input_format(file_path)
+        try:
+            if input_format == 'xlsx' or input_format in TEXT_FORMATS:
+                reader = self.row_reader(file_path, sheet)
+                return self.categorize(self._chunk_frame(list(reader), reader.columns))
+
+            if input_format == 'xls':
+                sheet_name = 0 if sheet is None else sheet
+                with pd.ExcelFile(input_source(file_path), engine='xlrd') as workbook:
+                    header = workbook.parse(sheet_name, nrows=0).columns
+                    converters = {col: cell_text for col in header
+                                  if standard_column_name(col) in self.TEXT_COLUMNS}
+                    df = workbook.parse(sheet_name, converters=converters)
+                df = self.normalize_columns(df)
+                return self.categorize(df.fillna(''))
+
+            self.logger.error(f"Неизвестный формат файла: {file_path}")
+            return None
         except Exception as e:
+            self.logger.error(f"Ошибка чтения файла {file_path}: {e}")
             return None
 
-    def wrap_text(self, text: str, font_name: str, font_size: int, max_width: float, canvas_obj: canvas.Canvas) -> list:
-        if not text:
-            return []
+    @staticmethod
+    def categorize(df: pd.DataFrame) -> pd.DataFrame:
+        """Повторяющиеся колонки (CATEGORICAL_COLUMNS) хранятся как category: каждое значение - один раз."""
+        for column in ProductRecord.CATEGORICAL_COLUMNS:
+            if column in df.columns and isinstance(df[column], pd.Series):
+                df[column] = df[column].astype('category')
+        return df
 
-        words = text.split()
-        lines = []
-        current_line = []
+    def read_records(self, file_path: str, sheet: Optional[str] = None) -> Optional[List[Tuple[int, ProductRecord]]]:
+        """
+        Читает лист sheet (по умолчанию первый) в список (индекс строки, ProductRecord)
+        без промежуточного DataFrame (кроме xls).
+        Excel файлы берутся из parse_cache, если там уже есть таблица для тех же байтов файла.
+        Значения повторяющихся полей общие для всех записей (ProductRecord.intern_values).
+        """
+        input_format = detect_input_format(file_path)
+        cache_key = None
+        if self.parse_cache is not None and input_format in ('xlsx', 'xls'):
+            try:
+                cache_key = self.parse_cache.key(file_path, sheet)
+            except OSError as e:
+                self.logger.error(f"Ошибка чтения файла {file_path}: {e}")
+                return None
+            records = self.parse_cache.load(cache_key)
+            if records is not None:
+                logger.info(f"{os.path.basename(file_path)}: таблица загружена из кэша ({len(records)} строк)")
+                return records
+
+        if input_format == 'xls' or input_format is None:
+            df = self.read_excel(file_path, sheet)
+            records = None if df is None else ProductRecord.from_frame(df)
+        else:
+            try:
+                records = list(self.row_reader(file_path, sheet))
+            except Exception as e:
+                self.logger.error(f"Ошибка чтения файла {file_path}: {e}")
+                return None
 
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            text_width = canvas_obj.stringWidth(test_line, font_name, font_size)
+        if records:
+            ProductRecord.intern_values(records)
+        if cache_key is not None and records:
+            self.parse_cache.store(cache_key, records)
+        return records
 
-            if text_width <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
+    def iter_record_batches(self, file_path: str, batch_rows: int,
+                            sheet: Optional[str] = None) -> Iterator[List[Tuple[int, ProductRecord]]]:
+        """
+        Читает лист sheet (по умолчанию первый) пакетами по batch_rows записей, не загружая файл целиком.
+        xlsx, CSV, TSV и JSONL читаются потоково через row_reader (только известные колонки),
+        xls - через read_excel.
+        Индексы строк в пакетах сквозные, как у DataFrame всего листа.
+        """
+        if detect_input_format(file_path) == 'xls':
+            records = self.read_records(file_path, sheet) or []
+            for start in range(0, len(records), batch_rows):
+                yield records[start:start + batch_rows]
+            return
 
-        if current_line:
-            lines.append(' '.join(current_line))
+        batch = []
+        pool = {}
+        for row in self.row_reader(file_path, sheet):
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                ProductRecord.intern_values(batch, pool)
+                yield batch
+                batch = []
+        if batch:
+            ProductRecord.intern_values(batch, pool)
+            yield batch
 
-        return lines
+    @staticmethod
+    def _chunk_frame(batch: List[Tuple[int, ProductRecord]], columns: List[str]) -> pd.DataFrame:
+        """DataFrame из записей читателя; пропущенные в листе пустые строки восстанавливаются."""
+        index = [idx for idx, _ in batch]
+        data = {column: [getattr(record, ProductRecord.FIELDS[column]) for _, record in batch] for column in columns}
+        df = pd.DataFrame(data, index=index, columns=columns)
+        if index and len(index) != index[-1] - index[0] + 1:
+            df = df.reindex(range(index[0], index[-1] + 1))
+        return df.fillna('')
+
+    def wrap_text(self, text: str, font_name: str, font_size: int, max_width: float,
+                  canvas_obj: Optional[canvas.Canvas] = None) -> list:
+        """Разбивает текст на строки по ширине; ширина считается по метрикам шрифта, canvas не нужен."""
+        if not text:
+            return []
+        return list(wrap_lines(text, font_name, font_size, max_width))
 
     def draw_ean13_barcode(
         self,
@@ -451,401 +1749,2016 @@ class PDFLabelGenerator:
         y: float,
         width: float,
         height: float,
+        barcode_status: Optional[str] = None,
     ) -> bool:
+        """Рисует векторный штрихкод EAN-13 на canvas (см. LabelCanvas.draw_ean13_barcode)."""
+        return LabelCanvas.draw_ean13_barcode(canvas_obj, barcode_value, x, y, width, height, barcode_status)
+
+    def get_logo_image(self, logo_name: str) -> Optional[ImageReader]:
+        if not logo_name:
+            return None
+
+        logo_dir = "LabelsMarksGenerator/img/logos"
+        logo_path = ResourceManager.find_file(logo_dir, [f"{logo_name}{ext}" for ext in IMAGE_EXTENSIONS])
+        if logo_path:
+            # Декодируется и уменьшается до размера поля логотипа один раз на процесс
+            return ResourceManager.get_print_image(logo_path, self.logo_width, self.logo_height)
+
+        return None
+
+    def get_certification_icon(self, certification_type: str) -> Optional[str]:
+        if not certification_type:
+            return None
+
+        cert_dir = "LabelsMarksGenerator/img/certificates"
+
+        cert_type_lower = str(certification_type).lower().strip()
+
+        if cert_type_lower in ['рст', 'rct', 'rst']:
+            possible_names = ["рст.png", "rct.png", "rst.png", "рст.jpg", "rct.jpg", "rst.jpg"]
+        elif cert_type_lower in ['eac', 'еас']:
+            possible_names = ["eac.png", "еас.png", "eac.jpg", "еас.jpg"]
+        else:
+            return None
+
+        return ResourceManager.find_file(cert_dir, possible_names)
+
+    def create_label_pdf(self, data: Union[ProductRecord, Dict], output_path: Union[str, BinaryIO]) -> bool:
+        try:
+            ops, _ = self.layout_label(data)
+            c = LabelCanvas(output_path, pagesize=(self.page_width, self.page_height))
+            self.draw_label(c, ops)
+            c.save()
+            return True
+
+        except RenderInterrupted:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при создании этикетки {output_path}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            return False
+
+    def layout_label(self, data: Union[ProductRecord, Dict]) -> Tuple[list, List[Tuple[str, str]]]:
         """
-        Рисует векторный штрихкод EAN-13 непосредственно на canvas.
-        Штрихкод и цифры под ним полностью векторные - масштабируются вместе с PDF
-        и адаптируются к изменению размера страницы.
+        Раскладка этикетки без рисования: (операции для draw_label, замечания).
+        Замечания - (код из PREFLIGHT_ISSUES, подробности): ненайденные логотип и значок сертификации,
+        поля, обрезанные по границам 15 мм (наименование) и 12 мм (остальные поля), неверный штрихкод.
         """
+        check_row_budget()
+        ops = []
+        issues = []
+
+        # Регистрируем шрифты с fallback на стандартные
+        font_large_bold, font_medium_bold, font_medium, font_small = self._get_fonts()
+
+        large_font_size = 5
+        medium_font_size = 4
+        small_font_size = 3
+
+        line_height = 1.6 * mm
+        field_spacing = 0.3 * mm
+
+        data = ProductRecord.from_mapping(data)
+        name = data.name
+        purpose = data.purpose
+        material = data.material
+        manufacturer = data.manufacturer
+        importer = data.importer
+        country = data.country
+        production_date = data.production_date
+        code = data.code
+        article = data.article
+        barcode_value = data.barcode
+        barcode_status = data.barcode_status
+        certification = data.certification
+        certification_type = data.certification_type
+
+        logo_name = data.logo.strip().lower()
+        logo_img = self.get_logo_image(logo_name)
+        has_logo = logo_img is not None
+
+        if has_logo:
+            logo_x = self.page_width - self.logo_width - 1 * mm
+            logo_y = self.page_height - self.logo_height
+            ops.append(('image', logo_name, logo_img, logo_x, logo_y, self.logo_width, self.logo_height))
+        elif logo_name:
+            issues.append(('missing_logo', logo_name))
+
+        x_position = 1 * mm
+        y_position = self.page_height - 2 * mm
+
+        if name:
+            if has_logo:
+                text_width_for_name = (self.page_width - self.logo_width - 3 * mm)
+            else:
+                text_width_for_name = self.page_width - 2 * mm
+
+            lines_beside_logo = self.wrap_text(name, font_large_bold, large_font_size, text_width_for_name)
+
+            lines_used = 0
+            for i, line in enumerate(lines_beside_logo):
+                current_y = y_position - (i * line_height)
+                if has_logo and current_y > (self.page_height - self.logo_height):
+                    ops.append(('font', font_large_bold, large_font_size))
+                    ops.append(('text', x_position, current_y, line))
+                    lines_used += 1
+                elif not has_logo:
+                    ops.append(('font', font_large_bold, large_font_size))
+                    ops.append(('text', x_position, current_y, line))
+                    lines_used += 1
+                else:
+                    break
+
+            next_line_y = y_position - (lines_used * line_height)
+
+            if has_logo and lines_used < len(lines_beside_logo):
+                remaining_text = ' '.join(
+                    name.split()[sum(len(line.split()) for line in lines_beside_logo[:lines_used]):])
+
+                if remaining_text:
+                    full_width = self.page_width - 2 * mm
+                    remaining_lines = self.wrap_text(remaining_text, font_large_bold, large_font_size, full_width)
+
+                    start_y = next_line_y
+
+                    for j, line in enumerate(remaining_lines):
+                        if start_y - (j * line_height) < 15 * mm:
+                            issues.append(('truncated_name', f"не поместилось строк: {len(remaining_lines) - j}"))
+                            break
+                        ops.append(('font', font_large_bold, large_font_size))
+                        ops.append(('text', x_position, start_y - (j * line_height), line))
+
+                    y_position = start_y - len(remaining_lines) * line_height - field_spacing
+                else:
+                    y_position = next_line_y - field_spacing
+            else:
+                y_position = next_line_y - field_spacing
+
+        priority_fields = [
+            ("Назначение", purpose, font_medium),
+            ("Материал", material, font_medium),
+            ("Производитель", manufacturer, font_medium),
+            ("Импортер", importer, font_medium),
+            ("Страна происхождения", country, font_medium),
+            ("Дата изготовления", production_date, font_medium)
+        ]
+
+        for position, (field_name, field_value, font) in enumerate(priority_fields):
+            if not field_value:
+                continue
+
+            if y_position - line_height < 12 * mm:
+                issues.extend(('truncated_field', f"{skipped_name}: не поместилось")
+                              for skipped_name, skipped_value, _ in priority_fields[position:] if skipped_value)
+                break
+
+            ops.append(('font', font_medium_bold, medium_font_size))
+            field_text = f"{field_name}:"
+            ops.append(('text', x_position, y_position, field_text))
+
+            field_name_width = text_width(field_text, font_medium_bold, medium_font_size)
+            value_x = x_position + field_name_width + 0.5 * mm
+            value_max_width = self.page_width - value_x - 2 * mm
+
+            value_lines = self.wrap_text(field_value, font, medium_font_size, value_max_width)
+            if value_lines:
+                ops.append(('font', font, medium_font_size))
+                ops.append(('text', value_x, y_position, value_lines[0]))
+
+                for i in range(1, len(value_lines)):
+                    if y_position - (i * line_height) < 12 * mm:
+                        issues.append(('truncated_field', f"{field_name}: не поместилось строк: "
+                                                          f"{len(value_lines) - i}"))
+                        break
+                    ops.append(('text', x_position, y_position - (i * line_height), value_lines[i]))
+
+                y_position -= max(1, len(value_lines)) * line_height
+            else:
+                y_position -= line_height
+
+            y_position -= field_spacing
+
+        if code or article:
+            code_article_text = ""
+            if code:
+                code_article_text += f"Код: {code}"
+            if article:
+                if code_article_text:
+                    code_article_text += " "
+                code_article_text += f"Арт: {article}"
+
+            if code_article_text:
+                ops.append(('font', font_small, small_font_size))
+                ops.append(('text', 22 * mm, 10 * mm, code_article_text))
+                if 22 * mm + pdfmetrics.stringWidth(code_article_text, font_small, small_font_size) > self.page_width:
+                    issues.append(('truncated_field', "Код и артикул: выходят за край этикетки"))
+
+        if certification:
+            cert_area_width = 18 * mm
+            cert_area_x = 1 * mm
+
+            cert_icon_path = None
+            if certification_type:
+                cert_icon_path = self.get_certification_icon(certification_type)
+                if not cert_icon_path:
+                    issues.append(('missing_cert_icon', str(certification_type)))
+
+            cert_text_y = 3 * mm
+
+            if cert_icon_path:
+                ops.append(('icon', cert_icon_path, cert_area_x, cert_text_y + 2 * mm, self.cert_sign_size))
+
+            cert_text = str(certification)
+            cert_lines = self.wrap_text(cert_text, font_small, small_font_size, cert_area_width)
+
+            if len(cert_lines) > 2:
+                issues.append(('truncated_certification', f"не поместилось строк: {len(cert_lines) - 2}"))
+            cert_lines = cert_lines[:2]
+
+            ops.append(('font', font_small, small_font_size))
+            for i, line in enumerate(cert_lines):
+                cert_y = cert_text_y - (i * 1 * mm)
+                if cert_y > 1 * mm:
+                    ops.append(('text', cert_area_x, cert_y, line))
+
+        if barcode_value:
+            if barcode_status is None:
+                (barcode_value,), (barcode_status,) = normalize_barcodes([barcode_value])
+            if barcode_status not in ('ok', 'computed', 'empty'):
+                issues.append(('invalid_barcode', f"{barcode_value}: {BARCODE_STATUSES[barcode_status]}"))
+
+            # Адаптивный размер штрихкода - занимает 50% ширины страницы
+            # Минимальная ширина 15mm, максимальная 25mm для читаемости
+            barcode_width = max(15 * mm, min(25 * mm, self.page_width * 0.5))
+            # Высота пропорциональна ширине (соотношение 2.5:1 для EAN-13)
+            barcode_height = barcode_width / 2.5
+
+            # Позиция справа с небольшим отступом
+            barcode_x = self.page_width - barcode_width - 1 * mm
+            barcode_y = 1 * mm
+
+            ops.append(('barcode', barcode_value, barcode_x, barcode_y, barcode_width, barcode_height,
+                        barcode_status))
+
+        return ops, issues
+
+    def draw_label(self, c: Union[LabelCanvas, 'ZPLDocument'], ops: list, images: Optional[DocumentImages] = None):
+        """
+        Рисует на canvas операции раскладки из layout_label.
+        images - изображения многостраничного документа: логотипы и значки встраиваются в него один раз.
+        """
+        for op in ops:
+            check_row_budget()
+            kind = op[0]
+            if kind == 'font':
+                c.setFont(op[1], op[2])
+            elif kind == 'text':
+                c.drawString(op[1], op[2], op[3])
+            elif kind == 'image':
+                _, logo_name, logo_img, logo_x, logo_y, logo_width, logo_height = op
+                try:
+                    draw_image(c, images, ('label_logo', logo_name), logo_img, logo_x, logo_y,
+                               logo_width, logo_height)
+                except Exception as e:
+                    pass
+            elif kind == 'icon':
+                _, cert_icon_path, cert_x, cert_y, size = op
+                try:
+                    cert_icon = ResourceManager.get_print_image(cert_icon_path, size, size)
+                    draw_image(c, images, ('icon', cert_icon_path), cert_icon, cert_x, cert_y, size, size,
+                               mask='auto')
+                except Exception as e:
+                    pass
+            elif kind == 'barcode':
+                try:
+                    # Векторный рисунок в PDF (LabelCanvas) или команда принтера в ZPL (ZPLDocument)
+                    c.draw_ean13_barcode(*op[1:])
+                except Exception as e:
+                    # Логируем ошибку, но продолжаем создание PDF
+                    logger.warning(f"Ошибка при рисовании штрихкода: {e}")
+
+
+class PDFWriter:
+    """
+    Отдельный поток записи готовых PDF на диск.
+    Рендеринг кладет (путь, байты) в ограниченную очередь - ее размер ограничивает
+    память под еще не записанные файлы, а поток записи забирает файлы пачками,
+    так что работа CPU и ожидание диска идут параллельно.
+    """
+
+    _STOP = object()
+
+    def __init__(self, queue_size: int = Config.WRITE_QUEUE_SIZE, batch_size: int = Config.WRITE_BATCH_SIZE):
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.batch_size = max(1, batch_size)
+        self.failures = []
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="pdf-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, data: bytes, tag=None):
+        """Ставит файл в очередь на запись. Блокируется, если очередь заполнена."""
+        self.queue.put((path, data, tag))
+
+    def close(self) -> list:
+        """Дожидается записи всех файлов. Возвращает список (tag, ошибка) для неудачных записей."""
+        self.queue.put(self._STOP)
+        self._thread.join()
+        return self.failures
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in batch:
+                if item is self._STOP:
+                    stopping = True
+                    continue
+                path, data, tag = item
+                try:
+                    self._write(path, data)
+                    self.written += 1
+                except Exception as e:
+                    # Любая ошибка записи остается на совести одного файла: поток должен жить,
+                    # иначе submit() навсегда заблокируется на заполненной очереди
+                    logger.error(f"Ошибка записи файла {path}: {e}")
+                    self.failures.append((tag, e))
+
+    def _write(self, path: str, data: bytes):
         try:
-            if not barcode_value:
-                return False
+            with open(path, 'wb') as f:
+                f.write(data)
+        except FileNotFoundError:
+            # Подпапка шарда создается при первой записи в нее
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+
+
+class ArchiveWriter(PDFWriter):
+    """
+    Поток записи готовых PDF прямо в ZIP-архив (result.zip) вместо файлов на диске.
+    Пути файлов становятся путями в архиве. PDF уже сжаты (Flate), поэтому хранятся
+    без повторного сжатия (ZIP_STORED). target - путь или файловый объект; seek не нужен,
+    поэтому архив можно отдавать в сокет или pipe по мере рендеринга.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO], queue_size: int = Config.WRITE_QUEUE_SIZE,
+                 batch_size: int = Config.WRITE_BATCH_SIZE):
+        self.archive = zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_STORED)
+        super().__init__(queue_size, batch_size)
+
+    def _write(self, path: str, data: bytes):
+        arcname = path.replace(os.sep, '/').lstrip('/')
+        self.archive.writestr(arcname, data)
+
+    def close(self) -> list:
+        """Дописывает очередь и оглавление архива. Возвращает список (tag, ошибка) для неудачных записей."""
+        failures = super().close()
+        try:
+            self.archive.close()
+        except Exception as e:
+            logger.error(f"Ошибка записи архива: {e}")
+            failures.append((None, e))
+        return failures
 
-            digits = re.sub(r'\D', '', str(barcode_value).strip())
 
-            if len(digits) == 13:
-                digits = digits[:12]
-            if len(digits) != 12:
-                logger.warning(f"Штрихкод должен содержать 12 или 13 цифр, получено {len(digits)}: {digits} из {barcode_value}")
-                return False
+class DocumentCollector:
+    """
+    Заменяет PDFWriter в рабочем процессе, когда результат пишется в архив:
+    готовые PDF копятся и возвращаются родительскому процессу вместе с результатом порции.
+    """
 
-            # Создаем виджет штрихкода с включенными цифрами (векторный текст)
-            barcode_widget = eanbc.Ean13BarcodeWidget(digits)
-            barcode_widget.humanReadable = True  # Цифры под штрихкодом как векторный текст
+    def __init__(self):
+        self.documents = []
+
+    def submit(self, path: str, data: bytes, tag=None):
+        self.documents.append((path, data, tag))
+
+    def close(self) -> list:
+        return []
+
+
+# Листы для раскладки N-up по имени; рулон задается размером '<ширина>x<высота>' в мм
+SHEET_SIZES = {'a3': A3, 'a4': A4, 'a5': A5, 'a6': A6, 'letter': letter}
+
+
+def parse_sheet_size(spec: str) -> Tuple[float, float]:
+    """Размер листа раскладки в пунктах: имя из SHEET_SIZES или '<ширина>x<высота>' в мм."""
+    size = SHEET_SIZES.get(spec.strip().lower())
+    if size is not None:
+        return size
+    match = re.fullmatch(r'\s*(\d+(?:[.,]\d+)?)\s*[xх×*]\s*(\d+(?:[.,]\d+)?)\s*(?:mm|мм)?\s*', spec, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Неизвестный размер листа: {spec} (ожидается A4, A5, ... или ширина x высота в мм)")
+    width, height = (float(value.replace(',', '.')) * mm for value in match.groups())
+    return width, height
+
+
+class SheetLayout:
+    """
+    Раскладка N-up: ячейки размером с этикетку по центру листа, ряды сверху вниз,
+    с промежутком gutter между ячейками и метками реза по краю сетки.
+    """
+
+    def __init__(self, sheet_size: Tuple[float, float], cell_size: Tuple[float, float],
+                 gutter: float = Config.IMPOSE_GUTTER, crop_marks: bool = True):
+        sheet_width, sheet_height = sheet_size
+        cell_width, cell_height = cell_size
+        # Рулон шириной в этикетку печатается без полей (и без меток реза)
+        for margin in (Config.IMPOSE_MARGIN, 0):
+            columns = int((sheet_width - 2 * margin + gutter) // (cell_width + gutter))
+            rows = int((sheet_height - 2 * margin + gutter) // (cell_height + gutter))
+            if columns >= 1 and rows >= 1:
+                break
+        else:
+            raise ValueError(f"Этикетка {cell_width / mm:g}x{cell_height / mm:g} мм не помещается "
+                             f"на лист {sheet_width / mm:g}x{sheet_height / mm:g} мм")
+
+        self.sheet_size = sheet_size
+        self.cell_size = cell_size
+        self.crop_marks = crop_marks
+        self.left = (sheet_width - columns * cell_width - (columns - 1) * gutter) / 2
+        self.bottom = (sheet_height - rows * cell_height - (rows - 1) * gutter) / 2
+        self.xs = [self.left + column * (cell_width + gutter) for column in range(columns)]
+        self.ys = [self.bottom + (rows - 1 - row) * (cell_height + gutter) for row in range(rows)]
+        # Нижние левые углы ячеек в порядке заполнения
+        self.cells = [(x, y) for y in self.ys for x in self.xs]
+
+    def __str__(self):
+        return (f"{len(self.xs)}x{len(self.ys)} на листе "
+                f"{self.sheet_size[0] / mm:g}x{self.sheet_size[1] / mm:g} мм")
+
+    def draw_crop_marks(self, c: canvas.Canvas):
+        """Метки реза в полях листа напротив каждой границы ячеек."""
+        if not self.crop_marks:
+            return
+        cell_width, cell_height = self.cell_size
+        right = self.xs[-1] + cell_width
+        top = self.ys[0] + cell_height
+        offset = Config.CROP_MARK_OFFSET
+        # Метки не заходят за край листа
+        vertical = min(Config.CROP_MARK_LENGTH, self.bottom - offset)
+        horizontal = min(Config.CROP_MARK_LENGTH, self.left - offset)
+
+        c.saveState()
+        c.setLineWidth(0.25)
+        if vertical > 0:
+            for x in sorted(set(self.xs) | {x + cell_width for x in self.xs}):
+                c.line(x, self.bottom - offset, x, self.bottom - offset - vertical)
+                c.line(x, top + offset, x, top + offset + vertical)
+        if horizontal > 0:
+            for y in sorted(set(self.ys) | {y + cell_height for y in self.ys}):
+                c.line(self.left - offset, y, self.left - offset - horizontal, y)
+                c.line(right + offset, y, right + offset + horizontal, y)
+        c.restoreState()
+
+
+class PageDocument:
+    """
+    Многостраничный PDF (labels.pdf или marks.pdf) из страниц строк.
+    Страница строки рисуется один раз в form XObject и затем только размещается на странице
+    документа или в ячейках листа раскладки (layout) нужное число раз - копия стоит одну ссылку на форму.
+    """
+
+    def __init__(self, output: Union[str, BinaryIO], page_size: Tuple[float, float],
+                 layout: Optional[SheetLayout] = None):
+        self.page_size = page_size
+        self.layout = layout
+        self.canvas = LabelCanvas(output, pagesize=layout.sheet_size if layout is not None else page_size)
+        self.images = DocumentImages(self.canvas)
+        # Размещено страниц строк (для раскладки - ячеек)
+        self.pages = 0
+        self._cell = 0
+        self._forms = 0
+
+    def add(self, draw, copies: int = 1) -> bool:
+        """
+        Добавляет copies копий страницы строки, нарисованной draw(canvas, images).
+        Форма размещается только после успешного рисования: при ошибке недорисованная
+        форма остается в файле без ссылок на нее и не печатается.
+        """
+        c = self.canvas
+        name = f"DocumentPage{self._forms}"
+        self._forms += 1
+        c.beginForm(name, 0, 0, *self.page_size)
+        try:
+            draw(c, self.images)
+        except Exception as e:
+            if isinstance(e, RenderInterrupted):
+                raise
+            logger.error(f"Ошибка при рисовании страницы: {e}")
+            return False
+        finally:
+            c.endForm()
+
+        for _ in range(copies):
+            self.place(name)
+        return True
+
+    def place(self, name: str):
+        """Размещает готовую страницу-форму на отдельной странице или в следующей ячейке листа."""
+        c = self.canvas
+        if self.layout is None:
+            c.doForm(name)
+            c.showPage()
+            self.pages += 1
+            return
 
-            # Получаем естественные размеры виджета (включая цифры)
-            bounds = barcode_widget.getBounds()
-            bw = bounds[2] - bounds[0]
-            bh = bounds[3] - bounds[1]
-            if bw <= 0 or bh <= 0:
-                return False
+        if self._cell == 0:
+            self.layout.draw_crop_marks(c)
+        x, y = self.layout.cells[self._cell]
+        c.saveState()
+        c.translate(x, y)
+        c.doForm(name)
+        c.restoreState()
+        self.pages += 1
+        self._cell += 1
+        if self._cell == len(self.layout.cells):
+            c.showPage()
+            self._cell = 0
+
+    def save(self):
+        if self._cell:
+            self.canvas.showPage()
+        self.canvas.save()
+
+
+class ZPLDocument:
+    """
+    Поток команд ZPL для термопринтера (labels.zpl или marks.zpl) вместо PDF - тот же интерфейс,
+    что у PageDocument. Этикетка и марка рисуются теми же draw_label и draw_mark: документ
+    подменяет для них canvas (setFont, drawString, stringWidth) и DocumentImages (draw).
+    Текст - масштабируемым шрифтом принтера Config.ZPL_FONT в UTF-8 (^CW, ^CI28), штрихкод - командой ^BE,
+    изображения загружаются в память принтера один раз на поток (~DG) и печатаются ссылкой (^XG),
+    копии строки - количеством печати ^PQ.
+    """
+
+    # Имя, под которым шрифт font подключается в этикетке (^CW); без шрифта - встроенный 0
+    FONT_ALIAS = '1'
+
+    def __init__(self, output: Union[str, BinaryIO], page_size: Tuple[float, float], dpi: int = Config.ZPL_DPI,
+                 font: str = Config.ZPL_FONT):
+        self.output = output
+        self.page_size = page_size
+        # Точек принтера на пункт PDF
+        self.scale = dpi / 72
+        self.font = font
+        self._font_alias = self.FONT_ALIAS if font else '0'
+        self.commands = []
+        self.graphics = {}
+        self.pages = 0
+        self._label = []
+        self._uploads = []
+        self._font_size = 0
+
+    def _x(self, x: float) -> int:
+        return round(x * self.scale)
+
+    def _y(self, y: float) -> int:
+        # У PDF начало координат внизу, у ZPL - вверху
+        return round((self.page_size[1] - y) * self.scale)
 
-            # Вычисляем коэффициент масштабирования для сохранения пропорций
-            # Это гарантирует, что и штрихкод, и цифры масштабируются одинаково
-            scale_x = width / bw
-            scale_y = height / bh
-            scale = min(scale_x, scale_y)  # Сохраняем пропорции
-            
-            # Создаем векторный drawing с исходными размерами
-            # Все элементы (штрихкод + цифры) будут масштабироваться вместе
-            drawing = Drawing(bw, bh)
-            drawing.add(barcode_widget)
+    @staticmethod
+    def _field(text: str) -> str:
+        """Данные поля с экранированием управляющих символов ZPL (^FH)."""
+        return "^FH^FD" + str(text).replace('_', '_5F').replace('^', '_5E').replace('~', '_7E') + "^FS"
+
+    def setFont(self, font_name: str, font_size: float):
+        self._font_size = font_size
+
+    def stringWidth(self, text: str, font_name: str, font_size: float) -> float:
+        return pdfmetrics.stringWidth(text, font_name, font_size)
+
+    def drawString(self, x: float, y: float, text: str):
+        height = max(1, round(self._font_size * self.scale))
+        # ^FT - начало поля на базовой линии, как у drawString
+        self._label.append(f"^FT{self._x(x)},{self._y(y)}^A{self._font_alias}N,{height},{height}"
+                           f"{self._field(text)}")
+
+    def draw(self, key, image: ImageReader, x: float, y: float, width: float, height: float, mask=None):
+        """Печатает изображение, загружая его в принтер при первом использовании в потоке."""
+        size = (max(1, self._x(width)), max(1, round(height * self.scale)))
+        name = self.graphics.get((key, size))
+        if name is None:
+            name = f"R:LMG{len(self.graphics):04d}.GRF"
+            self._uploads.append(self._upload(name, image, size))
+            self.graphics[(key, size)] = name
+        self._label.append(f"^FO{self._x(x)},{self._y(y + height)}^XG{name},1,1^FS")
+
+    @staticmethod
+    def _upload(name: str, image: ImageReader, size: Tuple[int, int]) -> str:
+        """Команда ~DG: изображение в 1 бит на точку, черные точки - единицы."""
+        picture = getattr(image, '_image', None)
+        if picture is None:
+            picture = Image.frombytes('RGB', image.getSize(), image.getRGBData())
+        if picture.mode in ('RGBA', 'LA', 'P'):
+            picture = picture.convert('RGBA')
+            background = Image.new('RGBA', picture.size, (255, 255, 255, 255))
+            picture = Image.alpha_composite(background, picture)
+        picture = picture.convert('L').resize(size, Image.Resampling.LANCZOS).convert('1')
+        bits = ImageOps.invert(picture.convert('L')).convert('1', dither=Image.Dither.NONE).tobytes()
+        bytes_per_row = (size[0] + 7) // 8
+        return f"~DG{name},{len(bits)},{bytes_per_row},{bits.hex().upper()}"
+
+    def draw_ean13_barcode(self, barcode_value: str, x: float, y: float, width: float, height: float,
+                           barcode_status: Optional[str] = None) -> bool:
+        """Штрихкод EAN-13 командой принтера ^BE: ширина модуля подбирается под ширину поля."""
+        if not barcode_value:
+            return False
+        if barcode_status is None:
+            (barcode_value,), (barcode_status,) = normalize_barcodes([barcode_value])
+        if barcode_status not in BARCODE_PRINTABLE:
+            return False
+        # 95 модулей штрихкода, цифры под штрихкодом занимают около четверти высоты
+        module = max(1, self._x(width) // 95)
+        bar_height = max(1, round(height * self.scale * 0.75))
+        self._label.append(f"^FO{self._x(x)},{self._y(y + height)}^BY{module}"
+                           f"^BEN,{bar_height},Y,N^FD{barcode_value[:12]}^FS")
+        return True
+
+    def add(self, draw, copies: int = 1) -> bool:
+        """Добавляет этикетку, нарисованную draw(документ, документ), с печатью copies копий."""
+        self._label = []
+        self._uploads = []
+        try:
+            draw(self, self)
+        except Exception as e:
+            if isinstance(e, RenderInterrupted):
+                raise
+            logger.error(f"Ошибка при рисовании страницы: {e}")
+            return False
+        finally:
+            # Загруженные изображения уже учтены в graphics - команды загрузки нужны и без этикетки
+            self.commands.extend(self._uploads)
+
+        font = f"^CW{self.FONT_ALIAS},{self.font}" if self.font else ""
+        self.commands.append(f"^XA^CI28{font}^PW{self._x(self.page_size[0])}"
+                             f"^LL{round(self.page_size[1] * self.scale)}"
+                             f"^LH0,0{''.join(self._label)}^PQ{copies}^XZ")
+        self.pages += copies
+        return True
+
+    def save(self):
+        data = ("\n".join(self.commands) + "\n").encode('utf-8')
+        if isinstance(self.output, str):
+            with open(self.output, 'wb') as f:
+                f.write(data)
+        else:
+            self.output.write(data)
+
+
+class CombinedGenerator:
+    def __init__(self, workers: int = Config.WORKERS, chunk_size: int = Config.CHUNK_SIZE,
+                 executor: str = Config.EXECUTOR, stream_rows: int = Config.STREAM_ROWS,
+                 shard: Optional[str] = Config.SHARD, row_time_budget: float = Config.ROW_TIME_BUDGET,
+                 parse_cache_dir: Optional[str] = Config.PARSE_CACHE_DIR, dry_run: bool = False,
+                 combined: bool = False, split_pages: int = Config.SPLIT_PAGES,
+                 impose: Optional[str] = Config.IMPOSE_SHEET, gutter: float = Config.IMPOSE_GUTTER,
+                 crop_marks: bool = True, output_format: str = Config.OUTPUT_FORMAT, zpl_dpi: int = Config.ZPL_DPI):
+        self.mark_generator = MarkGenerator()
+        self.label_generator = PDFLabelGenerator()
+        if parse_cache_dir:
+            self.label_generator.parse_cache = ParsedTableCache(parse_cache_dir)
+        self.logger = Log(token=TOKEN, silent_errors=True)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        if executor not in ('auto', 'serial', 'process', 'thread'):
+            raise ValueError(f"Неизвестный режим выполнения: {executor}")
+        self.executor = executor
+        if shard not in (None, 'brand', 'hash'):
+            raise ValueError(f"Неизвестная раскладка по подпапкам: {shard}")
+        self.shard = shard
+        self.stream_rows = max(0, stream_rows)
+        self.row_time_budget = max(0, row_time_budget)
+        # Пробный прогон: вместо PDF - отчет предварительной проверки (preflight_files)
+        self.dry_run = dry_run
+        # Многостраничный вывод: labels.pdf и marks.pdf на файл вместо PDF на строку (_job_tasks, render_document)
+        if output_format not in ('pdf', 'zpl'):
+            raise ValueError(f"Неизвестный формат вывода: {output_format}")
+        if output_format == 'zpl' and impose is not None:
+            raise ValueError("Раскладка на листы применяется только к PDF: термопринтер печатает этикетки по одной")
+        # ZPL - поток команд принтера на файл: разрешение принтера или None для PDF
+        self.zpl_dpi = zpl_dpi if output_format == 'zpl' else None
+        self.combined = combined or impose is not None or self.zpl_dpi is not None
+        self.split_pages = max(0, split_pages)
+        # Раскладка N-up этикеток и марок на листы (включает многостраничный вывод)
+        self.layouts = None
+        if impose is not None:
+            sheet_size = parse_sheet_size(impose)
+            self.layouts = {
+                'labels': SheetLayout(sheet_size, (self.label_generator.page_width, self.label_generator.page_height),
+                                      gutter, crop_marks),
+                'marks': SheetLayout(sheet_size, Config.PAGE_SIZE, gutter, crop_marks),
+            }
+        self.cancel_token = CancellationToken()
+        # Архив, в который рендерится текущее задание write_archive (None - файлы в output_dir)
+        self.archive: Optional[ArchiveWriter] = None
+        # Постоянный прогретый пул процессов (режим демона); None - пул создается на задание
+        self.pool = None
+
+    def normalize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.label_generator.normalize_columns(df)
+
+    def cancel(self):
+        """Запрашивает остановку текущего задания: оно вернет частичный результат."""
+        self.cancel_token.cancel()
+
+    def reset_cancellation(self):
+        """Новый флаг отмены для следующего задания (постоянный пул демона хранит свой)."""
+        if self.cancel_token.cancelled and self.pool is None:
+            self.cancel_token = CancellationToken()
+
+    def warm_up(self):
+        """
+        Заранее регистрирует шрифты и декодирует изображения марки, логотипов и значков,
+        уменьшенные до разрешения печати: строки потом только ссылаются на готовые изображения.
+        """
+        register_fonts()
+        self.mark_generator.get_mark_image()
+
+        logo_dir = "LabelsMarksGenerator/img/logos"
+        if os.path.isdir(logo_dir):
+            for file_name in os.listdir(logo_dir):
+                logo_name, ext = os.path.splitext(file_name)
+                if ext.lower() in IMAGE_EXTENSIONS:
+                    self.mark_generator.get_logo_image(logo_name.lower())
+                    self.label_generator.get_logo_image(logo_name.lower())
+
+        for certification_type in ('рст', 'eac'):
+            cert_icon_path = self.label_generator.get_certification_icon(certification_type)
+            if cert_icon_path:
+                size = self.label_generator.cert_sign_size
+                ResourceManager.get_print_image(cert_icon_path, size, size)
+
+    def read_excel(self, file_path: str) -> Optional[pd.DataFrame]:
+        return self.label_generator.read_excel(file_path)
+
+    def prepare_rows(self, df: pd.DataFrame) -> List[Tuple[int, ProductRecord, str]]:
+        """Готовит строки DataFrame к рендерингу: (индекс, запись, базовое имя файла)."""
+        return self.prepare_records(ProductRecord.from_frame(df))
+
+    def prepare_records(self, records: Iterable[Tuple[int, ProductRecord]]) -> List[Tuple[int, ProductRecord, str]]:
+        """
+        Готовит записи к рендерингу: (индекс, запись, базовое имя файла).
+        Штрихкоды всех строк нормализуются и проверяются до рендеринга (normalize_barcodes).
+        """
+        rows = []
+        for idx, record in records:
+            prepared = self._prepare_row(idx, record)
+            if prepared is not None:
+                rows.append(prepared)
+
+        barcodes, statuses = normalize_barcodes(record.barcode for _, record, _ in rows)
+        invalid = []
+        for (idx, record, base_filename), barcode, status in zip(rows, barcodes, statuses):
+            if status not in ('ok', 'computed', 'empty'):
+                invalid.append((idx, base_filename, f"штрихкод {record.barcode}: {BARCODE_STATUSES[status]}"))
+            record.barcode = barcode
+            record.barcode_status = status
+        self._log_barcodes(invalid)
+        if self.combined:
+            self._log_copies(rows)
+
+        return rows
+
+    def _log_barcodes(self, invalid: list):
+        if not invalid:
+            return
+        preview = "; ".join(f"строка {idx + 1} ({name}): {reason}" for idx, name, reason in invalid[:10])
+        more = f" и еще {len(invalid) - 10}" if len(invalid) > 10 else ""
+        self.logger.warning(f"Штрихкоды с ошибками: {len(invalid)}. {preview}{more}")
+
+    def _log_copies(self, rows: List[Tuple[int, ProductRecord, str]]):
+        """Предупреждает о строках с ошибкой в колонке "копии": они печатаются в одном экземпляре."""
+        invalid = [(idx, name, row_data.copies) for idx, row_data, name in rows
+                   if copies_count(row_data.copies) is None]
+        if not invalid:
+            return
+        preview = "; ".join(f"строка {idx + 1} ({name}): {value!r}" for idx, name, value in invalid[:10])
+        more = f" и еще {len(invalid) - 10}" if len(invalid) > 10 else ""
+        self.logger.warning(f"Ошибки в числе копий: {len(invalid)}, печатается одна копия. {preview}{more}")
+
+    @staticmethod
+    def _prepare_row(idx: int, record: ProductRecord) -> Optional[Tuple[int, ProductRecord, str]]:
+        """Готовит одну строку: None для строк без наименования."""
+        if not record.name:
+            return None
+
+        article = str(record.article).strip()
+        code = str(record.code).strip()
+        article_clean = re.sub(r'[\\/*?:"<>|]', "_", article)
+        code_clean = re.sub(r'[\\/*?:"<>|]', "_", code)
+
+        base_filename = f"{article_clean}_{code_clean}" if article_clean or code_clean else f"row_{idx}"
+        return idx, record, base_filename
+
+    @staticmethod
+    def shard_name(row_data: ProductRecord, base_filename: str, shard: Optional[str]) -> str:
+        """Имя подпапки для строки: по логотипу (brand) или по префиксу хэша имени файла (hash)."""
+        if shard == 'brand':
+            brand = re.sub(r'[\\/*?:"<>|]', "_", str(row_data.logo).strip().lower()).strip('. ')
+            return brand or "_"
+        if shard == 'hash':
+            return hashlib.md5(base_filename.encode('utf-8')).hexdigest()[:2]
+        return ""
+
+    def render_row(self, row_data: ProductRecord, base_filename: str,
+                   shard: Optional[str] = None) -> List[Tuple[str, str, Optional[bytes]]]:
+        """
+        Рендерит марку и этикетку одной строки в память.
+        Возвращает [(вид, относительное имя, байты PDF или None при ошибке)],
+        имена вида 'marks/mark_<имя>.pdf' и 'labels/label_<имя>.pdf' (с подпапкой shard).
+        """
+        shard_dir = self.shard_name(row_data, base_filename, shard)
+        documents = []
+
+        mark_buffer = BytesIO()
+        mark_ok = self.mark_generator.generate_pdf(row_data, mark_buffer)
+        documents.append(('marks', posixpath.join("marks", shard_dir, f"mark_{base_filename}.pdf"),
+                          mark_buffer.getvalue() if mark_ok else None))
+
+        label_buffer = BytesIO()
+        label_ok = self.label_generator.create_label_pdf(row_data, label_buffer)
+        documents.append(('labels', posixpath.join("labels", shard_dir, f"label_{base_filename}.pdf"),
+                          label_buffer.getvalue() if label_ok else None))
+
+        return documents
+
+    def iter_documents(self, rows: Iterable[Union[Dict, ProductRecord]], shard: Optional[str] = None) -> Iterator[Tuple[str, bytes]]:
+        """
+        Лениво рендерит строки и отдает пары (относительное имя, байты PDF), ничего не записывая на диск.
+        Ключи строк приводятся к стандартным именам колонок, как при чтении Excel
+        (вместо словарей можно передавать ProductRecord).
+        Строки без наименования пропускаются, ошибки рендеринга логируются.
+        Учитываются флаг отмены и лимит времени на строку генератора.
+        """
+        for idx, raw_row in enumerate(rows):
+            if self.cancel_token.cancelled:
+                self.logger.warning("Обработка отменена")
+                return
+
+            prepared = self._prepare_row(idx, ProductRecord.from_mapping(raw_row))
+            if prepared is None:
+                continue
+            _, row_data, base_filename = prepared
+
+            # Контекст строки выставляется только на время рендеринга: между yield
+            # потребитель может работать в этом же потоке
+            _row_context.token = self.cancel_token
+            _row_context.deadline = (time.monotonic() + self.row_time_budget
+                                     if self.row_time_budget > 0 else None)
+            try:
+                documents = self.render_row(row_data, base_filename, shard)
+            except RowTimeoutError:
+                self._log_failures([(idx, base_filename,
+                                     f"превышен лимит времени на строку ({self.row_time_budget} с)")])
+                continue
+            except JobCancelledError:
+                self.logger.warning("Обработка отменена")
+                return
+            finally:
+                _row_context.token = None
+                _row_context.deadline = None
+
+            for kind, name, data in documents:
+                if data is None:
+                    self._log_failures([(idx, base_filename,
+                                         "марка не создана" if kind == 'marks' else "этикетка не создана")])
+                else:
+                    yield name, data
+
+    def render_rows(self, rows: List[Tuple[int, ProductRecord, str]], output_dir: str,
+                    total_rows: Optional[int] = None, shard: Optional[str] = None,
+                    row_time_budget: float = 0, cancel_token: Optional[CancellationToken] = None,
+                    writer: Optional[PDFWriter] = None) -> Dict:
+        """
+        Рендерит марки и этикетки для списка подготовленных строк.
+        PDF строятся в памяти и записываются на диск отдельным потоком PDFWriter,
+        поэтому рендеринг не ждет файловую систему.
+        Возвращает счетчики успешно созданных файлов и список неудачных строк.
+        Если передан total_rows, прогресс логируется каждые 25 записей.
+        shard раскладывает файлы по подпапкам labels/ и marks/ (см. shard_name).
+        Строка, не уложившаяся в row_time_budget секунд, пропускается и попадает в ошибки;
+        после отмены cancel_token возвращается частичный результат с флагом cancelled.
+        writer - общий получатель PDF (архив задания write_archive, DocumentCollector рабочего процесса),
+        его закрывает владелец; по умолчанию файлы пишет собственный PDFWriter в output_dir.
+        """
+        success_count_marks = 0
+        success_count_labels = 0
+        failures = []
+        cancelled = False
+
+        shared_writer = writer if writer is not None else self.archive
+        writer = shared_writer if shared_writer is not None else PDFWriter()
+        _row_context.token = cancel_token
+        try:
+            for idx, row_data, base_filename in rows:
+                if cancel_token is not None and cancel_token.cancelled:
+                    cancelled = True
+                    break
+
+                _row_context.deadline = time.monotonic() + row_time_budget if row_time_budget > 0 else None
+
+                try:
+                    for kind, name, data in self.render_row(row_data, base_filename, shard):
+                        if data is None:
+                            failures.append((idx, base_filename,
+                                             "марка не создана" if kind == 'marks' else "этикетка не создана"))
+                            continue
+                        writer.submit(os.path.join(output_dir, *name.split('/')), data, (idx, base_filename, kind))
+                        if kind == 'marks':
+                            success_count_marks += 1
+                        else:
+                            success_count_labels += 1
+                except RowTimeoutError:
+                    failures.append((idx, base_filename, f"превышен лимит времени на строку ({row_time_budget} с)"))
+                except JobCancelledError:
+                    cancelled = True
+                    break
+
+                # Логируем прогресс каждые 25 записей или на последней записи
+                if total_rows is not None:
+                    current_progress = idx + 1
+                    if current_progress % 25 == 0 or current_progress == total_rows:
+                        self.logger.info(f"Обработано {current_progress} из {total_rows} записей")
+        finally:
+            _row_context.token = None
+            _row_context.deadline = None
+            write_failures = writer.close() if shared_writer is None else []
 
-            # Масштабируем весь drawing (штрихкод + цифры) пропорционально
-            # При изменении размера PDF все будет масштабироваться вместе
-            drawing.scale(scale, scale)
+        for (idx, base_filename, kind), error in write_failures:
+            if kind == 'marks':
+                success_count_marks -= 1
+            else:
+                success_count_labels -= 1
+            failures.append((idx, base_filename, f"ошибка записи файла: {error}"))
 
-            # Рисуем на canvas - координаты в мм, поэтому масштабируются вместе с PDF
-            # Цифры остаются векторным текстом и масштабируются вместе со штрихкодом
-            renderPDF.draw(drawing, canvas_obj, x, y)
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка при рисовании векторного штрихкода: {e}")
-            return False
+        return {'marks': success_count_marks, 'labels': success_count_labels, 'failures': failures,
+                'cancelled': cancelled}
 
-    def get_logo_image(self, logo_name: str) -> Optional[ImageReader]:
-        if not logo_name:
-            return None
+    def render_document(self, rows: Iterable[Tuple[int, ProductRecord, str]], output_dir: str,
+                        part: Optional[int] = None, total_rows: Optional[int] = None,
+                        row_time_budget: float = 0, cancel_token: Optional[CancellationToken] = None,
+                        layouts: Optional[Dict[str, SheetLayout]] = None,
+                        writer: Optional[PDFWriter] = None, zpl_dpi: Optional[int] = None) -> Dict:
+        """
+        Рендерит строки в один многостраничный labels.pdf и один marks.pdf - по странице на строку
+        или, с раскладкой layouts ({'labels': ..., 'marks': ...}), по ячейке листа.
+        Строка печатается столько раз, сколько указано в колонке "копии" (copies_count),
+        но рисуется один раз: копии ссылаются на ту же форму.
+        part - номер части документа: labels_0001.pdf и marks_0001.pdf.
+        zpl_dpi - вместо PDF писать labels.zpl и marks.zpl для термопринтера с этим разрешением (ZPLDocument).
+        Шрифты встраиваются в каждый документ один раз, изображения - через DocumentImages.
+        Счетчики, ошибки, лимит времени на строку, отмена и writer - как в render_rows.
+        rows может быть итератором: строки рисуются по мере получения (CombinedGenerator._stream_document).
+        """
+        suffix = '' if part is None else f"_{part:04d}"
+        layouts = layouts or {}
+        writer = writer if writer is not None else self.archive
+        extension = 'pdf' if zpl_dpi is None else 'zpl'
+        paths = {kind: os.path.join(output_dir, f"{kind}{suffix}.{extension}") for kind in ('labels', 'marks')}
+        # Для архива документ собирается в памяти и отдается writer целиком
+        outputs = {kind: path if writer is None else BytesIO() for kind, path in paths.items()}
+        page_sizes = {'labels': (self.label_generator.page_width, self.label_generator.page_height),
+                      'marks': Config.PAGE_SIZE}
+        if zpl_dpi is None:
+            documents = {kind: PageDocument(outputs[kind], page_sizes[kind], layouts.get(kind)) for kind in paths}
+        else:
+            documents = {kind: ZPLDocument(outputs[kind], page_sizes[kind], zpl_dpi) for kind in paths}
+        failures = []
+        cancelled = False
+        first_idx = None
 
-        logo_dir = "LabelsMarksGenerator/img/logos"
-        extensions = ['.png', '.jpg', '.jpeg', '.bmp']
+        _row_context.token = cancel_token
+        try:
+            for idx, row_data, base_filename in rows:
+                if first_idx is None:
+                    first_idx = idx
+                if cancel_token is not None and cancel_token.cancelled:
+                    cancelled = True
+                    break
 
-        for ext in extensions:
-            logo_path = os.path.join(logo_dir, f"{logo_name}{ext}")
-            if os.path.exists(logo_path):
-                try:
-                    return ImageReader(logo_path)
-                except Exception as e:
+                # Ошибочное число копий - одна копия (см. _log_copies), 0 - строка не печатается
+                copies = copies_count(row_data.copies)
+                copies = 1 if copies is None else copies
+                if not copies:
                     continue
 
-        return None
+                _row_context.deadline = time.monotonic() + row_time_budget if row_time_budget > 0 else None
 
-    def get_certification_icon(self, certification_type: str) -> Optional[str]:
-        if not certification_type:
-            return None
+                try:
+                    # Этикетка первой: лимит времени проверяется при ее раскладке, до того как
+                    # марка строки попадет в документ
+                    pages = (
+                        ('labels', lambda c, images: self.label_generator.draw_label(
+                            c, self.label_generator.layout_label(row_data)[0], images)),
+                        ('marks', lambda c, images: self.mark_generator.draw_mark(c, row_data, images)),
+                    )
+                    for kind, draw in pages:
+                        if not documents[kind].add(draw, copies):
+                            failures.append((idx, base_filename,
+                                             "марка не создана" if kind == 'marks' else "этикетка не создана"))
+                except RowTimeoutError:
+                    failures.append((idx, base_filename, f"превышен лимит времени на строку ({row_time_budget} с)"))
+                except JobCancelledError:
+                    cancelled = True
+                    break
 
-        cert_dir = "LabelsMarksGenerator/img/certificates"
-        os.makedirs(cert_dir, exist_ok=True)
+                if total_rows is not None:
+                    current_progress = idx + 1
+                    if current_progress % 25 == 0 or current_progress == total_rows:
+                        self.logger.info(f"Обработано {current_progress} из {total_rows} записей")
+        finally:
+            _row_context.token = None
+            _row_context.deadline = None
+
+        counts = {}
+        for kind, document in documents.items():
+            counts[kind] = document.pages
+            # Документ без единой страницы не создается
+            if not document.pages:
+                continue
+            try:
+                document.save()
+            except OSError as e:
+                failures.append((first_idx, os.path.basename(paths[kind]), f"ошибка записи файла: {e}"))
+                counts[kind] = 0
+                continue
+            if writer is not None:
+                writer.submit(paths[kind], outputs[kind].getvalue(), (first_idx, os.path.basename(paths[kind]), kind))
 
-        cert_type_lower = str(certification_type).lower().strip()
+        return {'marks': counts['marks'], 'labels': counts['labels'], 'failures': failures, 'cancelled': cancelled}
 
-        if cert_type_lower in ['рст', 'rct', 'rst']:
-            possible_paths = [
-                os.path.join(cert_dir, "рст.png"),
-                os.path.join(cert_dir, "rct.png"),
-                os.path.join(cert_dir, "rst.png"),
-                os.path.join(cert_dir, "рст.jpg"),
-                os.path.join(cert_dir, "rct.jpg"),
-                os.path.join(cert_dir, "rst.jpg")
-            ]
-        elif cert_type_lower in ['eac', 'еас']:
-            possible_paths = [
-                os.path.join(cert_dir, "eac.png"),
-                os.path.join(cert_dir, "еас.png"),
-                os.path.join(cert_dir, "eac.jpg"),
-                os.path.join(cert_dir, "еас.jpg")
-            ]
-        else:
-            return None
+    @staticmethod
+    def _split_chunks(rows: list, workers: int, chunk_size: int) -> List[list]:
+        """Делит строки на порции так, чтобы загрузить все процессы пула."""
+        chunk_size = max(1, min(chunk_size, -(-len(rows) // workers)))
+        return [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
 
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
+    def _log_failures(self, failures: list):
+        if not failures:
+            return
+        failures.sort(key=lambda failure: failure[0])
+        preview = "; ".join(f"строка {idx + 1} ({name}): {reason}" for idx, name, reason in failures[:10])
+        more = f" и еще {len(failures) - 10}" if len(failures) > 10 else ""
+        self.logger.warning(f"Ошибки рендеринга: {len(failures)}. {preview}{more}")
 
-        return None
+    def _make_output_dirs(self, output_dir: str):
+        if self.archive is not None:
+            return
+        os.makedirs(output_dir, exist_ok=True)
+        if self.combined:
+            # Документы пишутся прямо в папку задания
+            return
+        os.makedirs(os.path.join(output_dir, "marks"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "labels"), exist_ok=True)
 
-    def create_label_pdf(self, data: Dict, output_path: str) -> bool:
-        try:
-            c = canvas.Canvas(output_path, pagesize=(self.page_width, self.page_height))
-
-            # Регистрируем шрифты с fallback на стандартные
-            font_large_bold, font_medium_bold, font_medium, font_small = self._get_fonts()
-
-            large_font_size = 5
-            medium_font_size = 4
-            small_font_size = 3
-
-            line_height = 1.6 * mm
-            field_spacing = 0.3 * mm
-
-            name = data.get('наименование', '')
-            purpose = data.get('назначение', '')
-            material = data.get('материал', '')
-            manufacturer = data.get('производитель', '')
-            importer = data.get('импортер', '')
-            country = data.get('страна происхождения', '')
-            production_date = data.get('дата изготовления', '')
-            code = data.get('код', '')
-            article = data.get('артикул', '')
-            barcode_value = data.get('штрихкод', '')
-            certification = data.get('сертификация', '')
-            certification_type = data.get('тип сертификации', '')
-
-            logo_name = data.get('лого', '').strip().lower()
-            logo_img = self.get_logo_image(logo_name)
-            has_logo = logo_img is not None
+    def sheets(self, file_path: str) -> List[Optional[str]]:
+        """Листы файла как отдельные задания; [None] - единственный лист, вывод без подпапки листа."""
+        names = self.label_generator.sheet_names(file_path)
+        return names if len(names) > 1 else [None]
 
-            if has_logo:
-                try:
-                    logo_x = self.page_width - self.logo_width - 1 * mm
-                    logo_y = self.page_height - self.logo_height
-                    c.drawImage(logo_img, logo_x, logo_y, self.logo_width, self.logo_height)
-                except Exception as e:
-                    pass
+    @staticmethod
+    def sheet_output_dir(output_dir: str, sheet: Optional[str]) -> str:
+        """Папка вывода листа: у многолистовой книги PDF группируются по подпапкам листов."""
+        if sheet is None:
+            return output_dir
+        return os.path.join(output_dir, re.sub(r'[\\/*?:"<>|]', "_", sheet).strip('. ') or "_")
 
-            x_position = 1 * mm
-            y_position = self.page_height - 2 * mm
+    @staticmethod
+    def _source_name(excel_file_path: str, sheet: Optional[str]) -> str:
+        name = os.path.basename(excel_file_path)
+        return name if sheet is None else f"{name}, лист «{sheet}»"
 
-            if name:
-                if has_logo:
-                    text_width_for_name = (self.page_width - self.logo_width - 3 * mm)
+    @staticmethod
+    def _file_results(paths: List[str], sheet_results: Dict) -> Dict[str, bool]:
+        """Файл обработан, если обработан хотя бы один его лист."""
+        return {path: any(success for (sheet_path, _), success in sheet_results.items() if sheet_path == path)
+                for path in paths}
+
+    def _load_rows(self, excel_file_path: str, sheet: Optional[str] = None) -> Optional[Tuple[int, list]]:
+        """Читает файл (лист sheet) и готовит строки. Возвращает (всего строк, строки) или None."""
+        started = time.monotonic()
+        try:
+            records = self.label_generator.read_records(excel_file_path, sheet)
+            if not records:
+                if sheet is None:
+                    self.logger.error("No data found in Excel file")
                 else:
-                    text_width_for_name = self.page_width - 2 * mm
-
-                lines_beside_logo = self.wrap_text(name, font_large_bold, large_font_size,
-                                                   text_width_for_name, c)
-
-                lines_used = 0
-                for i, line in enumerate(lines_beside_logo):
-                    current_y = y_position - (i * line_height)
-                    if has_logo and current_y > (self.page_height - self.logo_height):
-                        c.setFont(font_large_bold, large_font_size)
-                        c.drawString(x_position, current_y, line)
-                        lines_used += 1
-                    elif not has_logo:
-                        c.setFont(font_large_bold, large_font_size)
-                        c.drawString(x_position, current_y, line)
-                        lines_used += 1
-                    else:
-                        break
+                    self.logger.warning(f"{self._source_name(excel_file_path, sheet)}: нет данных")
+                return None
+            total_rows = records[-1][0] + 1
+            if sheet is not None:
+                self.logger.info(f"{self._source_name(excel_file_path, sheet)}: прочитано {total_rows} строк "
+                                 f"за {time.monotonic() - started:.1f} с")
+            return total_rows, self.prepare_records(records)
+        except Exception as e:
+            self.logger.error(f"Ошибка при формировании запроса: {e}")
+            return None
 
-                next_line_y = y_position - (lines_used * line_height)
+    def _finish_file(self, result: Dict, sheet_summary: Optional[str] = None) -> bool:
+        success_count_marks = result['marks']
+        success_count_labels = result['labels']
+        self._log_failures(result['failures'])
+        if result.get('cancelled'):
+            self.logger.warning("Обработка отменена, результат неполный")
+
+        # Финальное сообщение о результатах
+        if sheet_summary is None:
+            self.logger.info(f"Обработано файлов: 1, создано этикеток: {success_count_labels}, "
+                             f"марок: {success_count_marks}")
+        else:
+            self.logger.info(f"{sheet_summary}: создано этикеток: {success_count_labels}, марок: {success_count_marks}")
 
-                if has_logo and lines_used < len(lines_beside_logo):
-                    remaining_text = ' '.join(
-                        name.split()[sum(len(line.split()) for line in lines_beside_logo[:lines_used]):])
+        return success_count_marks > 0 or success_count_labels > 0
 
-                    if remaining_text:
-                        full_width = self.page_width - 2 * mm
-                        remaining_lines = self.wrap_text(remaining_text, font_large_bold, large_font_size,
-                                                         full_width, c)
+    def _sheet_summary(self, excel_file_path: str, sheet: Optional[str], row_count: int,
+                       started: float) -> Optional[str]:
+        """Строка отчета по листу многолистовой книги: записи и время рендеринга."""
+        if sheet is None:
+            return None
+        return (f"{self._source_name(excel_file_path, sheet)} ({row_count} записей, "
+                f"{time.monotonic() - started:.1f} с)")
 
-                        start_y = next_line_y
+    def process_excel_file(self, excel_file_path: str, output_dir: str = "output"):
+        return self.process_excel_files([excel_file_path], output_dir)[excel_file_path]
 
-                        for j, line in enumerate(remaining_lines):
-                            if start_y - (j * line_height) < 15 * mm:
-                                break
-                            c.setFont(font_large_bold, large_font_size)
-                            c.drawString(x_position, start_y - (j * line_height), line)
+    def _plan(self, pending_reads: Dict) -> 'ExecutionPlan':
+        """
+        Выбирает режим выполнения: фиксированный из настроек или через планировщик.
+        Планировщик строит план один раз по первому прочитанному заданию, а общий объем
+        оценивает по заголовкам остальных файлов, не дожидаясь их чтения.
+        """
+        if self.executor != 'auto':
+            return self._plan_rows([])
+
+        remaining = set(pending_reads)
+        while remaining:
+            done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+            loaded = next((future.result() for future in done if future.result()), None)
+            if loaded is None:
+                continue
+            rows = loaded[1]
+            total_rows = len(rows)
+            for future, (path, sheet) in pending_reads.items():
+                if future.done():
+                    if future.result() and future.result()[1] is not rows:
+                        total_rows += len(future.result()[1])
+                    continue
+                try:
+                    total_rows += self._estimate_rows(path, sheet) or 0
+                except Exception as e:
+                    self.logger.warning(f"{self._source_name(path, sheet)}: не удалось оценить число строк: {e}")
+            return self._plan_rows(rows, total_rows)
+        return self._plan_rows([])
+
+    def _plan_rows(self, rows: list, total_rows: Optional[int] = None) -> 'ExecutionPlan':
+        if self.executor == 'auto':
+            return ExecutionPlanner(self, self.workers).plan(rows, total_rows)
+        if self.executor == 'serial' or self.workers <= 1:
+            return ExecutionPlan('serial', 1, self.chunk_size)
+        return ExecutionPlan(self.executor, self.workers, self.chunk_size)
+
+    def process_excel_files(self, excel_file_paths: List[str], output_dir: str = "output") -> Dict[str, bool]:
+        """
+        Обрабатывает несколько Excel файлов одновременно с общим бюджетом процессов.
+        Каждый лист многолистовой книги - отдельное задание с подпапкой вывода (sheet_output_dir).
+        Файлы и листы читаются параллельно (сначала меньшие файлы), а порции строк разных заданий
+        отправляются в общий пул по очереди, поэтому маленький файл не ждет
+        окончания большого. Режим выполнения выбирается через _plan.
+        В многостраничном режиме (combined) задачи пула - документы файлов или их части (_job_tasks).
+        ZIP-архивы обрабатываются по одному через process_archive.
+        Возвращает результат обработки для каждого файла.
+        """
+        archives = [path for path in excel_file_paths if is_archive(path)]
+        if archives:
+            results = self.process_excel_files([path for path in excel_file_paths if not is_archive(path)],
+                                               output_dir)
+            for archive_path in archives:
+                results[archive_path] = self.process_archive(archive_path, output_dir)
+            return results
+
+        if self.dry_run:
+            return self.preflight_files(excel_file_paths, output_dir)
+
+        ordered_paths = sorted(excel_file_paths, key=_file_size)
+        if not ordered_paths:
+            return {}
+        sources = [(path, sheet) for path in ordered_paths for sheet in self.sheets(path)]
+        sheet_results = {}
+        if self.layouts is not None:
+            self.logger.info(f"Раскладка этикеток: {self.layouts['labels']}, марок: {self.layouts['marks']}")
+        if self.zpl_dpi is not None:
+            self.logger.info(f"Вывод ZPL для термопринтера {self.zpl_dpi} dpi")
+
+        if self.stream_rows:
+            # Режим ограниченной памяти: файлы и листы по одному, каждый порциями
+            for path, sheet in sources:
+                sheet_results[(path, sheet)] = self._process_streaming(
+                    path, self._job_output_dir(output_dir, path, sheet), sheet)
+            return self._file_results(ordered_paths, sheet_results)
+
+        started = time.monotonic()
+        rendered_rows = 0
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(sources))) as readers:
+            pending_reads = {readers.submit(self._load_rows, path, sheet): (path, sheet) for path, sheet in sources}
+
+            plan = self._plan(pending_reads)
+            self.logger.info(f"План выполнения: {plan}")
+
+            if plan.strategy == 'serial':
+                for future, (path, sheet) in pending_reads.items():
+                    loaded = future.result()
+                    if loaded is None or self.cancel_token.cancelled:
+                        sheet_results[(path, sheet)] = False
+                        continue
+                    total_rows, rows = loaded
+                    sheet_dir = self._job_output_dir(output_dir, path, sheet)
+                    sheet_started = time.monotonic()
+                    try:
+                        self._make_output_dirs(sheet_dir)
+                        result = {'marks': 0, 'labels': 0, 'failures': []}
+                        for task_rows, task_args in self._job_tasks(rows):
+                            _merge_result(result, self._render_task(task_rows, sheet_dir, *task_args,
+                                                                    total_rows=total_rows))
+                        sheet_results[(path, sheet)] = self._finish_file(
+                            result, self._sheet_summary(path, sheet, len(rows), sheet_started))
+                        rendered_rows += len(rows)
+                    except Exception as e:
+                        self.logger.error(f"Ошибка при формировании запроса: {e}")
+                        sheet_results[(path, sheet)] = False
+            else:
+                rendered_rows = self._run_pool(plan, pending_reads, output_dir, sheet_results)
 
-                        y_position = start_y - len(remaining_lines) * line_height - field_spacing
-                    else:
-                        y_position = next_line_y - field_spacing
-                else:
-                    y_position = next_line_y - field_spacing
+        elapsed = time.monotonic() - started
+        if rendered_rows and elapsed > 0:
+            self.logger.info(f"Фактическая скорость: {rendered_rows / elapsed:.1f} строк/с "
+                             f"({rendered_rows} строк за {elapsed:.1f} с, режим {plan.strategy})")
 
-            priority_fields = [
-                ("Назначение", purpose, font_medium),
-                ("Материал", material, font_medium),
-                ("Производитель", manufacturer, font_medium),
-                ("Импортер", importer, font_medium),
-                ("Страна происхождения", country, font_medium),
-                ("Дата изготовления", production_date, font_medium)
-            ]
-
-            for field_name, field_value, font in priority_fields:
-                if not field_value:
-                    continue
+        return self._file_results(ordered_paths, sheet_results)
 
-                if y_position - line_height < 12 * mm:
-                    break
+    def write_archive(self, excel_file_paths: List[str], target: Union[str, BinaryIO]) -> Dict[str, bool]:
+        """
+        Обрабатывает файлы как process_excel_files, но пишет результат сразу в ZIP-архив
+        (labels/ и marks/, а в многостраничном режиме - папки документов) по мере рендеринга,
+        без файлов на диске и второго прохода для упаковки. target - путь к result.zip
+        или файловый объект, в том числе без seek (сокет, pipe).
+        """
+        if self.dry_run:
+            raise ValueError("Пробный прогон не создает PDF - архив результата не пишется")
 
-                c.setFont(font_medium_bold, medium_font_size)
-                field_text = f"{field_name}:"
-                c.drawString(x_position, y_position, field_text)
+        self.archive = ArchiveWriter(target)
+        try:
+            results = self.process_excel_files(excel_file_paths, "")
+        finally:
+            archive, self.archive = self.archive, None
+            write_failures = archive.close()
 
-                field_name_width = c.stringWidth(field_text, font_medium_bold, medium_font_size)
-                value_x = x_position + field_name_width + 0.5 * mm
-                value_max_width = self.page_width - value_x - 2 * mm
+        if write_failures:
+            self.logger.error(f"Ошибки записи в архив: {len(write_failures)}")
+        self.logger.info(f"Архив записан: файлов {archive.written}")
+        return results
 
-                value_lines = self.wrap_text(field_value, font, medium_font_size, value_max_width, c)
-                if value_lines:
-                    c.setFont(font, medium_font_size)
-                    c.drawString(value_x, y_position, value_lines[0])
+    def preflight_records(self, records: Iterable[Tuple[int, ProductRecord]]) -> List[Tuple[int, str, str, str]]:
+        """
+        Проверяет записи без рендеринга: штрихкоды, число копий, раскладка этикетки и поиск логотипов и значков.
+        Возвращает замечания [(индекс, базовое имя файла, код из PREFLIGHT_ISSUES, подробности)].
+        """
+        records = list(records)
+        issues = [(idx, f"row_{idx}", 'empty_name', '') for idx, record in records
+                  if not record.name and any(record.values())]
+        for idx, record, base_filename in self.prepare_records(records):
+            issues.extend((idx, base_filename, code, detail)
+                          for code, detail in self.label_generator.layout_label(record)[1])
+            if copies_count(record.copies) is None:
+                issues.append((idx, base_filename, 'invalid_copies', cell_text(record.copies)))
+        issues.sort(key=lambda issue: issue[0])
+        return issues
 
-                    for i in range(1, len(value_lines)):
-                        if y_position - (i * line_height) < 12 * mm:
+    @staticmethod
+    def _source_stem(excel_file_path: str) -> str:
+        """Имя файла без расширения (для файла из архива - с именем архива): <архив>_<файл>."""
+        archive_path, member = split_archive_path(excel_file_path)
+        name = os.path.splitext(os.path.basename(archive_path))[0]
+        if member is not None:
+            name += f"_{os.path.splitext(posixpath.basename(member))[0]}"
+        return name
+
+    @classmethod
+    def _report_name(cls, excel_file_path: str) -> str:
+        """Имя отчета проверки: preflight_<файл>.csv (для файла из архива - с именем архива)."""
+        return f"preflight_{cls._source_stem(excel_file_path)}.csv"
+
+    def preflight_files(self, excel_file_paths: List[str], output_dir: str = "output") -> Dict[str, bool]:
+        """
+        Пробный прогон: раскладка этикеток считается и ресурсы ищутся без создания PDF.
+        По каждому файлу в output_dir пишется отчет preflight_<файл>.csv с замечаниями по строкам.
+        Файл проходит проверку, если замечаний нет.
+        """
+        results = {}
+        os.makedirs(output_dir, exist_ok=True)
+        job_issues = [] if self.mark_generator.get_mark_image() else [(None, None, '', 'missing_mark_image', '')]
+
+        for path in sorted(excel_file_paths, key=_file_size):
+            file_name = os.path.basename(path)
+            if detect_input_format(path) is None:
+                self.logger.error(f"Неизвестный формат файла: {path}")
+                results[path] = False
+                continue
+
+            started = time.monotonic()
+            report = list(job_issues)
+            checked_rows = 0
+            try:
+                for sheet in self.sheets(path):
+                    if detect_input_format(path) in TEXT_FORMATS:
+                        batches = self.label_generator.iter_record_batches(path, Config.TEXT_STREAM_ROWS, sheet)
+                    else:
+                        # Excel читается через кэш таблиц: следующий запуск на том же файле не разбирает его
+                        records = self.label_generator.read_records(path, sheet) or []
+                        batches = (records[start:start + Config.TEXT_STREAM_ROWS]
+                                   for start in range(0, len(records), Config.TEXT_STREAM_ROWS))
+                    for batch in batches:
+                        if self.cancel_token.cancelled:
                             break
-                        c.drawString(x_position, y_position - (i * line_height), value_lines[i])
+                        checked_rows += len(batch)
+                        report.extend((sheet,) + issue for issue in self.preflight_records(batch))
+            except Exception as e:
+                self.logger.error(f"Ошибка чтения файла {path}: {e}")
+                results[path] = False
+                continue
+
+            report_path = os.path.join(output_dir, self._report_name(path))
+            with open(report_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(['Лист', 'Строка', 'Файл', 'Код', 'Замечание', 'Подробности'])
+                for sheet, idx, base_filename, code, detail in report:
+                    writer.writerow([sheet or '', '' if idx is None else idx + 1, base_filename or '', code,
+                                     PREFLIGHT_ISSUES[code], detail])
+
+            counts = ", ".join(f"{code}: {count}" for code, count in Counter(issue[3] for issue in report).items())
+            self.logger.info(f"{file_name}: проверено строк {checked_rows} за {time.monotonic() - started:.1f} с, "
+                             f"замечаний {len(report)}{f' ({counts})' if counts else ''}, отчет {report_path}")
+            results[path] = not report
+
+        return results
+
+    def _document_parts(self, rows: list) -> List[list]:
+        """
+        Делит строки на части по split_pages страниц с учетом копий (при раскладке - листов этикеток).
+        Копии одной строки не разрываются между частями.
+        """
+        capacity = self.split_pages * (len(self.layouts['labels'].cells) if self.layouts is not None else 1)
+        parts = []
+        part = []
+        pages = 0
+        for row in rows:
+            part.append(row)
+            copies = copies_count(row[1].copies)
+            pages += 1 if copies is None else copies
+            if pages >= capacity:
+                parts.append(part)
+                part = []
+                pages = 0
+        if part:
+            parts.append(part)
+        return parts
+
+    def _job_output_dir(self, output_dir: str, excel_file_path: str, sheet: Optional[str]) -> str:
+        """Папка вывода задания: labels/ и marks/ листа или, в многостраничном режиме, папка документов файла."""
+        if self.combined:
+            output_dir = os.path.join(output_dir, self._source_stem(excel_file_path))
+        return self.sheet_output_dir(output_dir, sheet)
+
+    def _job_tasks(self, rows: list, plan: Optional['ExecutionPlan'] = None,
+                   first_part: int = 1) -> List[Tuple[list, tuple]]:
+        """
+        Задачи рендеринга задания: (строки, дополнительные аргументы _render_task).
+        Многостраничный вывод - документ целиком или части по split_pages с номерами от first_part,
+        иначе - порции строк для пула по плану (без плана или для последовательного - одна задача).
+        """
+        if self.combined:
+            if not self.split_pages:
+                return [(rows, (None,))]
+            return [(part, (number,)) for number, part in enumerate(self._document_parts(rows), first_part)]
+        if plan is None or plan.strategy == 'serial':
+            return [(rows, ())]
+        return [(chunk, ()) for chunk in self._split_chunks(rows, plan.workers, plan.chunk_size)]
+
+    def _render_task(self, rows: list, output_dir: str, *task_args, total_rows: Optional[int] = None) -> Dict:
+        """Рендерит задачу _job_tasks в текущем процессе: PDF на строку или документ (его часть)."""
+        if self.combined:
+            return self.render_document(rows, output_dir, *task_args, total_rows=total_rows,
+                                        row_time_budget=self.row_time_budget, cancel_token=self.cancel_token,
+                                        layouts=self.layouts, zpl_dpi=self.zpl_dpi)
+        return self.render_rows(rows, output_dir, total_rows=total_rows, shard=self.shard,
+                                row_time_budget=self.row_time_budget, cancel_token=self.cancel_token)
+
+    def process_archive(self, archive_path: str, output_dir: str = "output") -> bool:
+        """
+        Обрабатывает входной архив без распаковки: таблицы читаются из памяти,
+        изображения img/logos, img/certificates и img/mark_images подменяют встроенные.
+        """
+        archive_name = os.path.basename(archive_path)
+        try:
+            inputs, assets = read_archive(archive_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            self.logger.error(f"Не удалось открыть архив {archive_name}: {e}")
+            return False
+        if not inputs:
+            self.logger.error(f"В архиве {archive_name} нет файлов Excel, CSV, TSV или JSONL")
+            return False
 
-                    y_position -= max(1, len(value_lines)) * line_height
-                else:
-                    y_position -= line_height
+        self.logger.info(f"{archive_name}: файлов данных {len(inputs)}, изображений {len(assets)}")
+        with ResourceManager.overlay(assets, archive_path), cached_archive_members():
+            return any(self.process_excel_files(inputs, output_dir).values())
 
-                y_position -= field_spacing
+    def _open_pool(self, plan: 'ExecutionPlan'):
+        """
+        Возвращает (функция рендеринга задачи (rows, output_dir, *аргументы задачи из _job_tasks),
+        контекст пула) для плана.
+        """
+        # Потоки рендерят тем же генератором без сериализации строк и запуска процессов,
+        # процессы - собственными генераторами в каждом рабочем процессе
+        if plan.strategy == 'thread':
+            return self._render_task, ThreadPoolExecutor(max_workers=plan.workers)
+
+        # Флаг отмены передается рабочим процессам при их запуске, с порцией - только ключ изображений архива.
+        # При записи в архив рабочие процессы возвращают готовые PDF вместо записи на диск
+        if self.combined:
+            render_task = partial(_render_document_part, row_time_budget=self.row_time_budget,
+                                  assets=ResourceManager.worker_assets(), layouts=self.layouts,
+                                  zpl_dpi=self.zpl_dpi, collect=self.archive is not None)
+        else:
+            render_task = partial(_render_rows_chunk, shard=self.shard, row_time_budget=self.row_time_budget,
+                                  assets=ResourceManager.worker_assets(), collect=self.archive is not None)
 
-            if code or article:
-                code_article_text = ""
-                if code:
-                    code_article_text += f"Код: {code}"
-                if article:
-                    if code_article_text:
-                        code_article_text += " "
-                    code_article_text += f"Арт: {article}"
+        # Постоянный пул демона уже запущен и прогрет - используем его вместо нового
+        if self.pool is not None:
+            return render_task, nullcontext(self.pool)
+        return render_task, ProcessPoolExecutor(max_workers=plan.workers, initializer=_init_worker,
+                                                initargs=(self.cancel_token.event,))
 
-                if code_article_text:
-                    c.setFont(font_small, small_font_size)
-                    c.drawString(22 * mm, 10 * mm, code_article_text)
+    def _collect_chunk(self, future, chunk: list) -> Dict:
+        try:
+            result = future.result()
+            # PDF рабочего процесса, собранные для архива задания
+            for path, data, tag in result.pop('documents', ()):
+                self.archive.submit(path, data, tag)
+            return result
+        except Exception as e:
+            # Падение рабочего процесса - вся порция считается неудачной
+            return {'marks': 0, 'labels': 0,
+                    'failures': [(idx, name, f"ошибка рабочего процесса: {e}") for idx, _, name in chunk]}
 
-            if certification:
-                cert_area_width = 18 * mm
-                cert_area_x = 1 * mm
+    def _process_streaming(self, excel_file_path: str, output_dir: str, sheet: Optional[str] = None) -> bool:
+        """
+        Обрабатывает файл (лист sheet) порциями по stream_rows строк. В памяти одновременно
+        не больше двух порций: читаемая и отданная в рендеринг.
+        Части многостраничного документа (split_pages) отправляются по мере заполнения,
+        а документ без деления рисуется последовательно по мере чтения (_stream_document).
+        """
+        if self.combined and not self.split_pages:
+            return self._stream_document(excel_file_path, output_dir, sheet)
 
-                cert_icon_path = None
-                if certification_type:
-                    cert_icon_path = self.get_certification_icon(certification_type)
+        started = time.monotonic()
+        try:
+            result = {'marks': 0, 'labels': 0, 'failures': []}
+            in_flight = deque()
+            processed = 0
+            plan = None
+            render_task = executor = None
+            carry = []
+            next_part = 1
+
+            with ExitStack() as stack:
+                for batch in self.label_generator.iter_record_batches(excel_file_path, self.stream_rows, sheet):
+                    rows = self.prepare_records(batch)
+                    if plan is None:
+                        self._make_output_dirs(output_dir)
+                        plan = self._plan_rows(rows, self._estimate_rows(excel_file_path, sheet))
+                        self.logger.info(f"План выполнения: {plan}")
+                        if plan.strategy != 'serial':
+                            render_task, pool_context = self._open_pool(plan)
+                            executor = stack.enter_context(pool_context)
+
+                    if self.cancel_token.cancelled:
+                        result['cancelled'] = True
+                        break
 
-                cert_text_y = 3 * mm
+                    if self.combined:
+                        # Последняя часть может быть неполной - ее дополнят строки следующей порции
+                        tasks = self._job_tasks(carry + rows, first_part=next_part)
+                        carry = tasks.pop()[0]
+                        next_part += len(tasks)
+                    else:
+                        tasks = self._job_tasks(rows, plan)
+                    self._submit_streamed(tasks, output_dir, executor, render_task, in_flight, result, len(rows))
+
+                    processed = batch[-1][0] + 1
+                    self.logger.info(f"{self._source_name(excel_file_path, sheet)}: прочитано {processed} строк")
+
+                if carry and not result.get('cancelled'):
+                    self._submit_streamed([(carry, (next_part,))], output_dir, executor, render_task, in_flight,
+                                          result, len(carry))
+                while in_flight:
+                    future, chunk = in_flight.popleft()
+                    _merge_result(result, self._collect_chunk(future, chunk))
+
+            if plan is None:
+                if sheet is None:
+                    self.logger.error("No data found in Excel file")
+                else:
+                    self.logger.warning(f"{self._source_name(excel_file_path, sheet)}: нет данных")
+                return False
+            return self._finish_file(result, self._sheet_summary(excel_file_path, sheet, processed, started))
 
-                if cert_icon_path:
-                    try:
-                        cert_icon = ImageReader(cert_icon_path)
-                        cert_x = cert_area_x
-                        cert_y = cert_text_y + 2 * mm
-                        c.drawImage(cert_icon, cert_x, cert_y, self.cert_sign_size, self.cert_sign_size,
-                                    mask='auto')
-                    except Exception as e:
-                        pass
+        except Exception as e:
+            self.logger.error(f"Ошибка при формировании запроса: {e}")
+            return False
 
-                cert_text = str(certification)
-                cert_lines = self.wrap_text(cert_text, font_small, small_font_size,
-                                            cert_area_width, c)
-
-                cert_lines = cert_lines[:2]
-
-                c.setFont(font_small, small_font_size)
-                for i, line in enumerate(cert_lines):
-                    cert_y = cert_text_y - (i * 1 * mm)
-                    if cert_y > 1 * mm:
-                        c.drawString(cert_area_x, cert_y, line)
-
-            if barcode_value:
-                # Адаптивный размер штрихкода - занимает 50% ширины страницы
-                # Минимальная ширина 15mm, максимальная 25mm для читаемости
-                barcode_width = max(15 * mm, min(25 * mm, self.page_width * 0.5))
-                # Высота пропорциональна ширине (соотношение 2.5:1 для EAN-13)
-                barcode_height = barcode_width / 2.5
-                
-                # Позиция справа с небольшим отступом
-                barcode_x = self.page_width - barcode_width - 1 * mm
-                barcode_y = 1 * mm
-                
-                try:
-                    self.draw_ean13_barcode(
-                        c,
-                        barcode_value,
-                        barcode_x,
-                        barcode_y,
-                        barcode_width,
-                        barcode_height,
-                    )
-                except Exception as e:
-                    # Логируем ошибку, но продолжаем создание PDF
-                    logger.warning(f"Ошибка при рисовании штрихкода: {e}")
+    def _submit_streamed(self, tasks: List[Tuple[list, tuple]], output_dir: str, executor, render_task,
+                         in_flight: deque, result: Dict, batch_rows: int):
+        """Рендерит задачи порции чтения сразу или отдает в пул, ограничивая объем строк в работе."""
+        if executor is None:
+            for task_rows, task_args in tasks:
+                _merge_result(result, self._render_task(task_rows, output_dir, *task_args))
+            return
+        for task_rows, task_args in tasks:
+            in_flight.append((executor.submit(render_task, task_rows, output_dir, *task_args), task_rows))
+        # Ждем завершения старых порций, пока в работе больше одной порции чтения
+        while sum(len(chunk) for _, chunk in in_flight) > batch_rows:
+            future, chunk = in_flight.popleft()
+            _merge_result(result, self._collect_chunk(future, chunk))
+
+    def _stream_document(self, excel_file_path: str, output_dir: str, sheet: Optional[str] = None) -> bool:
+        """
+        Многостраничный документ без деления на части: строки читаются порциями по stream_rows
+        и сразу рисуются в открытые labels.pdf и marks.pdf, не накапливаясь в памяти.
+        """
+        started = time.monotonic()
+        processed = 0
 
-            c.save()
-            return True
+        def stream():
+            nonlocal processed
+            for batch in self.label_generator.iter_record_batches(excel_file_path, self.stream_rows, sheet):
+                yield from self.prepare_records(batch)
+                processed = batch[-1][0] + 1
+                self.logger.info(f"{self._source_name(excel_file_path, sheet)}: прочитано {processed} строк")
 
+        try:
+            self._make_output_dirs(output_dir)
+            result = self._render_task(stream(), output_dir, None)
+            if not processed:
+                if sheet is None:
+                    self.logger.error("No data found in Excel file")
+                else:
+                    self.logger.warning(f"{self._source_name(excel_file_path, sheet)}: нет данных")
+                return False
+            return self._finish_file(result, self._sheet_summary(excel_file_path, sheet, processed, started))
         except Exception as e:
-            logger.error(f"Ошибка при создании этикетки {output_path}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            self.logger.error(f"Ошибка при формировании запроса: {e}")
             return False
 
+    def _estimate_rows(self, excel_file_path: str, sheet: Optional[str] = None) -> Optional[int]:
+        """Число строк листа по заголовку xlsx (без чтения данных), если известно."""
+        if detect_input_format(excel_file_path) in (None, 'xls'):
+            return None
+        return self.label_generator.row_reader(excel_file_path, sheet).estimate_rows()
 
-class CombinedGenerator:
-    def __init__(self):
-        self.mark_generator = MarkGenerator()
-        self.label_generator = PDFLabelGenerator()
-        self.logger = Log(token=TOKEN, silent_errors=True)
-
-    def normalize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        return self.label_generator.normalize_columns(df)
+    def _run_pool(self, plan: 'ExecutionPlan', pending_reads: Dict, output_dir: str, results: Dict) -> int:
+        """
+        Раздает порции строк (части документов) всех заданий (файлов и листов) в общий пул.
+        results заполняется по ключам (путь, лист). Возвращает число отрендеренных строк.
+        """
+        active_jobs = []
+        in_flight = {}
+        max_in_flight = plan.workers * 2
+        turn = 0
+        rendered_rows = 0
+
+        render_task, pool_context = self._open_pool(plan)
+
+        with pool_context as executor:
+            while pending_reads or in_flight or active_jobs:
+                if self.cancel_token.cancelled:
+                    # После отмены новые порции не раздаются, файлы завершаются с тем, что готово
+                    for job in list(active_jobs):
+                        job.cancel_remaining()
+                        if job.is_done():
+                            active_jobs.remove(job)
+                            results[(job.path, job.sheet)] = self._finish_file(job.result)
+
+                # Раздаем порции по кругу между файлами, пока есть свободные слоты
+                while len(in_flight) < max_in_flight:
+                    ready_jobs = [job for job in active_jobs if job.chunks]
+                    if not ready_jobs:
+                        break
+                    job = ready_jobs[turn % len(ready_jobs)]
+                    turn += 1
+                    chunk, task_args = job.chunks.popleft()
+                    in_flight[executor.submit(render_task, chunk, job.output_dir, *task_args)] = (job, chunk)
+
+                done, _ = wait(list(pending_reads) + list(in_flight), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in pending_reads:
+                        path, sheet = pending_reads.pop(future)
+                        loaded = future.result()
+                        if loaded is None or self.cancel_token.cancelled:
+                            results[(path, sheet)] = False
+                            continue
+                        total_rows, rows = loaded
+                        job = _FileJob(path, total_rows, rows, self._job_tasks(rows, plan),
+                                       sheet=sheet, output_dir=self._job_output_dir(output_dir, path, sheet))
+                        self._make_output_dirs(job.output_dir)
+                        if job.is_done():
+                            results[(path, sheet)] = self._finish_file(job.result)
+                        else:
+                            active_jobs.append(job)
+                        continue
 
-    def read_excel(self, file_path: str) -> Optional[pd.DataFrame]:
-        return self.label_generator.read_excel(file_path)
+                    job, chunk = in_flight.pop(future)
+                    job.add_chunk_result(chunk, self._collect_chunk(future, chunk))
+                    rendered_rows += len(chunk)
+                    self.logger.info(f"{self._source_name(job.path, job.sheet)}: обработано {job.processed} "
+                                     f"из {len(job.rows)} записей ({job.total_rows} строк в файле)")
 
-    def process_excel_file(self, excel_file_path: str, output_dir: str = "output"):
-        try:
-            df = self.read_excel(excel_file_path)
-            if df is None or df.empty:
-                self.logger.error("No data found in Excel file")
-                return False
+                    if job.is_done():
+                        active_jobs.remove(job)
+                        if job.sheet is None:
+                            logger.info(f"Файл {os.path.basename(job.path)} обработан за "
+                                        f"{time.monotonic() - job.started:.1f} с")
+                        results[(job.path, job.sheet)] = self._finish_file(
+                            job.result, self._sheet_summary(job.path, job.sheet, len(job.rows), job.started))
 
-            total_rows = len(df)
+        return rendered_rows
 
-            if 'штрихкод' in df.columns:
-                df['штрихкод'] = df['штрихкод'].apply(lambda x:
-                                                      str(int(x)) if pd.notna(x) and x != '' and str(x).replace(
-                                                          '.0',
-                                                          '').isdigit()
-                                                      else str(x) if pd.notna(x) and x != ''
-                                                      else '')
 
-            os.makedirs(output_dir, exist_ok=True)
-            os.makedirs(os.path.join(output_dir, "marks"), exist_ok=True)
-            os.makedirs(os.path.join(output_dir, "labels"), exist_ok=True)
+class ExecutionPlan:
+    """Выбранный режим выполнения: стратегия, число исполнителей и размер порции."""
 
-            success_count_marks = 0
-            success_count_labels = 0
+    def __init__(self, strategy: str, workers: int, chunk_size: int, estimated_seconds: Optional[float] = None):
+        self.strategy = strategy
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.estimated_seconds = estimated_seconds
 
-            for idx, row in df.iterrows():
-                if not row.get('наименование'):
-                    continue
+    def __str__(self):
+        estimate = f", оценка {self.estimated_seconds:.1f} с" if self.estimated_seconds is not None else ""
+        return f"{self.strategy}, исполнителей: {self.workers}, порция: {self.chunk_size}{estimate}"
 
-                row_data = row.to_dict()
 
-                if 'штрихкод' in row_data and row_data['штрихкод']:
-                    barcode_val = row_data['штрихкод']
-                    if isinstance(barcode_val, float) and barcode_val.is_integer():
-                        row_data['штрихкод'] = str(int(barcode_val))
-                    else:
-                        row_data['штрихкод'] = str(barcode_val)
+class ExecutionPlanner:
+    """
+    Выбирает последовательный, потоковый или процессный режим для задания.
+    Учитывает число строк, среднюю длину текста, число различных логотипов и значков
+    (их готовит каждый рабочий процесс) и замеренную стоимость рендеринга строки.
+    Коэффициенты модели стоимости задаются в Config.PLANNER_*.
+    """
 
-                article = str(row.get('артикул', '')).strip()
-                code = str(row.get('код', '')).strip()
-                article_clean = re.sub(r'[\\/*?:"<>|]', "_", article)
-                code_clean = re.sub(r'[\\/*?:"<>|]', "_", code)
+    def __init__(self, generator: 'CombinedGenerator', max_workers: int):
+        self.generator = generator
+        self.max_workers = max(1, max_workers)
 
-                base_filename = f"{article_clean}_{code_clean}" if article_clean or code_clean else f"row_{idx}"
+    @staticmethod
+    def _text_length(row_data: ProductRecord) -> int:
+        return sum(len(str(value)) for value in row_data.values())
+
+    def measure_row_cost(self, sample: list) -> float:
+        """Рендерит выборку строк в память и возвращает среднее время на строку."""
+        # Первая строка прогревает кэш ресурсов и шрифты, ее время не учитывается
+        self._render_to_memory(sample[0])
+        timed = sample[1:] or sample
+        started = time.perf_counter()
+        for row in timed:
+            self._render_to_memory(row)
+        return (time.perf_counter() - started) / len(timed)
+
+    def _render_to_memory(self, row: Tuple[int, ProductRecord, str]):
+        _, row_data, base_filename = row
+        self.generator.render_row(row_data, base_filename)
+
+    def plan(self, rows: list, total_rows: Optional[int] = None) -> ExecutionPlan:
+        """
+        Строит план по строкам задания. Если передан total_rows, rows - только выборка
+        (первая порция потокового чтения), а стоимость считается на total_rows строк.
+        """
+        row_count = total_rows or len(rows)
+        if not rows or row_count <= Config.PLANNER_SERIAL_ROWS or self.max_workers <= 1:
+            return ExecutionPlan('serial', 1, row_count or 1)
+
+        # Выборка равномерно по всему заданию
+        sample_size = min(len(rows), Config.PLANNER_SAMPLE_ROWS + 1)
+        step = len(rows) / sample_size
+        sample = [rows[int(i * step)] for i in range(sample_size)]
+
+        # Поправка стоимости на длину текста: выборка может быть короче или длиннее среднего
+        average_length = sum(self._text_length(row_data) for _, row_data, _ in rows) / len(rows)
+        sample_length = sum(self._text_length(row_data) for _, row_data, _ in sample) / sample_size
+        length_factor = min(4.0, max(0.5, average_length / sample_length)) if sample_length else 1.0
+        row_cost = self.measure_row_cost(sample) * length_factor
+
+        distinct_assets = len({(str(row_data.logo).strip().lower(),
+                                str(row_data.certification_type).strip().lower())
+                               for _, row_data, _ in rows})
+
+        workers = min(self.max_workers, row_count)
+        serial_time = row_count * row_cost
+
+        gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+        thread_speedup = workers if not gil_enabled else 1 + (workers - 1) * Config.PLANNER_GIL_THREAD_EFFICIENCY
+        thread_time = serial_time / thread_speedup
+
+        # Прогретый пул демона уже запущен - стоимость старта не учитываем
+        if self.generator.pool is not None:
+            start_cost = 0.0
+        else:
+            start_cost = Config.PLANNER_PROCESS_START_COST + distinct_assets * Config.PLANNER_ASSET_COST
+        process_time = (start_cost
+                        + serial_time / workers
+                        + row_count * Config.PLANNER_IPC_ROW_COST)
 
-                # Generate mark PDF directly
-                mark_pdf_path = os.path.join(output_dir, "marks", f"mark_{base_filename}.pdf")
-                if self.mark_generator.generate_pdf(row_data, mark_pdf_path):
-                    success_count_marks += 1
+        estimates = {'serial': serial_time, 'thread': thread_time, 'process': process_time}
+        strategy = min(estimates, key=estimates.get)
 
-                # Generate label PDF
-                label_pdf_path = os.path.join(output_dir, "labels", f"label_{base_filename}.pdf")
-                if self.label_generator.create_label_pdf(row_data, label_pdf_path):
-                    success_count_labels += 1
+        if strategy == 'serial':
+            plan = ExecutionPlan('serial', 1, row_count, serial_time)
+        else:
+            # Порция - около PLANNER_CHUNK_SECONDS работы, но не меньше 4 порций на исполнителя
+            chunk_size = max(1, min(-(-row_count // (workers * 4)),
+                                    int(Config.PLANNER_CHUNK_SECONDS / max(row_cost, 1e-6))))
+            plan = ExecutionPlan(strategy, workers, chunk_size, estimates[strategy])
+
+        self.generator.logger.info(
+            f"Планировщик: строк {row_count}, средняя длина текста {average_length:.0f}, "
+            f"ресурсов {distinct_assets}, стоимость строки {row_cost * 1000:.1f} мс, "
+            f"оценки: последовательно {serial_time:.1f} с, потоки {thread_time:.1f} с, "
+            f"процессы {process_time:.1f} с -> {strategy}")
+        return plan
+
+
+class _FileJob:
+    """Состояние обработки одного файла (листа книги) в общем планировщике порций."""
+
+    def __init__(self, path: str, total_rows: int, rows: list, chunks: List[Tuple[list, tuple]],
+                 sheet: Optional[str] = None, output_dir: Optional[str] = None):
+        # Порции - задачи CombinedGenerator._job_tasks: (строки, дополнительные аргументы задачи)
+        self.path = path
+        self.sheet = sheet
+        self.output_dir = output_dir
+        self.total_rows = total_rows
+        self.rows = rows
+        self.chunks = deque(chunks)
+        self.pending = len(chunks)
+        self.processed = 0
+        self.started = time.monotonic()
+        self.result = {'marks': 0, 'labels': 0, 'failures': []}
+
+    def add_chunk_result(self, chunk: list, chunk_result: Dict):
+        _merge_result(self.result, chunk_result)
+        self.processed += len(chunk)
+        self.pending -= 1
+
+    def cancel_remaining(self):
+        """Отказывается от еще не отправленных порций после отмены задания."""
+        if self.chunks:
+            self.pending -= len(self.chunks)
+            self.chunks.clear()
+            self.result['cancelled'] = True
+
+    def is_done(self) -> bool:
+        return self.pending == 0
+
+
+def _merge_result(target: Dict, source: Dict):
+    target['marks'] += source['marks']
+    target['labels'] += source['labels']
+    target['failures'].extend(source['failures'])
+    target['cancelled'] = target.get('cancelled', False) or source.get('cancelled', False)
+
+
+def _file_size(path: str) -> int:
+    archive_path, member = split_archive_path(path)
+    try:
+        if member is not None:
+            with zipfile.ZipFile(archive_path) as archive:
+                return archive.getinfo(member).file_size
+        return os.path.getsize(path)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return 0
+
+
+# Генератор рабочего процесса пула - создается один раз на процесс
+_worker_generator = None
+
+
+# Флаг отмены задания, полученный рабочим процессом при запуске пула
+_worker_cancel_token: Optional[CancellationToken] = None
+# Ключ изображений архива, подключенных в рабочем процессе (_install_worker_assets)
+_worker_assets_key: Optional[str] = None
+
+
+def _install_worker_assets(assets: Optional[Tuple[str, Union[str, Dict[str, bytes]]]]):
+    """Подключает изображения архива задания (ResourceManager.worker_assets), если они еще не подключены."""
+    global _worker_assets_key
+    key = assets[0] if assets else None
+    if key == _worker_assets_key:
+        return
+    if assets is None:
+        ResourceManager.install_overlay(None)
+    else:
+        source = assets[1]
+        if isinstance(source, str):
+            ResourceManager.install_overlay(read_archive(source)[1], source)
+        else:
+            ResourceManager.install_overlay(source)
+    _worker_assets_key = key
+
+
+def _render_rows_chunk(rows: list, output_dir: str, shard: Optional[str] = None,
+                       row_time_budget: float = 0, assets: Optional[Tuple[str, Union[str, Dict[str, bytes]]]] = None,
+                       collect: bool = False) -> Dict:
+    """
+    Рендерит порцию строк в рабочем процессе пула (assets - изображения входного архива, см. worker_assets).
+    collect - вернуть PDF в результате ('documents') для архива задания вместо записи на диск.
+    """
+    global _worker_generator
+    if _worker_generator is None:
+        _worker_generator = CombinedGenerator()
+    _install_worker_assets(assets)
+    collector = DocumentCollector() if collect else None
+    result = _worker_generator.render_rows(rows, output_dir, shard=shard, row_time_budget=row_time_budget,
+                                           cancel_token=_worker_cancel_token, writer=collector)
+    if collector is not None:
+        result['documents'] = collector.documents
+    return result
+
+
+def _render_document_part(rows: list, output_dir: str, part: int, row_time_budget: float = 0,
+                          assets: Optional[Tuple[str, Union[str, Dict[str, bytes]]]] = None,
+                          layouts: Optional[Dict[str, SheetLayout]] = None, zpl_dpi: Optional[int] = None,
+                          collect: bool = False) -> Dict:
+    """Рендерит часть многостраничного документа в рабочем процессе пула (assets, collect - как в _render_rows_chunk)."""
+    global _worker_generator
+    if _worker_generator is None:
+        _worker_generator = CombinedGenerator()
+    _install_worker_assets(assets)
+    collector = DocumentCollector() if collect else None
+    result = _worker_generator.render_document(rows, output_dir, part, row_time_budget=row_time_budget,
+                                               cancel_token=_worker_cancel_token, layouts=layouts, writer=collector,
+                                               zpl_dpi=zpl_dpi)
+    if collector is not None:
+        result['documents'] = collector.documents
+    return result
+
+
+def _init_worker(cancel_event=None, warm_up: bool = False):
+    """
+    Инициализатор рабочего процесса: получает флаг отмены задания.
+    Для постоянного пула (warm_up) прогревает генератор, если он не унаследован через fork.
+    """
+    global _worker_generator, _worker_cancel_token
+    if cancel_event is not None:
+        _worker_cancel_token = CancellationToken(cancel_event)
+    if warm_up and _worker_generator is None:
+        _worker_generator = CombinedGenerator(workers=1, executor='serial')
+        _worker_generator.warm_up()
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+class InputDirectoryDaemon:
+    """
+    Долгоживущий режим: генераторы, шрифты и изображения прогреваются один раз,
+    рабочие процессы запускаются заранее (при fork наследуют прогретое состояние),
+    а новые и измененные файлы в папке input обрабатываются по мере появления.
+    Файл берется в работу, когда его размер и время изменения не меняются между опросами.
+    """
+
+    def __init__(self, generator: CombinedGenerator, input_dir: str, output_dir: str,
+                 poll_interval: float = Config.DAEMON_POLL_INTERVAL):
+        self.generator = generator
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.poll_interval = poll_interval
+        self.logger = Log(token=TOKEN, silent_errors=True)
+        self.seen = {}  # путь -> (размер, mtime) уже обработанной версии файла
+        self.candidates = {}  # путь -> (размер, mtime) на прошлом опросе
+        self.stop_event = threading.Event()
+
+    def start_workers(self):
+        """Прогревает генератор и заранее запускает рабочие процессы."""
+        global _worker_generator
+        started = time.monotonic()
+        self.generator.warm_up()
+
+        if self.generator.workers > 1 and self.generator.executor in ('auto', 'process'):
+            # Рабочие процессы, созданные через fork, получают прогретый генератор copy-on-write
+            _worker_generator = self.generator
+            if 'fork' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('fork')
+            else:
+                context = None
+            self.generator.pool = ProcessPoolExecutor(max_workers=self.generator.workers, mp_context=context,
+                                                      initializer=_init_worker,
+                                                      initargs=(self.generator.cancel_token.event, True))
+            pids = {future.result() for future in
+                    [self.generator.pool.submit(_worker_ready) for _ in range(self.generator.workers)]}
+            logger.info(f"Запущено рабочих процессов: {len(pids)}")
+
+        logger.info(f"Прогрев завершен за {(time.monotonic() - started) * 1000:.0f} мс")
+
+    def scan(self) -> List[str]:
+        """Возвращает новые или измененные файлы, размер которых перестал меняться."""
+        ready = []
+        current = {}
+        for file_name in os.listdir(self.input_dir):
+            # ~$ - временные файлы блокировки Excel
+            if not file_name.endswith(Config.INPUT_EXTENSIONS) or file_name.startswith('~$'):
+                continue
+            path = os.path.join(self.input_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            current[path] = signature
+            if self.seen.get(path) == signature:
+                continue
+            if self.candidates.get(path) == signature:
+                ready.append(path)
+        self.candidates = current
+        return ready
+
+    def stop(self):
+        self.stop_event.set()
+        self.generator.cancel()
 
-                # Логируем прогресс каждые 25 записей или на последней записи
-                current_progress = idx + 1
-                if current_progress % 25 == 0 or current_progress == total_rows:
-                    self.logger.info(f"Обработано {current_progress} из {total_rows} записей")
+    def run(self):
+        os.makedirs(self.input_dir, exist_ok=True)
+        self.start_workers()
+        self.logger.info(f"Демон запущен, отслеживается папка {self.input_dir}")
 
-            # Финальное сообщение о результатах
-            self.logger.info(f"Обработано файлов: 1, создано этикеток: {success_count_labels}, марок: {success_count_marks}")
+        start_time = datetime.now()
+        processed_files = 0
+        failed_files = 0
 
-            return success_count_marks > 0 or success_count_labels > 0
+        try:
+            while not self.stop_event.is_set():
+                ready = self.scan()
+                if ready:
+                    batch_started = time.monotonic()
+                    results = self.generator.process_excel_files(ready, self.output_dir)
+                    for path, success in results.items():
+                        self.seen[path] = self.candidates.get(path)
+                        processed_files += 1
+                        if success:
+                            logger.info(f"Файл {os.path.basename(path)} успешно обработан")
+                        else:
+                            failed_files += 1
+                            logger.error(f"Ошибка при обработке файла {os.path.basename(path)}")
+                    logger.info(f"Обработано файлов: {len(results)} за "
+                                f"{(time.monotonic() - batch_started) * 1000:.0f} мс")
+                self.stop_event.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Остановка демона")
+        finally:
+            if self.generator.pool is not None:
+                self.generator.pool.shutdown(cancel_futures=True)
+                self.generator.pool = None
 
-        except Exception as e:
-            self.logger.error(f"Ошибка при формировании запроса: {e}")
-            return False
+            end_time = datetime.now()
+            self.logger.finish_success(
+                period_from=start_time,
+                period_to=end_time,
+                files_processed=processed_files,
+                files_failed=failed_files,
+                duration_seconds=(end_time - start_time).total_seconds(),
+                mode="daemon",
+                message=f"Демон обработал {processed_files} файлов"
+            )
 
 
 class Application:
-    def __init__(self):
+    def __init__(self, workers: int = Config.WORKERS, chunk_size: int = Config.CHUNK_SIZE,
+                 executor: str = Config.EXECUTOR, stream_rows: int = Config.STREAM_ROWS,
+                 shard: Optional[str] = Config.SHARD, row_time_budget: float = Config.ROW_TIME_BUDGET,
+                 parse_cache_dir: Optional[str] = Config.PARSE_CACHE_DIR, dry_run: bool = False,
+                 combined: bool = False, split_pages: int = Config.SPLIT_PAGES,
+                 impose: Optional[str] = Config.IMPOSE_SHEET, gutter: float = Config.IMPOSE_GUTTER,
+                 crop_marks: bool = True, output_format: str = Config.OUTPUT_FORMAT, zpl_dpi: int = Config.ZPL_DPI):
         self.root = tk.Tk()
         self.root.title("Генератор этикеток и марок")
         self.root.geometry("600x400")
@@ -858,7 +3771,12 @@ class Application:
         os.makedirs('LabelsMarksGenerator/img/certificates', exist_ok=True)
         os.makedirs('LabelsMarksGenerator/img/mark_images', exist_ok=True)
 
-        self.generator = CombinedGenerator()
+        self.generator = CombinedGenerator(workers=workers, chunk_size=chunk_size, executor=executor,
+                                           stream_rows=stream_rows, shard=shard, row_time_budget=row_time_budget,
+                                           parse_cache_dir=parse_cache_dir, dry_run=dry_run,
+                                           combined=combined, split_pages=split_pages, impose=impose,
+                                           gutter=gutter, crop_marks=crop_marks, output_format=output_format,
+                                           zpl_dpi=zpl_dpi)
         self.setup_ui()
 
     def setup_ui(self):
@@ -907,6 +3825,9 @@ class Application:
         file_label = ttk.Label(main_frame, textvariable=self.file_var)
         file_label.grid(row=6, column=0, columnspan=2, pady=5)
 
+        stop_btn = ttk.Button(main_frame, text="Остановить обработку", command=self.cancel_processing)
+        stop_btn.grid(row=7, column=0, columnspan=2, pady=5, padx=5, sticky=tk.EW)
+
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(0, weight=1)
@@ -937,7 +3858,8 @@ class Application:
     def select_file(self):
         file_path = filedialog.askopenfilename(
             title="Выберите Excel файл",
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+            filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV, TSV, JSONL", "*.csv *.tsv *.jsonl"),
+                       ("ZIP archives", "*.zip"), ("All files", "*.*")]
         )
         if file_path:
             try:
@@ -963,10 +3885,10 @@ class Application:
 
     def process_file(self):
         input_dir = 'LabelsMarksGenerator/input'
-        excel_files = [f for f in os.listdir(input_dir) if f.endswith(('.xlsx', '.xls'))]
+        excel_files = [f for f in os.listdir(input_dir) if f.endswith(Config.INPUT_EXTENSIONS)]
 
         if not excel_files:
-            messagebox.showwarning("Предупреждение", "В папке 'input' нет Excel файлов")
+            messagebox.showwarning("Предупреждение", "В папке 'input' нет файлов Excel, CSV, TSV, JSONL или ZIP-архивов")
 
             # Логируем предупреждение
             log = Log(token=TOKEN, silent_errors=True)
@@ -978,15 +3900,21 @@ class Application:
         thread.daemon = True
         thread.start()
 
+    def cancel_processing(self):
+        self.generator.cancel()
+        self.status_var.set("Остановка обработки...")
+        logger.info("Запрошена остановка обработки")
+
     def process_files_thread(self):
         start_time = datetime.now()
+        self.generator.reset_cancellation()
 
         try:
             self.progress.start()
             self.status_var.set("Обработка файлов...")
 
             input_dir = 'LabelsMarksGenerator/input'
-            excel_files = [f for f in os.listdir(input_dir) if f.endswith(('.xlsx', '.xls'))]
+            excel_files = [f for f in os.listdir(input_dir) if f.endswith(Config.INPUT_EXTENSIONS)]
 
             # Логируем начало обработки
             log = Log(token=TOKEN, silent_errors=True)
@@ -995,12 +3923,13 @@ class Application:
             total_files = len(excel_files)
             processed_files = 0
 
-            for excel_file in excel_files:
-                excel_file_path = os.path.join(input_dir, excel_file)
-                logger.info(f"Обработка файла: {excel_file}")
+            excel_file_paths = [os.path.join(input_dir, excel_file) for excel_file in excel_files]
+            logger.info(f"Обработка файлов: {', '.join(excel_files)}")
 
-                success = self.generator.process_excel_file(excel_file_path, "output")
+            results = self.generator.process_excel_files(excel_file_paths, "output")
 
+            for excel_file_path, success in results.items():
+                excel_file = os.path.basename(excel_file_path)
                 if success:
                     logger.info(f"Файл {excel_file} успешно обработан")
                 else:
@@ -1009,9 +3938,16 @@ class Application:
                 processed_files += 1
                 logger.info(f"Обработано файлов: {processed_files} из {total_files}")
 
-            logger.info("Обработка завершена!")
-            self.status_var.set("Обработка завершена успешно!")
-            messagebox.showinfo("Успех", "Обработка файлов завершена!\n\nРезультаты в папке 'output'")
+            failed_files = sum(1 for success in results.values() if not success)
+
+            if self.generator.cancel_token.cancelled:
+                logger.info("Обработка остановлена пользователем")
+                self.status_var.set("Обработка остановлена")
+                messagebox.showinfo("Остановлено", "Обработка остановлена.\n\nЧастичные результаты в папке 'output'")
+            else:
+                logger.info("Обработка завершена!")
+                self.status_var.set("Обработка завершена успешно!")
+                messagebox.showinfo("Успех", "Обработка файлов завершена!\n\nРезультаты в папке 'output'")
 
             # Логируем успешное завершение в eff_runs
             end_time = datetime.now()
@@ -1019,6 +3955,7 @@ class Application:
                 period_from=start_time,
                 period_to=end_time,
                 files_processed=total_files,
+                files_failed=failed_files,
                 duration_seconds=(end_time - start_time).total_seconds(),
                 message=f"Обработано {total_files} файлов, созданы этикетки и марки"
             )
@@ -1049,7 +3986,494 @@ class Application:
         self.root.mainloop()
 
 
+class SpoolDirectory:
+    """
+    Протокол распределенной обработки через общую папку (без внешних сервисов).
+
+    Структура задания <spool>/jobs/<job_id>/:
+        job.json              - описание задания (файл, число единиц работы)
+        pending/unit_N.json   - единицы работы (диапазоны строк), ожидающие исполнителя
+        claimed/unit_N@worker - единицы, взятые исполнителем (переименованием из pending)
+        leases/unit_N@worker  - аренда: время истечения, продлевается исполнителем
+        results/              - временные результаты исполнителей
+        done/unit_N/          - опубликованные результаты: labels/, marks/, summary.json
+        failed/unit_N.json    - единицы, не выполненные за SPOOL_MAX_ATTEMPTS попыток или к сроку
+
+    Живые исполнители отмечаются в <spool>/workers/<worker> (время истечения, продлевается).
+    Все переходы делаются атомарным os.rename, поэтому одну единицу не возьмут двое.
+    Аренда пишется до захвата единицы, так что у взятой единицы аренда всегда есть.
+    """
+
+    def __init__(self, spool_dir: str):
+        self.spool_dir = spool_dir
+        self.jobs_dir = os.path.join(spool_dir, "jobs")
+        self.workers_dir = os.path.join(spool_dir, "workers")
+
+    @staticmethod
+    def write_json(path: str, data):
+        """Атомарно записывает JSON: во временный файл и переименованием."""
+        tmp_path = f"{path}.tmp-{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_json(path: str):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def unit_id(file_name: str) -> str:
+        return file_name.split('@')[0].split('.')[0]
+
+    def job_dirs(self) -> List[str]:
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        return [os.path.join(self.jobs_dir, name) for name in sorted(os.listdir(self.jobs_dir))]
+
+    def live_workers(self) -> List[str]:
+        """Исполнители, отметка которых еще не истекла."""
+        if not os.path.isdir(self.workers_dir):
+            return []
+        now = time.time()
+        alive = []
+        for worker_id in sorted(os.listdir(self.workers_dir)):
+            try:
+                if self.read_json(os.path.join(self.workers_dir, worker_id))['expires'] > now:
+                    alive.append(worker_id)
+            except (OSError, ValueError, KeyError):
+                continue
+        return alive
+
+
+class SpoolCoordinator(SpoolDirectory):
+    """Делит файл на единицы работы, переиздает просроченные аренды и собирает результат."""
+
+    def __init__(self, generator: 'CombinedGenerator', spool_dir: str,
+                 unit_rows: int = Config.SPOOL_UNIT_ROWS, poll_interval: float = Config.SPOOL_POLL_INTERVAL,
+                 max_attempts: int = Config.SPOOL_MAX_ATTEMPTS, timeout: float = Config.SPOOL_TIMEOUT):
+        super().__init__(spool_dir)
+        self.generator = generator
+        self.unit_rows = max(1, unit_rows)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = max(0, timeout)
+        # Сколько раз единица работы выдавалась исполнителям: (папка задания, единица) -> попыток
+        self.attempts: Dict[Tuple[str, str], int] = {}
+        self.logger = Log(token=TOKEN, silent_errors=True)
+
+    def submit(self, excel_file_path: str, sheet: Optional[str] = None,
+               assets: Optional[Dict[str, bytes]] = None) -> Optional[Tuple[str, int]]:
+        """
+        Публикует единицы работы для файла (листа). Изображения входного архива (assets)
+        кладутся в задание как assets.zip. Возвращает (папка задания, всего строк в файле).
+        """
+        loaded = self.generator._load_rows(excel_file_path, sheet)
+        if loaded is None:
+            return None
+        total_rows, rows = loaded
+
+        job_id = f"{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-" \
+                 f"{re.sub(r'[^0-9A-Za-z_-]', '_', os.path.basename(excel_file_path))}"
+        if sheet is not None:
+            # Имена листов бывают кириллическими, поэтому в имени папки - короткий хеш
+            job_id += f"-{hashlib.sha1(sheet.encode('utf-8')).hexdigest()[:8]}"
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        for sub_dir in ('pending', 'claimed', 'leases', 'results', 'done', 'failed'):
+            os.makedirs(os.path.join(job_dir, sub_dir), exist_ok=True)
+
+        if assets:
+            with zipfile.ZipFile(os.path.join(job_dir, 'assets.zip'), 'w') as bundle:
+                for asset_path, data in assets.items():
+                    bundle.writestr(posixpath.join('img', *os.path.relpath(asset_path, ASSET_ROOT).split(os.sep)),
+                                    data)
+
+        units = [rows[i:i + self.unit_rows] for i in range(0, len(rows), self.unit_rows)]
+        self.write_json(os.path.join(job_dir, 'job.json'),
+                        {'file': os.path.basename(excel_file_path), 'sheet': sheet, 'total_rows': total_rows,
+                         'units': len(units), 'shard': self.generator.shard, 'assets': bool(assets)})
+        for number, unit in enumerate(units):
+            self.write_json(os.path.join(job_dir, 'pending', f"unit_{number:06d}.json"),
+                            {'rows': [[idx, record.to_dict(), base_filename]
+                                      for idx, record, base_filename in unit]})
+
+        self.logger.info(f"Спул: {self.generator._source_name(excel_file_path, sheet)} "
+                         f"разбит на {len(units)} единиц работы")
+        return job_dir, total_rows
+
+    def reissue_expired(self, job_dir: str) -> int:
+        """
+        Возвращает в pending единицы с истекшей или отсутствующей арендой (исполнитель,
+        упавший на единице, сам сбрасывает аренду). Единица, исчерпавшая max_attempts
+        попыток, переносится в failed/ и попадает в отчет как неудачные строки.
+        """
+        reissued = 0
+        now = time.time()
+        claimed_dir = os.path.join(job_dir, 'claimed')
+        for claimed_name in os.listdir(claimed_dir):
+            lease_path = os.path.join(job_dir, 'leases', claimed_name)
+            try:
+                lease = self.read_json(lease_path)
+            except (OSError, ValueError):
+                lease = {}
+            if lease.get('expires', 0) > now:
+                continue
+            unit_id = self.unit_id(claimed_name)
+            attempts = self.attempts.get((job_dir, unit_id), 0) + 1
+            error = lease.get('error') or "аренда истекла"
+            exhausted = attempts >= self.max_attempts
+            target = (os.path.join(job_dir, 'failed', f"{unit_id}.json") if exhausted
+                      else os.path.join(job_dir, 'pending', f"{unit_id}.json"))
+            try:
+                os.rename(os.path.join(claimed_dir, claimed_name), target)
+            except OSError:
+                # Исполнитель успел завершить единицу
+                continue
+            try:
+                os.remove(lease_path)
+            except OSError:
+                pass
+            self.attempts[(job_dir, unit_id)] = attempts
+            if exhausted:
+                self._record_failure(job_dir, unit_id, f"не выполнена за {attempts} попыток: {error}")
+                logger.error(f"Спул: единица {unit_id} не выполнена за {attempts} попыток ({error}), "
+                             f"перенесена в failed")
+            else:
+                reissued += 1
+                logger.warning(f"Спул: {claimed_name}: {error}, единица {unit_id} переиздана "
+                               f"(попытка {attempts + 1} из {self.max_attempts})")
+        return reissued
+
+    def _record_failure(self, job_dir: str, unit_id: str, error: str):
+        """Дописывает причину в единицу из failed/ (ее строки сохраняются для отчета)."""
+        failed_path = os.path.join(job_dir, 'failed', f"{unit_id}.json")
+        unit = self.read_json(failed_path)
+        unit['error'] = error
+        self.write_json(failed_path, unit)
+
+    def fail_unfinished(self, job_dir: str, error: str) -> int:
+        """Переносит в failed/ все еще не выполненные единицы задания (по общему лимиту времени)."""
+        failed = 0
+        for sub_dir in ('pending', 'claimed'):
+            for file_name in os.listdir(os.path.join(job_dir, sub_dir)):
+                if '.tmp-' in file_name:
+                    continue
+                unit_id = self.unit_id(file_name)
+                try:
+                    os.rename(os.path.join(job_dir, sub_dir, file_name),
+                              os.path.join(job_dir, 'failed', f"{unit_id}.json"))
+                except OSError:
+                    continue
+                self._record_failure(job_dir, unit_id, error)
+                failed += 1
+        return failed
+
+    def finished_units(self, job_dir: str) -> int:
+        """Число единиц, выполненных или перенесенных в failed/."""
+        return len(set(os.listdir(os.path.join(job_dir, 'done')))
+                   | {self.unit_id(name) for name in os.listdir(os.path.join(job_dir, 'failed'))
+                      if name.endswith('.json')})
+
+    def assemble(self, job_dir: str, output_dir: str) -> Dict:
+        """Переносит результаты всех единиц в output_dir и суммирует счетчики."""
+        result = {'marks': 0, 'labels': 0, 'failures': []}
+        self.generator._make_output_dirs(output_dir)
+        done_dir = os.path.join(job_dir, 'done')
+        for unit_id in sorted(os.listdir(done_dir)):
+            unit_dir = os.path.join(done_dir, unit_id)
+            summary = self.read_json(os.path.join(unit_dir, 'summary.json'))
+            result['marks'] += summary['marks']
+            result['labels'] += summary['labels']
+            result['failures'].extend(tuple(failure) for failure in summary['failures'])
+            for kind in ('labels', 'marks'):
+                kind_dir = os.path.join(unit_dir, kind)
+                for current_dir, _, file_names in os.walk(kind_dir):
+                    target_dir = os.path.join(output_dir, kind, os.path.relpath(current_dir, kind_dir))
+                    os.makedirs(target_dir, exist_ok=True)
+                    for file_name in file_names:
+                        shutil.move(os.path.join(current_dir, file_name), os.path.join(target_dir, file_name))
+        failed_dir = os.path.join(job_dir, 'failed')
+        for file_name in sorted(os.listdir(failed_dir)):
+            unit_id = self.unit_id(file_name)
+            if not file_name.endswith('.json') or unit_id in os.listdir(done_dir):
+                # Опоздавший исполнитель все же опубликовал результат единицы
+                continue
+            unit = self.read_json(os.path.join(failed_dir, file_name))
+            error = f"единица работы {unit_id} {unit.get('error', 'не выполнена')}"
+            result['failures'].extend((idx, base_filename, error) for idx, _, base_filename in unit['rows'])
+        shutil.rmtree(job_dir, ignore_errors=True)
+        return result
+
+    def process_excel_files(self, excel_file_paths: List[str], output_dir: str = "output") -> Dict[str, bool]:
+        """
+        Публикует все файлы (каждый лист - отдельное задание, архив - по своим файлам данных) в спул,
+        ждет исполнителей и собирает результаты.
+        """
+        ordered_paths = sorted(excel_file_paths, key=_file_size)
+        sheet_results = {}
+        jobs = {}
+        for path in ordered_paths:
+            inputs, assets = [path], None
+            if is_archive(path):
+                try:
+                    inputs, assets = read_archive(path)
+                except (OSError, zipfile.BadZipFile) as e:
+                    self.logger.error(f"Не удалось открыть архив {os.path.basename(path)}: {e}")
+                    inputs = []
+                if not inputs:
+                    sheet_results[(path, None)] = False
+            with cached_archive_members():
+                for input_path in inputs:
+                    for sheet in self.generator.sheets(input_path):
+                        submitted = self.submit(input_path, sheet, assets)
+                        if submitted is None:
+                            sheet_results[(path, (input_path, sheet))] = False
+                        else:
+                            jobs[(path, (input_path, sheet))] = submitted + (time.monotonic(),)
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        idle_since = None
+        while jobs:
+            if deadline is not None and time.monotonic() > deadline:
+                self.logger.error(f"Спул: истек общий лимит ожидания {self.timeout:g} с, "
+                                  f"невыполненные единицы считаются неудачными")
+                for job_dir, _, _ in jobs.values():
+                    self.fail_unfinished(job_dir, f"не выполнена за {self.timeout:g} с")
+
+            # Без живых исполнителей задания не продвинутся - сообщаем об этом раз в срок аренды
+            if self.live_workers():
+                idle_since = None
+            elif idle_since is None or time.monotonic() - idle_since > Config.SPOOL_LEASE_SECONDS:
+                idle_since = time.monotonic()
+                self.logger.warning(f"Спул: нет живых исполнителей в {self.spool_dir}, "
+                                    f"ожидается запуск --spool-worker")
+
+            for (result_path, (path, sheet)), (job_dir, total_rows, started) in list(jobs.items()):
+                self.reissue_expired(job_dir)
+                units = self.read_json(os.path.join(job_dir, 'job.json'))['units']
+                if self.finished_units(job_dir) < units:
+                    continue
+                self.logger.info(f"Спул: все {units} единиц ({self.generator._source_name(path, sheet)}) "
+                                 f"готовы, сборка")
+                result = self.assemble(job_dir, self.generator.sheet_output_dir(output_dir, sheet))
+                sheet_results[(result_path, (path, sheet))] = self.generator._finish_file(
+                    result, self.generator._sheet_summary(path, sheet, total_rows, started))
+                del jobs[(result_path, (path, sheet))]
+            if jobs:
+                time.sleep(self.poll_interval)
+
+        return self.generator._file_results(ordered_paths, sheet_results)
+
+    def process_excel_file(self, excel_file_path: str, output_dir: str = "output") -> bool:
+        return self.process_excel_files([excel_file_path], output_dir)[excel_file_path]
+
+
+class SpoolWorker(SpoolDirectory):
+    """Исполнитель: берет единицы работы из спула, рендерит и публикует результаты."""
+
+    def __init__(self, generator: 'CombinedGenerator', spool_dir: str,
+                 lease_seconds: float = Config.SPOOL_LEASE_SECONDS, poll_interval: float = Config.SPOOL_POLL_INTERVAL):
+        super().__init__(spool_dir)
+        self.generator = generator
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = re.sub(r'[^0-9A-Za-z_-]', '_', f"{socket.gethostname()}-{os.getpid()}")
+        self.stop_event = threading.Event()
+        self._assets_job: Optional[str] = None
+        self._assets: Dict[str, bytes] = {}
+        self._heartbeat_at = 0.0
+
+    def _write_lease(self, lease_path: str):
+        self.write_json(lease_path, {'worker': self.worker_id, 'expires': time.time() + self.lease_seconds})
+        self._heartbeat()
+
+    def _heartbeat(self):
+        """Отмечает исполнителя живым на срок аренды (см. SpoolDirectory.live_workers)."""
+        os.makedirs(self.workers_dir, exist_ok=True)
+        self.write_json(os.path.join(self.workers_dir, self.worker_id),
+                        {'expires': time.time() + self.lease_seconds})
+        self._heartbeat_at = time.monotonic()
+
+    def _give_up(self, job_dir: str, claimed_name: str, error: Exception):
+        """Сбрасывает аренду упавшей единицы, чтобы координатор сразу учел попытку и переиздал ее."""
+        try:
+            self.write_json(os.path.join(job_dir, 'leases', claimed_name),
+                            {'worker': self.worker_id, 'expires': 0, 'error': str(error)})
+        except OSError:
+            # Единица будет переиздана по истечении аренды
+            pass
+
+    def claim(self) -> Optional[Tuple[str, str]]:
+        """Берет первую свободную единицу работы. Возвращает (папка задания, имя взятой единицы)."""
+        for job_dir in self.job_dirs():
+            pending_dir = os.path.join(job_dir, 'pending')
+            try:
+                pending = sorted(os.listdir(pending_dir))
+            except OSError:
+                continue
+            for file_name in pending:
+                if not file_name.endswith('.json'):
+                    continue
+                unit_id = self.unit_id(file_name)
+                claimed_name = f"{unit_id}@{self.worker_id}"
+                lease_path = os.path.join(job_dir, 'leases', claimed_name)
+                claimed_path = os.path.join(job_dir, 'claimed', claimed_name)
+                try:
+                    # Аренда пишется до захвата: у единицы в claimed она есть всегда
+                    self._write_lease(lease_path)
+                    os.rename(os.path.join(pending_dir, file_name), claimed_path)
+                except OSError:
+                    # Единицу забрал другой исполнитель
+                    try:
+                        os.remove(lease_path)
+                    except OSError:
+                        pass
+                    continue
+                if os.path.exists(os.path.join(job_dir, 'done', unit_id)):
+                    # Переизданная единица уже выполнена другим исполнителем
+                    self._release(job_dir, claimed_name)
+                    continue
+                return job_dir, claimed_name
+        return None
+
+    def _release(self, job_dir: str, claimed_name: str):
+        for path in (os.path.join(job_dir, 'claimed', claimed_name), os.path.join(job_dir, 'leases', claimed_name)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _renew_lease_loop(self, lease_path: str, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                self._write_lease(lease_path)
+            except OSError as e:
+                logger.warning(f"Спул: не удалось продлить аренду {lease_path}: {e}")
+
+    def _job_assets(self, job_dir: str) -> Dict[str, bytes]:
+        """Изображения входного архива задания (читаются один раз на задание)."""
+        if self._assets_job != job_dir:
+            self._assets = read_archive(os.path.join(job_dir, 'assets.zip'))[1]
+            self._assets_job = job_dir
+        return self._assets
+
+    def process_unit(self, job_dir: str, claimed_name: str):
+        unit_id = self.unit_id(claimed_name)
+        lease_path = os.path.join(job_dir, 'leases', claimed_name)
+        stop_renewal = threading.Event()
+        renewal = threading.Thread(target=self._renew_lease_loop, args=(lease_path, stop_renewal), daemon=True)
+        renewal.start()
+
+        result_dir = os.path.join(job_dir, 'results', claimed_name)
+        try:
+            rows = [(idx, ProductRecord.from_mapping(row_data), base_filename) for idx, row_data, base_filename
+                    in self.read_json(os.path.join(job_dir, 'claimed', claimed_name))['rows']]
+            job = self.read_json(os.path.join(job_dir, 'job.json'))
+            shard = job.get('shard')
+            ResourceManager.install_overlay(self._job_assets(job_dir) if job.get('assets') else None)
+            self.generator._make_output_dirs(result_dir)
+            result = self.generator.render_rows(rows, result_dir, shard=shard)
+            self.write_json(os.path.join(result_dir, 'summary.json'), result)
+        finally:
+            stop_renewal.set()
+            renewal.join()
+
+        try:
+            os.rename(result_dir, os.path.join(job_dir, 'done', unit_id))
+            logger.info(f"Спул: единица {unit_id} выполнена ({len(rows)} строк)")
+        except OSError:
+            # Результат уже опубликован исполнителем переизданной единицы
+            shutil.rmtree(result_dir, ignore_errors=True)
+        self._release(job_dir, claimed_name)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        logger.info(f"Спул: исполнитель {self.worker_id} следит за {self.spool_dir}")
+        self.generator.warm_up()
+        try:
+            while not self.stop_event.is_set():
+                if time.monotonic() - self._heartbeat_at > self.lease_seconds / 3:
+                    self._heartbeat()
+                claimed = self.claim()
+                if claimed is None:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                try:
+                    self.process_unit(*claimed)
+                except Exception as e:
+                    # Координатор засчитает попытку и переиздаст единицу (или перенесет в failed/)
+                    logger.error(f"Спул: ошибка обработки {claimed[1]}: {e}")
+                    self._give_up(*claimed, e)
+        finally:
+            try:
+                os.remove(os.path.join(self.workers_dir, self.worker_id))
+            except OSError:
+                pass
+
+
+def _run_spool_worker(spool_dir: str):
+    """Точка входа процесса-исполнителя спула."""
+    try:
+        SpoolWorker(CombinedGenerator(workers=1, executor='serial'), spool_dir).run()
+    except KeyboardInterrupt:
+        pass
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Генератор этикеток и марок")
+    parser.add_argument('--console', action='store_true', help="Запуск в консольном режиме (без GUI)")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Постоянный режим: следить за папкой input и обрабатывать новые файлы")
+    parser.add_argument('--spool-coordinator', metavar='SPOOL_DIR',
+                        help="Распределенный режим: разбить файлы из input на единицы работы в общей папке "
+                             "и собрать результат исполнителей")
+    parser.add_argument('--spool-worker', metavar='SPOOL_DIR',
+                        help="Распределенный режим: исполнитель единиц работы из общей папки")
+    parser.add_argument('--unit-rows', type=int, default=Config.SPOOL_UNIT_ROWS,
+                        help="Строк в одной единице работы распределенного режима")
+    parser.add_argument('--spool-timeout', type=float, default=Config.SPOOL_TIMEOUT,
+                        help="Общий лимит ожидания координатора спула в секундах (0 - без лимита)")
+    parser.add_argument('--workers', type=int, default=Config.WORKERS,
+                        help="Количество процессов или потоков для рендеринга строк (0 - по числу CPU)")
+    parser.add_argument('--chunk-size', type=int, default=Config.CHUNK_SIZE,
+                        help="Количество строк в одной порции для пула процессов")
+    parser.add_argument('--stream-rows', type=int, default=Config.STREAM_ROWS,
+                        help="Читать и рендерить файл порциями по N строк с ограниченной памятью (0 - выкл.)")
+    parser.add_argument('--shard', choices=['brand', 'hash'], default=Config.SHARD,
+                        help="Раскладывать PDF по подпапкам: по логотипу или по префиксу хэша имени")
+    parser.add_argument('--row-timeout', type=float, default=Config.ROW_TIME_BUDGET,
+                        help="Лимит времени на рендеринг одной строки в секундах (0 - без лимита)")
+    parser.add_argument('--executor', choices=['auto', 'serial', 'process', 'thread'], default=Config.EXECUTOR,
+                        help="Режим рендеринга (auto - выбирается планировщиком по заданию)")
+    parser.add_argument('--parse-cache-dir', default=Config.PARSE_CACHE_DIR,
+                        help="Папка кэша разобранных Excel файлов (повторный запуск на том же файле без разбора)")
+    parser.add_argument('--no-parse-cache', action='store_true', help="Не использовать кэш разобранных файлов")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Пробный прогон без создания PDF: отчет preflight_<файл>.csv о ненайденных логотипах "
+                             "и значках, обрезанных полях, ошибках штрихкодов и пустых наименованиях")
+    parser.add_argument('--combined', action='store_true',
+                        help="Многостраничный вывод: один labels.pdf и один marks.pdf на файл вместо PDF на строку")
+    parser.add_argument('--split-pages', type=int, default=Config.SPLIT_PAGES,
+                        help="Делить многостраничные документы на части по N страниц (0 - не делить)")
+    parser.add_argument('--impose', metavar='SHEET', default=Config.IMPOSE_SHEET,
+                        help="Раскладывать этикетки и марки N-up на листы: A4, A5, A3, letter или ШxВ в мм "
+                             "(рулон); включает многостраничный вывод")
+    parser.add_argument('--gutter', type=float, default=Config.IMPOSE_GUTTER / mm,
+                        help="Промежуток между этикетками на листе в мм")
+    parser.add_argument('--no-crop-marks', action='store_true', help="Не печатать метки реза на листах")
+    parser.add_argument('--archive', metavar='ZIP',
+                        help="Консольный режим: писать результат сразу в ZIP-архив (например result.zip) "
+                             "по мере рендеринга, без файлов в output")
+    parser.add_argument('--format', choices=['pdf', 'zpl'], default=Config.OUTPUT_FORMAT,
+                        help="Формат вывода: pdf или zpl - потоки labels.zpl и marks.zpl для термопринтеров Zebra "
+                             "(многостраничный вывод)")
+    parser.add_argument('--zpl-dpi', type=int, choices=[203, 300, 600], default=Config.ZPL_DPI,
+                        help="Разрешение термопринтера для ZPL")
+    args = parser.parse_args()
+    parse_cache_dir = None if args.no_parse_cache else args.parse_cache_dir
+
     # Логируем запуск программы
     log = Log(token=TOKEN, silent_errors=True)
     log.info("Программа генератора этикеток и марок запущена")
@@ -1058,7 +4482,19 @@ def main():
         """Запуск обработки в консольном режиме (без GUI)."""
         log.info("Запуск в консольном режиме")
 
-        generator = CombinedGenerator()
+        generator = CombinedGenerator(workers=args.workers, chunk_size=args.chunk_size,
+                                       executor=args.executor, stream_rows=args.stream_rows,
+                                       shard=args.shard, row_time_budget=args.row_timeout,
+                                       parse_cache_dir=parse_cache_dir, dry_run=args.dry_run,
+                                       combined=args.combined, split_pages=args.split_pages,
+                                       impose=args.impose, gutter=args.gutter * mm,
+                                       crop_marks=not args.no_crop_marks, output_format=args.format,
+                                       zpl_dpi=args.zpl_dpi)
+        # Пробный прогон не рендерит, а многостраничный документ и архив результата собираются
+        # одним процессом, поэтому они выполняются на месте, без спула
+        if args.spool_coordinator and not (args.dry_run or generator.combined or args.archive):
+            generator = SpoolCoordinator(generator, args.spool_coordinator, unit_rows=args.unit_rows,
+                                         timeout=args.spool_timeout)
         input_dir = "LabelsMarksGenerator/input"
         output_dir = "LabelsMarksGenerator/output"
 
@@ -1069,37 +4505,73 @@ def main():
 
         excel_files = []
         for file in os.listdir(input_dir):
-            if file.endswith(('.xlsx', '.xls')):
+            if file.endswith(Config.INPUT_EXTENSIONS):
                 excel_files.append(os.path.join(input_dir, file))
 
         if not excel_files:
-            log.warning("No Excel files found in input directory")
-            print("No Excel files found in input directory")
+            log.warning("No Excel, CSV, TSV, JSONL or ZIP files found in input directory")
+            print("No Excel, CSV, TSV, JSONL or ZIP files found in input directory")
             return
 
         start_time = datetime.now()
         total_files = len(excel_files)
         log.info(f"Начало обработки {total_files} файлов в консольном режиме")
 
+        if args.archive and not args.dry_run:
+            results = generator.write_archive(excel_files, args.archive)
+        else:
+            results = generator.process_excel_files(excel_files, output_dir)
+
         processed_files = 0
-        for excel_file in excel_files:
-            print(f"Processing: {excel_file}")
-            generator.process_excel_file(excel_file, output_dir)
+        for excel_file, success in results.items():
             processed_files += 1
+            status = "OK" if success else "ошибка"
+            print(f"Processed: {excel_file} - {status}")
             print(f"Обработано файлов: {processed_files} из {total_files}")
 
+        failed_files = sum(1 for success in results.values() if not success)
+
         end_time = datetime.now()
         log.finish_success(
             period_from=start_time,
             period_to=end_time,
             files_processed=total_files,
+            files_failed=failed_files,
             duration_seconds=(end_time - start_time).total_seconds(),
             mode="console",
             message=f"Обработано {total_files} файлов, созданы этикетки и марки"
         )
 
-    # Если явно указан консольный режим
-    if len(sys.argv) > 1 and sys.argv[1] == '--console':
+    if args.spool_worker:
+        log.info("Запуск исполнителя распределенного режима")
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        processes = [multiprocessing.Process(target=_run_spool_worker, args=(args.spool_worker,))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+        return
+
+    if args.daemon:
+        log.info("Запуск в режиме демона")
+        generator = CombinedGenerator(workers=args.workers, chunk_size=args.chunk_size,
+                                      executor=args.executor, stream_rows=args.stream_rows,
+                                      shard=args.shard, row_time_budget=args.row_timeout,
+                                      parse_cache_dir=parse_cache_dir, dry_run=args.dry_run,
+                                      combined=args.combined, split_pages=args.split_pages,
+                                      impose=args.impose, gutter=args.gutter * mm,
+                                      crop_marks=not args.no_crop_marks, output_format=args.format,
+                                      zpl_dpi=args.zpl_dpi)
+        InputDirectoryDaemon(generator, "LabelsMarksGenerator/input", "LabelsMarksGenerator/output").run()
+        return
+
+    # Если явно указан консольный режим (координатор спула работает только в нем)
+    if args.console or args.spool_coordinator:
         run_console_mode()
     else:
         # Пытаемся запустить графический режим, если доступен tkinter
@@ -1110,7 +4582,13 @@ def main():
             return
 
         log.info("Запуск в графическом режиме")
-        app = Application()
+        app = Application(workers=args.workers, chunk_size=args.chunk_size, executor=args.executor,
+                          stream_rows=args.stream_rows, shard=args.shard, row_time_budget=args.row_timeout,
+                          parse_cache_dir=parse_cache_dir, dry_run=args.dry_run,
+                          combined=args.combined, split_pages=args.split_pages,
+                          impose=args.impose, gutter=args.gutter * mm,
+                          crop_marks=not args.no_crop_marks, output_format=args.format,
+                          zpl_dpi=args.zpl_dpi)
         app.run()
 
 
@@ -0,0 +1,76 @@
+import os
+import zipfile
+from io import BytesIO
+
+from main import ArchiveWriter
+
+
+def test_writes_members(tmp_path):
+    target = tmp_path / 'result.zip'
+    writer = ArchiveWriter(str(target), batch_size=2)
+    writer.submit(os.path.join('data', 'labels.pdf'), b'labels', tag=0)
+    writer.submit(os.sep + os.path.join('data', 'marks.pdf'), b'marks', tag=1)
+
+    assert writer.close() == []
+    assert writer.written == 2
+    with zipfile.ZipFile(target) as archive:
+        assert archive.namelist() == ['data/labels.pdf', 'data/marks.pdf']
+        assert archive.read('data/marks.pdf') == b'marks'
+        assert {info.compress_type for info in archive.infolist()} == {zipfile.ZIP_STORED}
+
+
+def test_unseekable_target():
+    class Pipe(BytesIO):
+        def seekable(self):
+            return False
+
+        def seek(self, *args):
+            raise OSError('pipe')
+
+        def tell(self):
+            raise OSError('pipe')
+
+    target = Pipe()
+    writer = ArchiveWriter(target)
+    writer.submit('a.pdf', b'pdf')
+
+    assert writer.close() == []
+    with zipfile.ZipFile(BytesIO(target.getvalue())) as archive:
+        assert archive.read('a.pdf') == b'pdf'
+
+
+def test_member_error_is_recorded(tmp_path):
+    class FlakyArchive(ArchiveWriter):
+        def _write(self, path, data):
+            if data == b'bad':
+                raise ValueError('не пишется')
+            super()._write(path, data)
+
+    target = tmp_path / 'result.zip'
+    writer = FlakyArchive(str(target))
+    writer.submit('a.pdf', b'pdf', tag='a')
+    writer.submit('b.pdf', b'bad', tag='b')
+    writer.submit('c.pdf', b'pdf', tag='c')
+
+    failures = writer.close()
+
+    assert [(tag, type(error)) for tag, error in failures] == [('b', ValueError)]
+    with zipfile.ZipFile(target) as archive:
+        assert archive.namelist() == ['a.pdf', 'c.pdf']
+
+
+def test_close_error_is_recorded():
+    class FullDisk(BytesIO):
+        def write(self, data):
+            # Оглавление архива (central directory) пишется только при close()
+            if data.startswith(b'PK\x01\x02'):
+                raise OSError('диск заполнен')
+            return super().write(data)
+
+    writer = ArchiveWriter(FullDisk())
+    writer.submit('a.pdf', b'pdf', tag='a')
+
+    failures = writer.close()
+
+    assert writer.written == 1
+    assert [(tag, type(error)) for tag, error in failures] == [(None, OSError)]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from main import BARCODE_PRINTABLE, BARCODE_STATUSES, normalize_barcodes
+
+
+@pytest.mark.parametrize('value, barcode, status', [
+    ('4006381333931', '4006381333931', 'ok'),
+    ('400638133393', '4006381333931', 'computed'),
+    ('4006381333932', '4006381333932', 'bad_check'),
+    ('12345', '12345', 'bad_length'),
+    ('40063813339310', '40063813339310', 'bad_length'),
+    ('', '', 'empty'),
+    (None, '', 'empty'),
+    ('нет', '', 'empty'),
+    ('4 006381 333931', '4006381333931', 'ok'),
+    ('EAN: 4006381-333931', '4006381333931', 'ok'),
+    (4006381333931.0, '4006381333931', 'ok'),
+    (4006381333931, '4006381333931', 'ok'),
+    (400638133393.0, '4006381333931', 'computed'),
+    (float('nan'), '', 'empty'),
+])
+def test_normalize_barcode_status(value, barcode, status):
+    assert normalize_barcodes([value]) == ([barcode], [status])
+
+
+def test_normalize_numeric_cells():
+    # Числовые ячейки Excel приходят как float и int вперемешку
+    barcodes, statuses = normalize_barcodes([4006381333931.0, 4006381333931, np.float64(5901234123457.0)])
+    assert statuses == ['ok', 'ok', 'ok']
+    assert barcodes == ['4006381333931', '4006381333931', '5901234123457']
+
+
+def test_normalize_barcodes_column():
+    values = ['4006381333931', '', '400638133393', '4006381333932', '123', '5901234123457']
+    barcodes, statuses = normalize_barcodes(values)
+    assert statuses == ['ok', 'empty', 'computed', 'bad_check', 'bad_length', 'ok']
+    assert barcodes == ['4006381333931', '', '4006381333931', '4006381333932', '123', '5901234123457']
+
+
+def test_normalize_barcodes_empty_column():
+    assert normalize_barcodes([]) == ([], [])
+
+
+def test_statuses_are_described():
+    assert set(BARCODE_PRINTABLE) <= set(BARCODE_STATUSES)
+    assert 'bad_length' not in BARCODE_PRINTABLE
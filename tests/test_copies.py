@@ -0,0 +1,32 @@
+import pytest
+
+from main import CombinedGenerator, Config, ProductRecord, copies_count
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('', 1),
+    (None, 1),
+    (float('nan'), 1),
+    ('  ', 1),
+    (3, 3),
+    ('3', 3),
+    (' 2 ', 2),
+    (2.0, 2),
+    ('2,0', 2),
+    ('0', 0),
+    ('1.5', None),
+    ('-1', None),
+    ('три', None),
+    (Config.MAX_COPIES, Config.MAX_COPIES),
+    (Config.MAX_COPIES + 1, None),
+])
+def test_copies_count(value, expected):
+    assert copies_count(value) == expected
+
+
+def test_document_parts_keep_copies_together():
+    generator = CombinedGenerator(combined=True, split_pages=4)
+    rows = [(idx, ProductRecord(name=f"Товар {idx}", copies=copies), f"row{idx}")
+            for idx, copies in enumerate(['3', '', '2', 'ошибка', '0', '5'])]
+    parts = generator._document_parts(rows)
+    assert [[idx for idx, _, _ in part] for part in parts] == [[0, 1], [2, 3, 4, 5]]
@@ -0,0 +1,119 @@
+import datetime
+import os
+import pickle
+
+import pandas as pd
+
+from main import ParsedTableCache, ProductRecord
+
+
+def records():
+    return [
+        (0, ProductRecord(name='Футболка', barcode='4607001234567', copies='2')),
+        (3, ProductRecord(name='Шорты', article='A-1', country='Россия')),
+    ]
+
+
+def test_round_trip(tmp_path):
+    source = tmp_path / 'data.csv'
+    source.write_bytes(b'payload')
+    cache = ParsedTableCache(str(tmp_path / 'cache'))
+
+    key = cache.key(str(source))
+    cache.store(key, records())
+    loaded = cache.load(key)
+
+    assert [idx for idx, _ in loaded] == [0, 3]
+    assert [record.to_dict() for _, record in loaded] == [record.to_dict() for _, record in records()]
+
+
+def test_missing_key(tmp_path):
+    assert ParsedTableCache(str(tmp_path)).load('0' * 64) is None
+
+
+def test_corrupt_entry_is_ignored(tmp_path):
+    cache = ParsedTableCache(str(tmp_path))
+    (tmp_path / 'broken.table').write_bytes(b'not a pickle')
+    assert cache.load('broken') is None
+
+
+def test_key_depends_on_content_and_sheet(tmp_path):
+    first = tmp_path / 'a.xlsx'
+    second = tmp_path / 'b.xlsx'
+    first.write_bytes(b'same')
+    second.write_bytes(b'same')
+    cache = ParsedTableCache(str(tmp_path))
+
+    assert cache.key(str(first)) == cache.key(str(second))
+    assert cache.key(str(first), 'Лист1') != cache.key(str(first))
+    assert cache.key(str(first), 'Лист1') != cache.key(str(first), 'Лист2')
+    second.write_bytes(b'other')
+    assert cache.key(str(first)) != cache.key(str(second))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ParsedTableCache(str(tmp_path))
+    cache.store('old', records())
+    os.utime(tmp_path / 'old.table', (1, 1))
+    cache.max_bytes = os.path.getsize(tmp_path / 'old.table') + 1
+    cache.store('new', records())
+
+    assert cache.load('old') is None
+    assert cache.load('new') is not None
+
+
+def test_typed_values_round_trip(tmp_path):
+    cache = ParsedTableCache(str(tmp_path))
+    values = dict(name='Футболка', certification=True, copies=2, code=12.5, material=float('nan'),
+                  production_date=datetime.datetime(2024, 5, 1, 10, 30),
+                  country=pd.Timestamp('2024-05-02'), logo=datetime.date(2024, 5, 3),
+                  purpose=datetime.time(8, 15), importer=datetime.timedelta(hours=36))
+    cache.store('typed', [(7, ProductRecord(**values))])
+
+    (idx, record), = cache.load('typed')
+
+    assert idx == 7
+    for attr, value in values.items():
+        loaded = getattr(record, attr)
+        assert type(loaded) is type(value)
+        assert loaded == value or (value != value and loaded != loaded)
+
+
+def test_unsupported_values_are_not_stored(tmp_path):
+    cache = ParsedTableCache(str(tmp_path))
+    cache.store('other', [(0, ProductRecord(name=object()))])
+
+    assert not (tmp_path / 'other.table').exists()
+
+
+def test_entries_are_data_only(tmp_path):
+    cache = ParsedTableCache(str(tmp_path))
+    cache.store('table', records())
+    data = (tmp_path / 'table.table').read_text(encoding='utf-8')
+
+    header = data.splitlines()[0]
+    assert header == '{"format": "labels-parsed-table", "version": %d}' % ParsedTableCache.FORMAT_VERSION
+    assert 'Футболка' in data
+
+
+class Payload:
+    def __reduce__(self):
+        return (os.mkdir, (os.path.join(os.environ['PAYLOAD_DIR'], 'executed'),))
+
+
+def test_pickle_entry_is_not_executed(tmp_path, monkeypatch):
+    monkeypatch.setenv('PAYLOAD_DIR', str(tmp_path))
+    (tmp_path / 'planted.table').write_bytes(pickle.dumps(Payload()))
+
+    assert ParsedTableCache(str(tmp_path)).load('planted') is None
+    assert not (tmp_path / 'executed').exists()
+
+
+def test_other_format_version_is_ignored(tmp_path):
+    cache = ParsedTableCache(str(tmp_path))
+    cache.store('table', records())
+    path = tmp_path / 'table.table'
+    lines = path.read_text(encoding='utf-8').splitlines()
+    path.write_text('{"format": "labels-parsed-table", "version": 1}\n' + lines[1] + '\n', encoding='utf-8')
+
+    assert cache.load('table') is None
@@ -0,0 +1,65 @@
+import threading
+
+from main import PDFWriter
+
+
+def close_within(writer, seconds=10):
+    """close() в отдельном потоке: зависший поток записи не должен вешать тесты."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(writer.close()), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "close() не вернулся"
+    return result[0]
+
+
+def test_writes_files_and_creates_directories(tmp_path):
+    writer = PDFWriter(queue_size=2, batch_size=2)
+    paths = [tmp_path / 'a.pdf', tmp_path / 'shard' / 'b.pdf', tmp_path / 'shard' / 'c.pdf']
+    for number, path in enumerate(paths):
+        writer.submit(str(path), f'pdf {number}'.encode('ascii'), tag=number)
+
+    assert close_within(writer) == []
+    assert writer.written == 3
+    assert [path.read_bytes() for path in paths] == [b'pdf 0', b'pdf 1', b'pdf 2']
+
+
+def test_os_error_is_recorded(tmp_path):
+    (tmp_path / 'file').write_bytes(b'')
+    writer = PDFWriter()
+    writer.submit(str(tmp_path / 'file' / 'a.pdf'), b'pdf', tag='a')
+    writer.submit(str(tmp_path / 'b.pdf'), b'pdf', tag='b')
+
+    failures = close_within(writer)
+
+    assert [tag for tag, _ in failures] == ['a']
+    assert isinstance(failures[0][1], OSError)
+    assert (tmp_path / 'b.pdf').read_bytes() == b'pdf'
+
+
+class FlakyWriter(PDFWriter):
+    def _write(self, path, data):
+        if data == b'bad':
+            raise ValueError('не пишется')
+        super()._write(path, data)
+
+
+def test_any_error_keeps_thread_alive(tmp_path):
+    # Очередь на один файл: если поток записи упадет, submit() заблокируется навсегда
+    writer = FlakyWriter(queue_size=1, batch_size=1)
+
+    def submit_all():
+        for number in range(20):
+            writer.submit(str(tmp_path / f'{number}.pdf'), b'bad' if number % 2 else b'pdf', tag=number)
+
+    thread = threading.Thread(target=submit_all, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "submit() заблокирован"
+
+    failures = close_within(writer)
+
+    assert [tag for tag, _ in failures] == list(range(1, 20, 2))
+    assert all(isinstance(error, ValueError) for _, error in failures)
+    assert writer.written == 10
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(f'{number}.pdf' for number in range(0, 20, 2))
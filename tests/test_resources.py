@@ -0,0 +1,32 @@
+from reportlab.lib.units import mm
+
+from main import PDFLabelGenerator, ResourceManager
+
+ICON = 'LabelsMarksGenerator/img/certificates/eac.png'
+
+
+def test_icon_downscaled_to_print_resolution():
+    size = 4 * mm
+    icon = ResourceManager.get_print_image(ICON, size, size)
+
+    # 4 мм при 300 dpi - 47 точек вместо исходных 3125
+    assert icon.getSize() == (47, 47)
+    assert icon._dataA is not None
+    assert ResourceManager.get_print_image(ICON, size, size) is icon
+
+
+def test_small_image_is_not_upscaled():
+    image = ResourceManager.get_print_image(ICON, 400 * mm, 400 * mm)
+    assert image.getSize() == (3125, 3125)
+
+
+def test_missing_image():
+    assert ResourceManager.get_print_image('LabelsMarksGenerator/img/certificates/нет.png', 10, 10) is None
+
+
+def test_label_logo_is_shared():
+    generator = PDFLabelGenerator()
+    logo = generator.get_logo_image('bartex')
+
+    assert logo is generator.get_logo_image('bartex')
+    assert logo.getSize()[0] == round(generator.logo_width * 300 / 72)
@@ -0,0 +1,65 @@
+import pytest
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+
+from main import SheetLayout, parse_sheet_size
+
+LABEL = (40 * mm, 40 * mm)
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('a4', A4),
+    (' A4 ', A4),
+    ('40x40', (40 * mm, 40 * mm)),
+    ('58,5 х 30 мм', (58.5 * mm, 30 * mm)),
+    ('100*150mm', (100 * mm, 150 * mm)),
+])
+def test_parse_sheet_size(spec, expected):
+    assert parse_sheet_size(spec) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('spec', ['b4', '40', 'x40', '40x'])
+def test_parse_sheet_size_rejects_unknown(spec):
+    with pytest.raises(ValueError):
+        parse_sheet_size(spec)
+
+
+def test_a4_grid():
+    layout = SheetLayout(parse_sheet_size('a4'), LABEL, gutter=2 * mm)
+
+    # (200 + 2) // 42 столбцов и (287 + 2) // 42 рядов при полях 5 мм
+    assert (len(layout.xs), len(layout.ys)) == (4, 6)
+    assert len(layout.cells) == 24
+    assert layout.left == pytest.approx((210 - 4 * 40 - 3 * 2) / 2 * mm)
+    assert layout.bottom == pytest.approx((297 - 6 * 40 - 5 * 2) / 2 * mm)
+    assert [x - layout.xs[0] for x in layout.xs] == pytest.approx([0, 42 * mm, 84 * mm, 126 * mm])
+
+
+def test_cells_fill_rows_from_the_top():
+    layout = SheetLayout(parse_sheet_size('a4'), LABEL, gutter=2 * mm)
+
+    first, second, fifth = layout.cells[0], layout.cells[1], layout.cells[4]
+    assert first == (layout.left, max(layout.ys))
+    assert second[1] == first[1] and second[0] > first[0]
+    assert fifth == (layout.left, first[1] - 42 * mm)
+    assert min(y for _, y in layout.cells) == pytest.approx(layout.bottom)
+
+
+def test_grid_is_centered():
+    layout = SheetLayout(parse_sheet_size('a4'), LABEL, gutter=0)
+    right = layout.xs[-1] + LABEL[0]
+    top = layout.ys[0] + LABEL[1]
+
+    assert A4[0] - right == pytest.approx(layout.left)
+    assert A4[1] - top == pytest.approx(layout.bottom)
+
+
+def test_roll_falls_back_to_no_margin():
+    layout = SheetLayout(parse_sheet_size('40.5x40'), LABEL)
+
+    assert layout.cells == [(pytest.approx(0.25 * mm), 0)]
+
+
+def test_sheet_too_small():
+    with pytest.raises(ValueError):
+        SheetLayout(parse_sheet_size('30x40'), LABEL)
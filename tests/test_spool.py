@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+
+import pytest
+
+from main import CombinedGenerator, SpoolCoordinator, SpoolDirectory, SpoolWorker
+
+
+@pytest.fixture
+def generator():
+    return CombinedGenerator(workers=1, executor='serial', parse_cache_dir=None)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / 'data.csv'
+    rows = [f'Товар {number};460700123456{number % 10};A-{number}' for number in range(5)]
+    path.write_text('\n'.join(['Наименование;Штрихкод;Артикул'] + rows) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def make_worker(generator, spool_dir, worker_id):
+    worker = SpoolWorker(generator, spool_dir, lease_seconds=60, poll_interval=0.01)
+    worker.worker_id = worker_id
+    return worker
+
+
+def listing(job_dir, sub_dir):
+    return sorted(name for name in os.listdir(os.path.join(job_dir, sub_dir)) if '.tmp-' not in name)
+
+
+def expire(job_dir, claimed_name):
+    lease_path = os.path.join(job_dir, 'leases', claimed_name)
+    lease = SpoolDirectory.read_json(lease_path)
+    lease['expires'] = time.time() - 1
+    SpoolDirectory.write_json(lease_path, lease)
+
+
+def test_submit_splits_into_units(tmp_path, generator, data_file):
+    coordinator = SpoolCoordinator(generator, str(tmp_path / 'spool'), unit_rows=2)
+
+    job_dir, total_rows = coordinator.submit(data_file)
+
+    assert total_rows == 5
+    assert listing(job_dir, 'pending') == ['unit_000000.json', 'unit_000001.json', 'unit_000002.json']
+    assert SpoolDirectory.read_json(os.path.join(job_dir, 'job.json'))['units'] == 3
+    rows = SpoolDirectory.read_json(os.path.join(job_dir, 'pending', 'unit_000002.json'))['rows']
+    assert [idx for idx, _, _ in rows] == [4]
+
+
+def test_claim_takes_each_unit_once(tmp_path, generator, data_file):
+    spool_dir = str(tmp_path / 'spool')
+    job_dir, _ = SpoolCoordinator(generator, spool_dir, unit_rows=3).submit(data_file)
+    first = make_worker(generator, spool_dir, 'first')
+    second = make_worker(generator, spool_dir, 'second')
+
+    assert first.claim() == (job_dir, 'unit_000000@first')
+    assert second.claim() == (job_dir, 'unit_000001@second')
+    assert first.claim() is None
+
+    assert listing(job_dir, 'pending') == []
+    assert listing(job_dir, 'claimed') == ['unit_000000@first', 'unit_000001@second']
+    assert listing(job_dir, 'leases') == ['unit_000000@first', 'unit_000001@second']
+    assert SpoolDirectory.read_json(os.path.join(job_dir, 'leases', 'unit_000000@first'))['expires'] > time.time()
+
+
+def test_expired_lease_is_reissued(tmp_path, generator, data_file):
+    spool_dir = str(tmp_path / 'spool')
+    coordinator = SpoolCoordinator(generator, spool_dir, unit_rows=3, max_attempts=3)
+    job_dir, _ = coordinator.submit(data_file)
+    worker = make_worker(generator, spool_dir, 'worker')
+    worker.claim()
+    worker.claim()
+
+    assert coordinator.reissue_expired(job_dir) == 0
+    expire(job_dir, 'unit_000001@worker')
+    assert coordinator.reissue_expired(job_dir) == 1
+
+    assert listing(job_dir, 'pending') == ['unit_000001.json']
+    assert listing(job_dir, 'claimed') == ['unit_000000@worker']
+    assert listing(job_dir, 'leases') == ['unit_000000@worker']
+    assert coordinator.attempts == {(job_dir, 'unit_000001'): 1}
+    # Переизданную единицу снова можно взять
+    assert make_worker(generator, spool_dir, 'other').claim() == (job_dir, 'unit_000001@other')
+
+
+def test_unit_fails_after_max_attempts(tmp_path, generator, data_file):
+    spool_dir = str(tmp_path / 'spool')
+    coordinator = SpoolCoordinator(generator, spool_dir, unit_rows=3, max_attempts=2)
+    job_dir, _ = coordinator.submit(data_file)
+    worker = make_worker(generator, spool_dir, 'worker')
+
+    for _ in range(2):
+        job_dir, claimed_name = worker.claim()
+        assert claimed_name == 'unit_000000@worker'
+        worker._give_up(job_dir, claimed_name, ValueError('битая строка'))
+        coordinator.reissue_expired(job_dir)
+
+    assert listing(job_dir, 'failed') == ['unit_000000.json']
+    assert listing(job_dir, 'pending') == ['unit_000001.json']
+    assert coordinator.finished_units(job_dir) == 1
+
+    worker.process_unit(*worker.claim())
+    assert coordinator.finished_units(job_dir) == 2
+
+    result = coordinator.assemble(job_dir, str(tmp_path / 'output'))
+
+    assert result['labels'] == 2 and result['marks'] == 2
+    assert [idx for idx, _, _ in result['failures']] == [0, 1, 2]
+    assert all('unit_000000' in error and 'битая строка' in error for _, _, error in result['failures'])
+    assert len(os.listdir(tmp_path / 'output' / 'labels')) == 2
+    assert not os.path.exists(job_dir)
+
+
+def test_fail_unfinished(tmp_path, generator, data_file):
+    spool_dir = str(tmp_path / 'spool')
+    coordinator = SpoolCoordinator(generator, spool_dir, unit_rows=2)
+    job_dir, _ = coordinator.submit(data_file)
+    make_worker(generator, spool_dir, 'worker').claim()
+
+    assert coordinator.fail_unfinished(job_dir, 'не выполнена за 1 с') == 3
+
+    assert listing(job_dir, 'pending') == [] and listing(job_dir, 'claimed') == []
+    assert coordinator.finished_units(job_dir) == 3
+    unit = SpoolDirectory.read_json(os.path.join(job_dir, 'failed', 'unit_000000.json'))
+    assert unit['error'] == 'не выполнена за 1 с'
+
+
+def test_live_workers(tmp_path, generator):
+    spool_dir = str(tmp_path / 'spool')
+    worker = make_worker(generator, spool_dir, 'alive')
+    directory = SpoolDirectory(spool_dir)
+
+    assert directory.live_workers() == []
+    worker._heartbeat()
+    SpoolDirectory.write_json(os.path.join(directory.workers_dir, 'dead'), {'expires': time.time() - 1})
+    with open(os.path.join(directory.workers_dir, 'broken'), 'w') as f:
+        f.write('{')
+
+    assert directory.live_workers() == ['alive']
+
+
+def test_coordinator_runs_with_worker(tmp_path, generator, data_file):
+    spool_dir = str(tmp_path / 'spool')
+    coordinator = SpoolCoordinator(generator, spool_dir, unit_rows=2, poll_interval=0.01, timeout=60)
+    worker = make_worker(generator, spool_dir, 'worker')
+
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    try:
+        results = coordinator.process_excel_files([data_file], str(tmp_path / 'output'))
+    finally:
+        worker.stop()
+        thread.join(10)
+
+    assert results == {data_file: True}
+    assert len(os.listdir(tmp_path / 'output' / 'labels')) == 5
+    assert not os.path.exists(os.path.join(spool_dir, 'workers', 'worker'))
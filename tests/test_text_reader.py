@@ -0,0 +1,121 @@
+import json
+import logging
+
+import pytest
+
+from main import TextRowReader, detect_input_format
+
+
+def read(path, input_format):
+    reader = TextRowReader(str(path), input_format)
+    return [(idx, record.to_dict()) for idx, record in reader], reader.columns
+
+
+@pytest.mark.parametrize('delimiter', [',', ';', '\t'])
+def test_csv_delimiters(tmp_path, delimiter):
+    path = tmp_path / 'data.csv'
+    lines = [['Наименование', 'Штрихкод', 'Артикул', 'Лишнее'], ['Футболка', '4607001234567', 'A-1', 'x'],
+             ['Шорты', '0042', '', 'y']]
+    path.write_text('\n'.join(delimiter.join(line) for line in lines) + '\n', encoding='utf-8')
+
+    records, columns = read(path, 'csv')
+
+    assert columns == ['наименование', 'штрихкод', 'артикул']
+    assert [(idx, row['наименование'], row['штрихкод'], row['артикул']) for idx, row in records] == [
+        (0, 'Футболка', '4607001234567', 'A-1'), (1, 'Шорты', '0042', '')]
+
+
+def test_csv_short_rows_and_quotes(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('Наименование,Материал,Код\n"Куртка, зимняя","хлопок ""100%"""\nШарф\n', encoding='utf-8')
+
+    records, _ = read(path, 'csv')
+
+    assert [(row['наименование'], row['материал'], row['код']) for _, row in records] == [
+        ('Куртка, зимняя', 'хлопок "100%"', ''), ('Шарф', '', '')]
+
+
+def test_csv_cp1251(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes('Наименование;Страна происхождения\nПлатье;Россия\n'.encode('cp1251'))
+
+    records, _ = read(path, 'csv')
+
+    assert records[0][1]['наименование'] == 'Платье'
+    assert records[0][1]['страна происхождения'] == 'Россия'
+
+
+def test_csv_utf8_bom(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes('Наименование,Артикул\nПлатье,B-2\n'.encode('utf-8-sig'))
+
+    records, columns = read(path, 'csv')
+
+    assert columns == ['наименование', 'артикул']
+    assert records[0][1]['артикул'] == 'B-2'
+
+
+def test_tsv_keeps_commas(tmp_path):
+    path = tmp_path / 'data.tsv'
+    path.write_text('Наименование\tМатериал\nБрюки\tхлопок, лен\n', encoding='utf-8')
+
+    records, _ = read(path, 'tsv')
+
+    assert records[0][1]['материал'] == 'хлопок, лен'
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / 'data.jsonl'
+    rows = [{'Наименование': 'Футболка', 'Штрихкод': 4607001234567, 'Артикул': 'A-1'},
+            {'name': 'Шорты', 'Код': 7, 'Лишнее': True}]
+    path.write_text('\n'.join(json.dumps(row, ensure_ascii=False) for row in rows) + '\n', encoding='utf-8')
+
+    records, columns = read(path, 'jsonl')
+
+    assert columns == ['наименование', 'штрихкод', 'артикул', 'код']
+    idx, row = records[0]
+    assert (idx, row['наименование'], row['штрихкод'], row['артикул']) == (0, 'Футболка', '4607001234567', 'A-1')
+    assert records[1][1]['наименование'] == 'Шорты'
+    assert records[1][1]['код'] == '7'
+
+
+def test_jsonl_skips_bad_lines(tmp_path, caplog):
+    path = tmp_path / 'data.jsonl'
+    path.write_text('{"Наименование": "Футболка"}\n'
+                    '[1, 2, 3]\n'
+                    '{"Наименование": \n'
+                    '\n'
+                    '"строка"\n'
+                    '{"Наименование": "Шорты"}\n', encoding='utf-8')
+
+    with caplog.at_level(logging.WARNING, logger='main'):
+        records, _ = read(path, 'jsonl')
+
+    assert [(idx, row['наименование']) for idx, row in records] == [(0, 'Футболка'), (5, 'Шорты')]
+    skipped = [record.getMessage() for record in caplog.records]
+    assert len(skipped) == 3
+    assert [message.split(':')[1].strip() for message in skipped] == ['строка 2 пропущена', 'строка 3 пропущена',
+                                                                      'строка 5 пропущена']
+
+
+def test_jsonl_skips_undecodable_line(tmp_path, caplog):
+    path = tmp_path / 'data.jsonl'
+    # Начало файла - UTF-8, битые байты в конце не меняют кодировку файла
+    valid = '\n'.join(f'{{"Наименование": "Товар {number}"}}' for number in range(3000))
+    last = '{"Наименование": "Последний"}\n'.encode('utf-8')
+    path.write_bytes(valid.encode('utf-8') + b'\n{"\xd0": 1}\n' + last)
+
+    with caplog.at_level(logging.WARNING, logger='main'):
+        records, _ = read(path, 'jsonl')
+
+    assert len(records) == 3001
+    assert (records[-1][0], records[-1][1]['наименование']) == (3001, 'Последний')
+    assert any('строка 3001 пропущена' in record.getMessage() for record in caplog.records)
+
+
+@pytest.mark.parametrize('name, expected', [('a.csv', 'csv'), ('b.TSV', 'tsv'), ('c.jsonl', 'jsonl'),
+                                            ('d.txt', None)])
+def test_detect_text_format(tmp_path, name, expected):
+    path = tmp_path / name
+    path.write_text('Наименование\n', encoding='utf-8')
+    assert detect_input_format(str(path)) == expected
@@ -0,0 +1,88 @@
+import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+
+from main import PDFLabelGenerator, ProductRecord, XlsxRowReader, cell_text, copies_count, standard_column_name
+
+
+def write_workbook(path, epoch=CALENDAR_WINDOWS_1900):
+    workbook = openpyxl.Workbook()
+    workbook.epoch = epoch
+    sheet = workbook.active
+    sheet.title = 'Товары'
+    sheet.append(['Наименование', 'Посторонняя колонка', 'Barcode', 'Дата изготовления', 'Артикул', 'Лого',
+                  'Сертификация', 'Код', 'Копии'])
+    sheet.append(['Футболка', 'x', 4607001234567, datetime.datetime(2024, 5, 1), 'A-1', 'Silvano', 'Да', 100, 2])
+    sheet.append([None] * 9)
+    sheet.append(['Шорты', None, 4607001234568.0, 'май 2024', 12.5, None, 'Нет', None, None])
+    sheet['A6'] = 'Носки'
+    sheet['D6'] = datetime.date(2023, 1, 2)
+    sheet['D6'].number_format = 'DD.MM.YYYY'
+    sheet['H6'] = '007'
+    other = workbook.create_sheet('Второй')
+    other.append(['Наименование', 'Артикул'])
+    other.append(['Кепка', 42])
+    workbook.save(path)
+
+
+def read_with_pandas(path, sheet=0):
+    header = pd.read_excel(path, sheet_name=sheet, nrows=0).columns
+    converters = {column: cell_text for column in header
+                  if standard_column_name(column) in PDFLabelGenerator.TEXT_COLUMNS}
+    df = pd.read_excel(path, sheet_name=sheet, converters=converters)
+    df = PDFLabelGenerator().normalize_columns(df).fillna('')
+    return [(idx, record.to_dict()) for idx, record in ProductRecord.from_frame(df)]
+
+
+def as_text(records):
+    """
+    Записи для сравнения: даты pandas (Timestamp) и читателя (datetime) - текстом, копии - числом
+    (pandas читает колонку с пропусками как float), пустые строки листа пропускаются.
+    """
+    return [(idx, {column: copies_count(value) if column == 'копии' else str(value) for column, value in row.items()})
+            for idx, row in records if any(value != '' for value in row.values())]
+
+
+@pytest.mark.parametrize('epoch', [CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904])
+def test_reader_matches_pandas(tmp_path, epoch):
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path, epoch)
+
+    records = [(idx, record.to_dict()) for idx, record in XlsxRowReader(path)]
+
+    assert as_text(records) == as_text(read_with_pandas(path))
+    # Идентификаторы читаются как текст без '.0'
+    assert records[0][1]['штрихкод'] == '4607001234567'
+    assert records[-1][1]['код'] == '007'
+
+
+def test_reader_selects_sheet(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path)
+
+    reader = XlsxRowReader(path, 'Второй')
+    records = [(idx, record.to_dict()) for idx, record in reader]
+
+    assert reader.sheet_names() == ['Товары', 'Второй']
+    assert as_text(records) == as_text(read_with_pandas(path, 'Второй'))
+    assert reader.columns == ['наименование', 'артикул']
+
+
+def test_estimate_rows(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    write_workbook(path)
+    assert XlsxRowReader(path).estimate_rows() == len(pd.read_excel(path))
+
+
+def test_from_frame_reads_identifiers_as_text():
+    df = pd.DataFrame({'наименование': ['Футболка', 'Шорты'], 'штрихкод': [4607001234567.0, float('nan')],
+                       'код': [100.0, 12.5], 'материал': [1.0, 2.0]})
+
+    records = [record for _, record in ProductRecord.from_frame(df)]
+
+    assert [(record.barcode, record.code) for record in records] == [('4607001234567', '100'), ('', '12.5')]
+    # Прочие колонки остаются как есть
+    assert records[0].material == 1.0
@@ -0,0 +1,105 @@
+from io import BytesIO
+
+from PIL import Image
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+
+from main import PDFLabelGenerator, ProductRecord, ZPLDocument
+
+PAGE = (40 * mm, 40 * mm)
+
+
+def render(draws, **kwargs):
+    output = BytesIO()
+    document = ZPLDocument(output, PAGE, dpi=203, **kwargs)
+    results = [document.add(draw, copies) for draw, copies in draws]
+    document.save()
+    return document, results, output.getvalue().decode('utf-8').splitlines()
+
+
+def text(value):
+    def draw(c, images):
+        c.setFont('Helvetica', 10)
+        c.drawString(10, 20, value)
+    return draw
+
+
+def test_label_header_and_text():
+    document, results, lines = render([(text('Футболка'), 2)])
+
+    assert results == [True]
+    assert document.pages == 2
+    assert len(lines) == 1
+    label = lines[0]
+    assert label.startswith('^XA^CI28^CW1,E:TT0003M_.FNT^PW320^LL320^LH0,0')
+    assert label.endswith('^PQ2^XZ')
+    # 10 пт при 203 dpi - 28 точек; y отсчитывается от верхнего края
+    assert '^FT28,263^A1N,28,28^FH^FDФутболка^FS' in label
+
+
+def test_builtin_font():
+    _, _, lines = render([(text('Шорты'), 1)], font='')
+
+    assert '^CW' not in lines[0]
+    assert '^A0N,' in lines[0]
+
+
+def test_field_escaping():
+    _, _, lines = render([(text('a_b^c~d'), 1)])
+
+    assert '^FH^FDa_5Fb_5Ec_7Ed^FS' in lines[0]
+
+
+def test_failed_draw_is_not_counted():
+    def broken(c, images):
+        c.drawString(0, 0, 'x')
+        raise ValueError('нет данных')
+
+    document, results, lines = render([(broken, 3), (text('ok'), 1)])
+
+    assert results == [False, True]
+    assert document.pages == 1
+    assert len(lines) == 1 and '^PQ1^XZ' in lines[0]
+
+
+def test_images_uploaded_once():
+    image = ImageReader(Image.new('RGB', (16, 16), 'black'))
+
+    def draw(c, images):
+        images.draw('logo', image, 0, 0, 8 * mm, 8 * mm)
+
+    document, _, lines = render([(draw, 1), (draw, 1)])
+
+    uploads = [line for line in lines if line.startswith('~DG')]
+    assert len(uploads) == 1
+    assert uploads[0].startswith('~DGR:LMG0000.GRF,')
+    assert sum('^XGR:LMG0000.GRF,1,1^FS' in line for line in lines) == 2
+
+
+def test_barcode():
+    def draw(c, images):
+        assert c.draw_ean13_barcode('4607001234567', 0, 0, 30 * mm, 10 * mm)
+        assert not c.draw_ean13_barcode('12345', 0, 0, 30 * mm, 10 * mm)
+        assert not c.draw_ean13_barcode('', 0, 0, 30 * mm, 10 * mm)
+
+    _, _, lines = render([(draw, 1)])
+
+    assert lines[0].count('^BEN,') == 1
+    assert '^FD460700123456^FS' in lines[0]
+
+
+def test_draw_label():
+    generator = PDFLabelGenerator()
+    record = ProductRecord(name='Футболка мужская', article='A-1', barcode='4607001234567', barcode_status='ok',
+                           material='хлопок', country='Россия')
+
+    def draw(c, images):
+        generator.draw_label(c, generator.layout_label(record)[0], images)
+
+    _, results, lines = render([(draw, 1)])
+
+    assert results == [True]
+    label = lines[-1]
+    assert '^BEN,' in label
+    assert 'Футболка' in label
+    assert '^A1N,' in label and '^A0N,' not in label